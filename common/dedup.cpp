@@ -0,0 +1,393 @@
+#include <atomic>
+#include <chrono>
+#include <cmath>
+#include <condition_variable>
+#include <cstdint>
+#include <cstring>
+#include <functional>
+#include <iterator>
+#include <list>
+#include <mutex>
+#include <optional>
+#include <utility>
+#include <vector>
+
+#include <VapourSynth.h>
+#include <VSHelper.h>
+
+
+struct DedupCache;
+
+DedupCache * dedupCreate(int capacity, float threshold) noexcept;
+
+void dedupFree(DedupCache * cache, const VSAPI * vsapi) noexcept;
+
+const VSFrameRef * dedupGetFrame(
+    DedupCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+
+// the output of a recent input
+struct DedupEntry {
+    uint64_t id;
+    uint64_t hash;
+    std::vector<const VSFrameRef *> inputs; // kept for the comparison within a threshold
+    const VSFrameRef * output; // nullptr while the input is being processed
+    bool failed; // the processing failed, removed by the last waiter
+    int waiters; // number of frames waiting for the output
+};
+
+
+struct DedupCache {
+    size_t capacity;
+    float threshold; // maximum mean absolute difference of the samples, exact match if 0
+
+    std::mutex lock;
+    std::condition_variable cv; // notified when an entry is processed
+    std::list<DedupEntry> entries; // the most recently used first
+    uint64_t next_id {};
+
+    std::atomic<int64_t> hits {};
+    std::atomic<int64_t> misses {};
+};
+
+
+DedupCache * dedupCreate(int capacity, float threshold) noexcept {
+    auto cache = new (std::nothrow) DedupCache;
+    if (cache) {
+        cache->capacity = static_cast<size_t>(capacity);
+        cache->threshold = threshold;
+    }
+    return cache;
+}
+
+
+static void freeEntry(const DedupEntry & entry, const VSAPI * vsapi) noexcept {
+    for (const auto & frame : entry.inputs) {
+        vsapi->freeFrame(frame);
+    }
+    vsapi->freeFrame(entry.output);
+}
+
+
+void dedupFree(DedupCache * cache, const VSAPI * vsapi) noexcept {
+    if (!cache) {
+        return ;
+    }
+
+    for (const auto & entry : cache->entries) {
+        freeEntry(entry, vsapi);
+    }
+
+    delete cache;
+}
+
+
+// hashes the samples of the frames, excluding the padding of the rows
+static uint64_t hashFrames(
+    const std::vector<const VSFrameRef *> & frames,
+    const VSAPI * vsapi
+) noexcept {
+
+    uint64_t hash = 0xcbf29ce484222325ULL;
+
+    const auto mix = [&hash](uint64_t value) {
+        hash = (hash ^ value) * 0x100000001b3ULL;
+        hash ^= hash >> 29;
+    };
+
+    for (const auto & frame : frames) {
+        const auto width_bytes = vsapi->getFrameWidth(frame, 0) * vsapi->getFrameFormat(frame)->bytesPerSample;
+        const auto height = vsapi->getFrameHeight(frame, 0);
+
+        for (int plane = 0; plane < vsapi->getFrameFormat(frame)->numPlanes; ++plane) {
+            const auto stride = vsapi->getStride(frame, plane);
+            const uint8_t * ptr = vsapi->getReadPtr(frame, plane);
+
+            for (int y = 0; y < height; ++y, ptr += stride) {
+                int x = 0;
+                for (; x + 8 <= width_bytes; x += 8) {
+                    uint64_t value;
+                    std::memcpy(&value, ptr + x, sizeof(value));
+                    mix(value);
+                }
+                for (; x < width_bytes; ++x) {
+                    mix(ptr[x]);
+                }
+            }
+        }
+    }
+
+    return hash;
+}
+
+
+// whether the mean absolute difference of the fp32 samples is within the threshold
+static bool isSimilar(
+    const std::vector<const VSFrameRef *> & frames,
+    const std::vector<const VSFrameRef *> & others,
+    float threshold,
+    const VSAPI * vsapi
+) noexcept {
+
+    double num_samples = 0;
+    for (const auto & frame : frames) {
+        num_samples += (
+            static_cast<double>(vsapi->getFrameWidth(frame, 0)) *
+            vsapi->getFrameHeight(frame, 0) *
+            vsapi->getFrameFormat(frame)->numPlanes
+        );
+    }
+
+    // exits as soon as the budget of the whole frame is exceeded
+    const double budget = threshold * num_samples;
+    double diff = 0;
+
+    for (size_t i = 0; i < std::size(frames); ++i) {
+        const auto width = vsapi->getFrameWidth(frames[i], 0);
+        const auto height = vsapi->getFrameHeight(frames[i], 0);
+
+        for (int plane = 0; plane < vsapi->getFrameFormat(frames[i])->numPlanes; ++plane) {
+            const auto stride = vsapi->getStride(frames[i], plane);
+            const auto other_stride = vsapi->getStride(others[i], plane);
+            const uint8_t * ptr = vsapi->getReadPtr(frames[i], plane);
+            const uint8_t * other_ptr = vsapi->getReadPtr(others[i], plane);
+
+            for (int y = 0; y < height; ++y, ptr += stride, other_ptr += other_stride) {
+                const auto row = reinterpret_cast<const float *>(ptr);
+                const auto other_row = reinterpret_cast<const float *>(other_ptr);
+
+                float row_diff = 0.f;
+                for (int x = 0; x < width; ++x) {
+                    row_diff += std::fabs(row[x] - other_row[x]);
+                }
+
+                diff += row_diff;
+                if (diff > budget) {
+                    return false;
+                }
+            }
+        }
+    }
+
+    return true;
+}
+
+
+// removes the least recently used entries that are processed and
+// not waited for until the cache fits
+static void evictEntries(DedupCache * cache, const VSAPI * vsapi) noexcept {
+    auto it = std::end(cache->entries);
+    while (std::size(cache->entries) > cache->capacity && it != std::begin(cache->entries)) {
+        --it;
+        if (it->output && it->waiters == 0) {
+            freeEntry(*it, vsapi);
+            it = cache->entries.erase(it);
+        }
+    }
+}
+
+
+static void setDedupProps(
+    VSMap * props,
+    const DedupCache * cache,
+    bool hit,
+    const VSAPI * vsapi
+) noexcept {
+
+    vsapi->propSetInt(props, "MLRTDedupHit", hit, paReplace);
+    vsapi->propSetInt(props, "MLRTDedupHits", cache->hits.load(std::memory_order_relaxed), paReplace);
+    vsapi->propSetInt(props, "MLRTDedupMisses", cache->misses.load(std::memory_order_relaxed), paReplace);
+}
+
+
+// Returns a copy of the output of a recent input that matches the input
+// frames, or the output of "process" otherwise. A frame whose matching input
+// is still being processed by another thread waits for its output, so that
+// the held frames requested in parallel run the network once.
+const VSFrameRef * dedupGetFrame(
+    DedupCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept try {
+
+    const auto start = std::chrono::steady_clock::now();
+
+    std::vector<const VSFrameRef *> src_frames;
+    src_frames.reserve(std::size(nodes));
+    for (const auto & node : nodes) {
+        src_frames.emplace_back(vsapi->getFrameFilter(n, node, frameCtx));
+    }
+
+    const auto find = [cache](uint64_t id) {
+        auto it = std::begin(cache->entries);
+        while (it != std::end(cache->entries) && it->id != id) {
+            ++it;
+        }
+        return it;
+    };
+
+    std::optional<uint64_t> match;
+    uint64_t hash = 0;
+
+    if (cache->threshold > 0.f) {
+        // the comparisons run on references to the inputs outside of the lock
+        std::vector<std::pair<uint64_t, std::vector<const VSFrameRef *>>> candidates;
+        {
+            std::lock_guard lock { cache->lock };
+            for (const auto & entry : cache->entries) {
+                std::vector<const VSFrameRef *> inputs;
+                for (const auto & frame : entry.inputs) {
+                    inputs.emplace_back(vsapi->cloneFrameRef(frame));
+                }
+                candidates.emplace_back(entry.id, std::move(inputs));
+            }
+        }
+
+        for (const auto & [id, inputs] : candidates) {
+            if (!match.has_value() && isSimilar(src_frames, inputs, cache->threshold, vsapi)) {
+                match = id;
+            }
+            for (const auto & frame : inputs) {
+                vsapi->freeFrame(frame);
+            }
+        }
+    } else {
+        hash = hashFrames(src_frames, vsapi);
+    }
+
+    const VSFrameRef * cached = nullptr;
+    uint64_t id = 0;
+    {
+        std::unique_lock lock { cache->lock };
+
+        if (cache->threshold == 0.f) {
+            for (const auto & entry : cache->entries) {
+                if (entry.hash == hash) {
+                    match = entry.id;
+                    break;
+                }
+            }
+        }
+
+        // the entry may have been evicted since the comparison
+        if (auto it = match.has_value() ? find(match.value()) : std::end(cache->entries); it != std::end(cache->entries)) {
+            it->waiters++;
+            cache->cv.wait(lock, [&] { return it->output || it->failed; });
+            it->waiters--;
+
+            if (it->output) {
+                cached = vsapi->cloneFrameRef(it->output);
+                cache->entries.splice(std::begin(cache->entries), cache->entries, it);
+            } else if (it->waiters == 0) {
+                freeEntry(*it, vsapi);
+                cache->entries.erase(it);
+            }
+        }
+
+        if (!cached) {
+            id = cache->next_id++;
+
+            DedupEntry entry { id, hash, {}, nullptr, false, 0 };
+            if (cache->threshold > 0.f) {
+                for (const auto & frame : src_frames) {
+                    entry.inputs.emplace_back(vsapi->cloneFrameRef(frame));
+                }
+            }
+            cache->entries.emplace_front(std::move(entry));
+
+            evictEntries(cache, vsapi);
+        }
+    }
+
+    if (cached) {
+        cache->hits.fetch_add(1, std::memory_order_relaxed);
+
+        const auto copy_start = std::chrono::steady_clock::now();
+
+        // the properties are those of the current frame
+        const auto format = vsapi->getFrameFormat(cached);
+        VSFrameRef * dst_frame = vsapi->newVideoFrame(
+            format, vsapi->getFrameWidth(cached, 0), vsapi->getFrameHeight(cached, 0),
+            src_frames.front(), core
+        );
+        for (int plane = 0; plane < format->numPlanes; ++plane) {
+            vs_bitblt(
+                vsapi->getWritePtr(dst_frame, plane), vsapi->getStride(dst_frame, plane),
+                vsapi->getReadPtr(cached, plane), vsapi->getStride(cached, plane),
+                vsapi->getFrameWidth(cached, plane) * format->bytesPerSample,
+                vsapi->getFrameHeight(cached, plane)
+            );
+        }
+
+        vsapi->freeFrame(cached);
+        for (const auto & frame : src_frames) {
+            vsapi->freeFrame(frame);
+        }
+
+        auto props = vsapi->getFramePropsRW(dst_frame);
+        setDedupProps(props, cache, true, vsapi);
+
+        if (stats) {
+            const auto end = std::chrono::steady_clock::now();
+            const auto seconds = [](std::chrono::steady_clock::duration time) {
+                return std::chrono::duration<double>(time).count();
+            };
+
+            vsapi->propSetFloat(props, "MLRTWaitTime", seconds(copy_start - start), paReplace);
+            vsapi->propSetFloat(props, "MLRTCopyTime", seconds(end - copy_start), paReplace);
+            vsapi->propSetFloat(props, "MLRTInferenceTime", 0.0, paReplace);
+            vsapi->propSetInt(props, "MLRTTiles", 0, paReplace);
+        }
+
+        return dst_frame;
+    }
+
+    for (const auto & frame : src_frames) {
+        vsapi->freeFrame(frame);
+    }
+
+    cache->misses.fetch_add(1, std::memory_order_relaxed);
+
+    const VSFrameRef * dst_frame = process();
+
+    if (dst_frame) {
+        // the frame is not shared until it is stored in the cache
+        setDedupProps(vsapi->getFramePropsRW(const_cast<VSFrameRef *>(dst_frame)), cache, false, vsapi);
+    }
+
+    {
+        std::lock_guard lock { cache->lock };
+
+        // pending entries are never evicted
+        auto it = find(id);
+        if (dst_frame) {
+            it->output = vsapi->cloneFrameRef(dst_frame);
+        } else if (it->waiters > 0) {
+            it->failed = true;
+        } else {
+            freeEntry(*it, vsapi);
+            cache->entries.erase(it);
+        }
+
+        evictEntries(cache, vsapi);
+    }
+    cache->cv.notify_all();
+
+    return dst_frame;
+} catch (const std::exception & e) {
+    vsapi->setFilterError(e.what(), frameCtx);
+    return nullptr;
+}
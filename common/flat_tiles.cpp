@@ -0,0 +1,350 @@
+#include <algorithm>
+#include <array>
+#include <cmath>
+#include <cstdint>
+#include <cstring>
+#include <iterator>
+#include <list>
+#include <memory>
+#include <mutex>
+#include <optional>
+#include <utility>
+#include <vector>
+
+
+struct FlatTiles;
+
+FlatTiles * flatTilesCreate(float tolerance) noexcept;
+
+void flatTilesFree(FlatTiles * flat_tiles) noexcept;
+
+std::optional<std::vector<float>> getFlatColor(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int x,
+    int y,
+    int width,
+    int height
+) noexcept;
+
+std::array<int, 4> getActiveArea(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int width,
+    int height
+) noexcept;
+
+std::array<int, 4> getCropArea(
+    const std::array<int, 4> & active_area,
+    int width,
+    int height,
+    int tile_w,
+    int tile_h,
+    int overlap_w,
+    int overlap_h
+) noexcept;
+
+std::shared_ptr<const std::vector<uint8_t>> findFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color
+) noexcept;
+
+void storeFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color,
+    std::vector<uint8_t> response
+) noexcept;
+
+void fillOutsideArea(
+    const std::vector<uint8_t *> & planes,
+    int stride,
+    int width,
+    int height,
+    const std::array<int, 4> & area,
+    const std::vector<uint8_t> & response,
+    int tile_w,
+    int tile_h
+) noexcept;
+
+
+// the outputs of the network for constant input tiles of the tile size
+// are kept for this number of colors, the least recently used is dropped
+static constexpr size_t max_flat_responses = 8;
+
+
+struct FlatTiles {
+    float tolerance; // maximum absolute difference of the samples of a flat region
+
+    std::mutex lock;
+    std::list<std::pair<std::vector<float>, std::shared_ptr<const std::vector<uint8_t>>>> responses; // the most recently used first
+};
+
+
+FlatTiles * flatTilesCreate(float tolerance) noexcept {
+    auto flat_tiles = new (std::nothrow) FlatTiles;
+    if (flat_tiles) {
+        flat_tiles->tolerance = tolerance;
+    }
+    return flat_tiles;
+}
+
+
+void flatTilesFree(FlatTiles * flat_tiles) noexcept {
+    delete flat_tiles;
+}
+
+
+// whether the fp32 samples of a row are within the tolerance of "value"
+static bool isFlatRow(
+    const float * row,
+    int width,
+    float value,
+    float tolerance
+) noexcept {
+
+    if (tolerance == 0.f) {
+        for (int x = 0; x < width; ++x) {
+            if (row[x] != value) {
+                return false;
+            }
+        }
+    } else {
+        for (int x = 0; x < width; ++x) {
+            if (std::fabs(row[x] - value) > tolerance) {
+                return false;
+            }
+        }
+    }
+
+    return true;
+}
+
+
+static bool isFlatRegion(
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int x,
+    int y,
+    int width,
+    int height,
+    const std::vector<float> & color,
+    float tolerance
+) noexcept {
+
+    for (size_t i = 0; i < std::size(planes); ++i) {
+        const uint8_t * ptr = planes[i] + y * stride + x * static_cast<int>(sizeof(float));
+
+        for (int row = 0; row < height; ++row, ptr += stride) {
+            if (!isFlatRow(reinterpret_cast<const float *>(ptr), width, color[i], tolerance)) {
+                return false;
+            }
+        }
+    }
+
+    return true;
+}
+
+
+// returns the samples of the first pixel of a region of fp32 planes if
+// every sample of the region is within the tolerance of them
+std::optional<std::vector<float>> getFlatColor(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int x,
+    int y,
+    int width,
+    int height
+) noexcept try {
+
+    std::vector<float> color;
+    color.reserve(std::size(planes));
+    for (const auto & plane : planes) {
+        float value;
+        std::memcpy(&value, plane + y * stride + x * static_cast<int>(sizeof(float)), sizeof(value));
+        color.push_back(value);
+    }
+
+    if (!isFlatRegion(planes, stride, x, y, width, height, color, flat_tiles->tolerance)) {
+        return {};
+    }
+
+    return color;
+} catch (const std::exception &) {
+    return {};
+}
+
+
+// Returns the bounding box { x, y, width, height } of the picture, i.e. the
+// frame without the rows and columns at its borders that have the color of
+// its top-left pixel, e.g. the black bars of letterboxed content.
+std::array<int, 4> getActiveArea(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int width,
+    int height
+) noexcept try {
+
+    const auto color = getFlatColor(flat_tiles, planes, stride, 0, 0, 1, 1);
+    if (!color.has_value()) {
+        return { 0, 0, width, height };
+    }
+
+    const auto is_bar = [&](int x, int y, int w, int h) {
+        return isFlatRegion(planes, stride, x, y, w, h, color.value(), flat_tiles->tolerance);
+    };
+
+    int top = 0;
+    while (top < height && is_bar(0, top, width, 1)) {
+        ++top;
+    }
+
+    if (top == height) {
+        // a constant frame has no picture to crop to
+        return { 0, 0, width, height };
+    }
+
+    int bottom = height;
+    while (bottom > top && is_bar(0, bottom - 1, width, 1)) {
+        --bottom;
+    }
+
+    int left = 0;
+    while (left < width && is_bar(left, top, 1, bottom - top)) {
+        ++left;
+    }
+
+    int right = width;
+    while (right > left && is_bar(right - 1, top, 1, bottom - top)) {
+        --right;
+    }
+
+    return { left, top, right - left, bottom - top };
+} catch (const std::exception &) {
+    return { 0, 0, width, height };
+}
+
+
+// Returns the area { x, y, width, height } covered by the tiles with
+// "auto_crop", i.e. the active area widened by the overlap on each side,
+// so that its pixels see the same input as without cropping, and along an
+// axis where it is still narrower than a tile to a single tile centered on
+// it. Only the outputs of the active area are kept.
+std::array<int, 4> getCropArea(
+    const std::array<int, 4> & active_area,
+    int width,
+    int height,
+    int tile_w,
+    int tile_h,
+    int overlap_w,
+    int overlap_h
+) noexcept {
+
+    std::array<int, 4> area { 0, 0, width, height };
+
+    const int sizes[] { width, height };
+    const int tiles[] { tile_w, tile_h };
+    const int overlaps[] { overlap_w, overlap_h };
+    for (int axis = 0; axis < 2; ++axis) {
+        const auto start = std::max(active_area[axis] - overlaps[axis], 0);
+        const auto end = std::min(active_area[axis] + active_area[axis + 2] + overlaps[axis], sizes[axis]);
+        const auto extent = end - start;
+
+        if (extent >= tiles[axis]) {
+            area[axis] = start;
+            area[axis + 2] = extent;
+        } else if (tiles[axis] < sizes[axis]) {
+            area[axis] = std::clamp(start - (tiles[axis] - extent) / 2, 0, sizes[axis] - tiles[axis]);
+            area[axis + 2] = tiles[axis];
+        }
+    }
+
+    return area;
+}
+
+
+std::shared_ptr<const std::vector<uint8_t>> findFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color
+) noexcept {
+
+    std::lock_guard lock { flat_tiles->lock };
+
+    auto & responses = flat_tiles->responses;
+    for (auto it = std::begin(responses); it != std::end(responses); ++it) {
+        if (it->first == color) {
+            responses.splice(std::begin(responses), responses, it);
+            return responses.front().second;
+        }
+    }
+
+    return nullptr;
+}
+
+
+void storeFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color,
+    std::vector<uint8_t> response
+) noexcept try {
+
+    auto value = std::make_shared<const std::vector<uint8_t>>(std::move(response));
+
+    std::lock_guard lock { flat_tiles->lock };
+
+    auto & responses = flat_tiles->responses;
+    for (auto it = std::begin(responses); it != std::end(responses); ++it) {
+        if (it->first == color) {
+            responses.erase(it);
+            break;
+        }
+    }
+
+    responses.emplace_front(color, std::move(value));
+    if (std::size(responses) > max_flat_responses) {
+        responses.pop_back();
+    }
+} catch (const std::exception &) {
+    return ;
+}
+
+
+// fills the fp32 planes outside of the area with the sample at the center
+// of the corresponding plane of the output tile of a constant input tile,
+// which is the output away from the borders of a tile
+void fillOutsideArea(
+    const std::vector<uint8_t *> & planes,
+    int stride,
+    int width,
+    int height,
+    const std::array<int, 4> & area,
+    const std::vector<uint8_t> & response,
+    int tile_w,
+    int tile_h
+) noexcept {
+
+    const auto [area_x, area_y, area_w, area_h] = area;
+
+    const auto tile_size = static_cast<size_t>(tile_w) * tile_h;
+    const auto center = static_cast<size_t>(tile_h / 2) * tile_w + tile_w / 2;
+
+    for (size_t i = 0; i < std::size(planes); ++i) {
+        float value;
+        std::memcpy(&value, std::data(response) + (i * tile_size + center) * sizeof(float), sizeof(value));
+
+        uint8_t * ptr = planes[i];
+        for (int y = 0; y < height; ++y, ptr += stride) {
+            auto row = reinterpret_cast<float *>(ptr);
+
+            if (y < area_y || y >= area_y + area_h) {
+                std::fill(row, row + width, value);
+            } else {
+                std::fill(row, row + area_x, value);
+                std::fill(row + area_x + area_w, row + width, value);
+            }
+        }
+    }
+}
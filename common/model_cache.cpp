@@ -0,0 +1,380 @@
+#include <algorithm>
+#include <array>
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <filesystem>
+#include <fstream>
+#include <functional>
+#include <iterator>
+#include <optional>
+#include <string>
+#include <string_view>
+#include <system_error>
+#include <thread>
+#include <tuple>
+#include <vector>
+
+#if defined(__x86_64__) || defined(_M_X64) || defined(__i386__) || defined(_M_IX86)
+#define MODEL_CACHE_X86
+#ifdef _MSC_VER
+#include <intrin.h>
+#else // _MSC_VER
+#include <cpuid.h>
+#endif // _MSC_VER
+#elif defined(__APPLE__)
+#include <sys/sysctl.h>
+#endif
+
+
+std::string getHostIdentity() noexcept;
+
+std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept;
+
+std::optional<std::string> loadCachedModel(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept;
+
+void storeCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::string & data,
+    uint64_t max_size
+) noexcept;
+
+std::optional<std::filesystem::path> getCacheTempPath(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept;
+
+bool commitCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::filesystem::path & temp_path,
+    uint64_t max_size
+) noexcept;
+
+
+#ifdef _WIN32
+#include <locale>
+#include <codecvt>
+static inline std::wstring translateName(const char *name) noexcept {
+    std::wstring_convert<std::codecvt_utf8_utf16<wchar_t>> converter;
+    return converter.from_bytes(name);
+}
+#else
+#define translateName(n) (n)
+#endif
+
+
+// bumped whenever the layout of the cache or of the cached models changes
+static constexpr auto model_cache_version = "1";
+
+static constexpr auto model_cache_suffix = ".onnx";
+
+
+static uint64_t fnv1a(
+    const std::string_view & data,
+    uint64_t hash = 0xcbf29ce484222325ULL
+) noexcept {
+
+    for (const auto c : data) {
+        hash ^= static_cast<uint8_t>(c);
+        hash *= 0x100000001b3ULL;
+    }
+
+    return hash;
+}
+
+
+#ifdef MODEL_CACHE_X86
+static std::array<uint32_t, 4> cpuid(uint32_t leaf, uint32_t subleaf = 0) noexcept {
+#ifdef _MSC_VER
+    int regs[4];
+    __cpuidex(regs, static_cast<int>(leaf), static_cast<int>(subleaf));
+    return {
+        static_cast<uint32_t>(regs[0]), static_cast<uint32_t>(regs[1]),
+        static_cast<uint32_t>(regs[2]), static_cast<uint32_t>(regs[3])
+    };
+#else // _MSC_VER
+    unsigned int a = 0, b = 0, c = 0, d = 0;
+    __cpuid_count(leaf, subleaf, a, b, c, d);
+    return { a, b, c, d };
+#endif // _MSC_VER
+}
+#endif // MODEL_CACHE_X86
+
+
+// Describes the cpu of the host, i.e. its model and instruction set
+// extensions, for the keys of cached data that is specific to the host,
+// such as graphs optimized for the kernels and layouts of the cpu.
+std::string getHostIdentity() noexcept try {
+    std::string identity;
+
+#ifdef MODEL_CACHE_X86
+    const auto append = [&identity](uint32_t value) {
+        char buffer[12];
+        std::snprintf(buffer, sizeof(buffer), "%08x;", value);
+        identity += buffer;
+    };
+
+    const auto max_leaf = cpuid(0)[0];
+    const auto max_extended_leaf = cpuid(0x80000000)[0];
+
+    if (max_extended_leaf >= 0x80000004) {
+        for (uint32_t leaf = 0x80000002; leaf <= 0x80000004; ++leaf) {
+            const auto regs = cpuid(leaf);
+            identity.append(reinterpret_cast<const char *>(std::data(regs)), sizeof(regs));
+        }
+        identity.erase(std::find(std::begin(identity), std::end(identity), '\0'), std::end(identity));
+        identity += ";";
+    }
+
+    // family, model and stepping, then the feature flags, without
+    // the apic id and the number of logical processors of ebx
+    auto signature = cpuid(1);
+    signature[1] &= 0xffff;
+    for (const auto value : signature) {
+        append(value);
+    }
+    if (max_leaf >= 7) {
+        for (const auto value : cpuid(7)) {
+            append(value);
+        }
+    }
+#elif defined(__APPLE__)
+    char brand[256] {};
+    size_t size = sizeof(brand) - 1;
+    if (sysctlbyname("machdep.cpu.brand_string", brand, &size, nullptr, 0) == 0) {
+        identity = brand;
+    }
+#else
+    // the model and the feature flags of the first core
+    std::ifstream cpuinfo { "/proc/cpuinfo" };
+    for (std::string line; std::getline(cpuinfo, line) && !line.empty(); ) {
+        for (const auto field : { "model name", "Features", "flags", "CPU implementer", "CPU part" }) {
+            if (line.rfind(field, 0) == 0) {
+                identity += line + ";";
+            }
+        }
+    }
+#endif
+
+    if (identity.empty()) {
+        identity = "unknown";
+    }
+
+    return identity;
+} catch (const std::exception &) {
+    return "unknown";
+}
+
+
+static std::string toHex(uint64_t value) noexcept {
+    constexpr auto digits = "0123456789abcdef";
+
+    std::string hex(16, '0');
+    for (int i = 15; i >= 0; i--) {
+        hex[i] = digits[value & 0xf];
+        value >>= 4;
+    }
+
+    return hex;
+}
+
+
+// the key consists of the hash of the source model and the hash of
+// the description of the processing applied to it
+std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept try {
+
+    uint64_t source_hash;
+    if (path_is_serialization) {
+        source_hash = fnv1a(path);
+    } else {
+        std::ifstream input { translateName(std::string{path}.c_str()), std::ios::binary };
+        if (!input) {
+            return {};
+        }
+
+        std::string data {
+            std::istreambuf_iterator<char>{ input },
+            std::istreambuf_iterator<char>{}
+        };
+        if (input.bad()) {
+            return {};
+        }
+
+        source_hash = fnv1a(data);
+    }
+
+    auto description_hash = fnv1a(
+        description,
+        fnv1a(model_cache_version)
+    );
+
+    return toHex(source_hash) + toHex(description_hash);
+} catch (const std::exception &) {
+    return {};
+}
+
+
+std::optional<std::string> loadCachedModel(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept try {
+
+    auto file = std::filesystem::path{ translateName(cache_dir.c_str()) } / (key + model_cache_suffix);
+
+    std::ifstream input { file, std::ios::binary };
+    if (!input) {
+        return {};
+    }
+
+    std::string data {
+        std::istreambuf_iterator<char>{ input },
+        std::istreambuf_iterator<char>{}
+    };
+    if (input.bad() || std::empty(data)) {
+        return {};
+    }
+
+    // the modification time tracks the last use of an entry for eviction
+    std::error_code ec;
+    std::filesystem::last_write_time(file, std::filesystem::file_time_type::clock::now(), ec);
+
+    return data;
+} catch (const std::exception &) {
+    return {};
+}
+
+
+// removes the least recently used entries until the cache fits in max_size bytes
+static void evictCachedModels(
+    const std::filesystem::path & dir,
+    uint64_t max_size
+) {
+
+    std::vector<std::tuple<std::filesystem::file_time_type, uint64_t, std::filesystem::path>> entries;
+    uint64_t total_size = 0;
+
+    std::error_code ec;
+    for (const auto & entry : std::filesystem::directory_iterator{ dir, ec }) {
+        if (!entry.is_regular_file(ec) || entry.path().extension() != model_cache_suffix) {
+            continue;
+        }
+
+        auto size = entry.file_size(ec);
+        if (ec) {
+            continue;
+        }
+
+        auto time = entry.last_write_time(ec);
+        if (ec) {
+            continue;
+        }
+
+        entries.emplace_back(time, size, entry.path());
+        total_size += size;
+    }
+
+    std::sort(std::begin(entries), std::end(entries));
+
+    for (const auto & [time, size, path] : entries) {
+        if (total_size <= max_size) {
+            break;
+        }
+
+        if (std::filesystem::remove(path, ec)) {
+            total_size -= size;
+        }
+    }
+}
+
+
+// returns a unique path in the cache directory for an entry to be written to
+std::optional<std::filesystem::path> getCacheTempPath(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept try {
+
+    auto dir = std::filesystem::path{ translateName(cache_dir.c_str()) };
+
+    std::error_code ec;
+    std::filesystem::create_directories(dir, ec);
+    if (ec) {
+        return {};
+    }
+
+    auto unique_id = (
+        std::hash<std::thread::id>{}(std::this_thread::get_id()) ^
+        static_cast<size_t>(std::chrono::steady_clock::now().time_since_epoch().count())
+    );
+
+    return dir / (key + "." + toHex(unique_id) + ".tmp");
+} catch (const std::exception &) {
+    return {};
+}
+
+
+// renames a completely written temporary file into the entry, so that
+// concurrent processes never observe a partially written entry
+bool commitCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::filesystem::path & temp_path,
+    uint64_t max_size
+) noexcept try {
+
+    auto dir = std::filesystem::path{ translateName(cache_dir.c_str()) };
+
+    std::error_code ec;
+    std::filesystem::rename(temp_path, dir / (key + model_cache_suffix), ec);
+    if (ec) {
+        std::filesystem::remove(temp_path, ec);
+        return false;
+    }
+
+    evictCachedModels(dir, max_size);
+
+    return true;
+} catch (const std::exception &) {
+    return false;
+}
+
+
+void storeCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::string & data,
+    uint64_t max_size
+) noexcept try {
+
+    auto temp_path = getCacheTempPath(cache_dir, key);
+    if (!temp_path.has_value()) {
+        return ;
+    }
+
+    {
+        std::ofstream output { temp_path.value(), std::ios::binary | std::ios::trunc };
+        output.write(std::data(data), static_cast<std::streamsize>(std::size(data)));
+        output.close();
+        if (!output) {
+            std::error_code ec;
+            std::filesystem::remove(temp_path.value(), ec);
+            return ;
+        }
+    }
+
+    commitCachedModel(cache_dir, key, temp_path.value(), max_size);
+} catch (const std::exception &) {
+    return ;
+}
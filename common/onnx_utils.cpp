@@ -1,18 +1,42 @@
 #include <cstdint>
 #include <fstream>
+#include <iterator>
 #include <optional>
 #include <variant>
 #include <string>
 #include <string_view>
 
+#include <onnx/common/version.h>
 #include <onnx/onnx_pb.h>
 #include <onnx/shape_inference/implementation.h>
 
 
 std::variant<std::string, ONNX_NAMESPACE::ModelProto> loadONNX(
-    const std::string & path,
+    const std::string_view & path,
     int64_t tile_w,
-    int64_t tile_h
+    int64_t tile_h,
+    bool path_is_serialization,
+    int64_t batch,
+    const std::string & cache_dir,
+    uint64_t cache_size
+) noexcept;
+
+extern std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept;
+
+extern std::optional<std::string> loadCachedModel(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept;
+
+extern void storeCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::string & data,
+    uint64_t max_size
 ) noexcept;
 
 
@@ -101,16 +125,45 @@ std::variant<std::string, ONNX_NAMESPACE::ModelProto> loadONNX(
     const std::string_view & path,
     int64_t tile_w,
     int64_t tile_h,
-    bool path_is_serialization
+    bool path_is_serialization,
+    int64_t batch,
+    const std::string & cache_dir,
+    uint64_t cache_size
 ) noexcept {
 
     ONNX_NAMESPACE::ModelProto onnx_proto;
 
-    if (path_is_serialization) {
-        if (!onnx_proto.ParseFromArray(path.data(), static_cast<int>(path.size()))) {
-            return "parse onnx serialization failed"s;
+    if (std::empty(cache_dir)) {
+        if (path_is_serialization) {
+            if (!onnx_proto.ParseFromArray(path.data(), static_cast<int>(path.size()))) {
+                return "parse onnx serialization failed"s;
+            }
+        } else {
+            std::ifstream onnx_stream(
+                translateName(path.data()),
+                std::ios::binary
+            );
+
+            if (!onnx_stream.good()) {
+                return "open "s + std::string{ path } + " failed"s;
+            }
+
+            if (!onnx_proto.ParseFromIstream(&onnx_stream)) {
+                return "parse "s + std::string{ path } + " failed"s;
+            }
         }
-    } else {
+
+        if (auto err = specifyShape(onnx_proto, tile_w, tile_h, batch); err.has_value()) {
+            return err.value();
+        }
+
+        return onnx_proto;
+    }
+
+    // the shape-specialized model is cached, skipping shape inference on later loads
+    std::string onnx_data;
+    std::string_view serialization = path;
+    if (!path_is_serialization) {
         std::ifstream onnx_stream(
             translateName(path.data()),
             std::ios::binary
@@ -120,14 +173,55 @@ std::variant<std::string, ONNX_NAMESPACE::ModelProto> loadONNX(
             return "open "s + std::string{ path } + " failed"s;
         }
 
-        if (!onnx_proto.ParseFromIstream(&onnx_stream)) {
+        try {
+            onnx_data.assign(
+                std::istreambuf_iterator<char>{ onnx_stream },
+                std::istreambuf_iterator<char>{}
+            );
+        } catch (const std::exception &) {
+            return "read "s + std::string{ path } + " failed"s;
+        }
+        if (onnx_stream.bad()) {
+            return "read "s + std::string{ path } + " failed"s;
+        }
+
+        serialization = onnx_data;
+    }
+
+    auto description = (
+        "shape;"s + ONNX_NAMESPACE::LAST_RELEASE_VERSION + ";" +
+        std::to_string(tile_w) + "x" + std::to_string(tile_h) + "x" +
+        std::to_string(batch)
+    );
+
+    auto cache_key = getModelCacheKey(serialization, true, description);
+    if (cache_key.has_value()) {
+        if (auto cached = loadCachedModel(cache_dir, cache_key.value()); cached.has_value()) {
+            if (onnx_proto.ParseFromString(cached.value())) {
+                return onnx_proto;
+            }
+            onnx_proto.Clear();
+        }
+    }
+
+    if (!onnx_proto.ParseFromArray(serialization.data(), static_cast<int>(serialization.size()))) {
+        if (path_is_serialization) {
+            return "parse onnx serialization failed"s;
+        } else {
             return "parse "s + std::string{ path } + " failed"s;
         }
     }
 
-    if (auto err = specifyShape(onnx_proto, tile_w, tile_h); err.has_value()) {
+    if (auto err = specifyShape(onnx_proto, tile_w, tile_h, batch); err.has_value()) {
         return err.value();
     }
 
+    if (cache_key.has_value()) {
+        std::string shaped_data;
+        if (onnx_proto.SerializeToString(&shaped_data)) {
+            storeCachedModel(cache_dir, cache_key.value(), shaped_data, cache_size);
+        }
+    }
+
     return onnx_proto;
 }
@@ -0,0 +1,472 @@
+#include <algorithm>
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <cstring>
+#include <filesystem>
+#include <fstream>
+#include <functional>
+#include <iterator>
+#include <mutex>
+#include <string>
+#include <system_error>
+#include <thread>
+#include <tuple>
+#include <vector>
+
+#include <VapourSynth.h>
+#include <VSHelper.h>
+
+
+struct ResultCache;
+
+ResultCache * resultCacheCreate(
+    const std::string & cache_dir,
+    const std::string & key,
+    uint64_t max_size
+) noexcept;
+
+void resultCacheFree(ResultCache * cache) noexcept;
+
+const VSFrameRef * resultCacheGetFrame(
+    ResultCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    const VSVideoInfo * vi,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+
+#ifdef _WIN32
+#include <locale>
+#include <codecvt>
+static inline std::wstring translateName(const char *name) noexcept {
+    std::wstring_convert<std::codecvt_utf8_utf16<wchar_t>> converter;
+    return converter.from_bytes(name);
+}
+#else
+#define translateName(n) (n)
+#endif
+
+
+// bumped whenever the layout of the cache or of the entries changes
+static constexpr uint32_t result_cache_version = 1;
+
+static constexpr auto result_cache_suffix = ".frame";
+
+// the cache is trimmed to this fraction of its size limit, so that
+// the directory is not scanned on every store once it is full
+static constexpr double result_cache_low_watermark = 0.9;
+
+
+// the header of an entry, followed by the rows of the planes without padding
+struct ResultHeader {
+    char magic[8];
+    uint32_t version;
+    int32_t color_family;
+    int32_t sample_type;
+    int32_t bits_per_sample;
+    int32_t subsampling_w;
+    int32_t subsampling_h;
+    int32_t width;
+    int32_t height;
+};
+
+
+// Output frames of a model stored on disk, one file per entry under
+// "<cache_dir>/<key>/", where the key identifies the model and its settings.
+// The size limit applies to the whole cache directory, so that models share
+// the space, and the least recently used entries are removed first.
+struct ResultCache {
+    std::filesystem::path root;
+    std::filesystem::path dir;
+    uint64_t max_size;
+
+    std::mutex evict_lock;
+    std::atomic<uint64_t> total_size; // estimated size of the cache directory in bytes
+
+    std::atomic<int64_t> hits {};
+    std::atomic<int64_t> misses {};
+};
+
+
+static std::string toHex(uint64_t value) noexcept {
+    constexpr auto digits = "0123456789abcdef";
+
+    std::string hex(16, '0');
+    for (int i = 15; i >= 0; i--) {
+        hex[i] = digits[value & 0xf];
+        value >>= 4;
+    }
+
+    return hex;
+}
+
+
+// returns the entries of the cache directory, the least recently used first
+static std::vector<std::tuple<std::filesystem::file_time_type, uint64_t, std::filesystem::path>>
+listEntries(const std::filesystem::path & root) {
+
+    std::vector<std::tuple<std::filesystem::file_time_type, uint64_t, std::filesystem::path>> entries;
+
+    std::error_code ec;
+    for (const auto & entry : std::filesystem::recursive_directory_iterator{ root, ec }) {
+        if (!entry.is_regular_file(ec) || entry.path().extension() != result_cache_suffix) {
+            continue;
+        }
+
+        auto size = entry.file_size(ec);
+        if (ec) {
+            continue;
+        }
+
+        auto time = entry.last_write_time(ec);
+        if (ec) {
+            continue;
+        }
+
+        entries.emplace_back(time, size, entry.path());
+    }
+
+    std::sort(std::begin(entries), std::end(entries));
+
+    return entries;
+}
+
+
+ResultCache * resultCacheCreate(
+    const std::string & cache_dir,
+    const std::string & key,
+    uint64_t max_size
+) noexcept try {
+
+    auto root = std::filesystem::path{ translateName(cache_dir.c_str()) };
+    auto dir = root / key;
+
+    std::error_code ec;
+    std::filesystem::create_directories(dir, ec);
+    if (ec) {
+        return nullptr;
+    }
+
+    uint64_t total_size = 0;
+    for (const auto & [time, size, path] : listEntries(root)) {
+        total_size += size;
+    }
+
+    auto cache = new ResultCache;
+    cache->root = std::move(root);
+    cache->dir = std::move(dir);
+    cache->max_size = max_size;
+    cache->total_size = total_size;
+
+    return cache;
+} catch (const std::exception &) {
+    return nullptr;
+}
+
+
+void resultCacheFree(ResultCache * cache) noexcept {
+    delete cache;
+}
+
+
+// hashes the formats and the samples of the frames into 128 bits,
+// excluding the padding of the rows
+static std::string hashFrames(
+    const std::vector<const VSFrameRef *> & frames,
+    const VSAPI * vsapi
+) noexcept {
+
+    uint64_t hash0 = 0xcbf29ce484222325ULL;
+    uint64_t hash1 = 0x9e3779b97f4a7c15ULL;
+
+    const auto mix = [&hash0, &hash1](uint64_t value) {
+        hash0 = (hash0 ^ value) * 0x100000001b3ULL;
+        hash0 ^= hash0 >> 29;
+        hash1 = (hash1 + value) * 0xff51afd7ed558ccdULL;
+        hash1 ^= hash1 >> 32;
+    };
+
+    for (const auto & frame : frames) {
+        const auto format = vsapi->getFrameFormat(frame);
+        mix(static_cast<uint64_t>(format->id));
+
+        for (int plane = 0; plane < format->numPlanes; ++plane) {
+            const auto width_bytes = vsapi->getFrameWidth(frame, plane) * format->bytesPerSample;
+            const auto height = vsapi->getFrameHeight(frame, plane);
+            mix((static_cast<uint64_t>(width_bytes) << 32) | static_cast<uint32_t>(height));
+
+            const auto stride = vsapi->getStride(frame, plane);
+            const uint8_t * ptr = vsapi->getReadPtr(frame, plane);
+
+            for (int y = 0; y < height; ++y, ptr += stride) {
+                int x = 0;
+                for (; x + 8 <= width_bytes; x += 8) {
+                    uint64_t value;
+                    std::memcpy(&value, ptr + x, sizeof(value));
+                    mix(value);
+                }
+                for (; x < width_bytes; ++x) {
+                    mix(ptr[x]);
+                }
+            }
+        }
+    }
+
+    return toHex(hash0) + toHex(hash1);
+}
+
+
+static ResultHeader makeHeader(const VSVideoInfo * vi) noexcept {
+    ResultHeader header {};
+    std::memcpy(header.magic, "VSMLRTRC", sizeof(header.magic));
+    header.version = result_cache_version;
+    header.color_family = vi->format->colorFamily;
+    header.sample_type = vi->format->sampleType;
+    header.bits_per_sample = vi->format->bitsPerSample;
+    header.subsampling_w = vi->format->subSamplingW;
+    header.subsampling_h = vi->format->subSamplingH;
+    header.width = vi->width;
+    header.height = vi->height;
+    return header;
+}
+
+
+// reads an entry into a new frame with the properties of "props_src",
+// returns nullptr if the entry does not exist or does not match the output
+static VSFrameRef * loadEntry(
+    const std::filesystem::path & path,
+    const VSVideoInfo * vi,
+    const VSFrameRef * props_src,
+    VSCore * core,
+    const VSAPI * vsapi
+) noexcept try {
+
+    std::ifstream input { path, std::ios::binary };
+    if (!input) {
+        return nullptr;
+    }
+
+    ResultHeader header;
+    input.read(reinterpret_cast<char *>(&header), sizeof(header));
+
+    const auto expected = makeHeader(vi);
+    if (!input || std::memcmp(&header, &expected, sizeof(header)) != 0) {
+        return nullptr;
+    }
+
+    VSFrameRef * frame = vsapi->newVideoFrame(vi->format, vi->width, vi->height, props_src, core);
+
+    for (int plane = 0; plane < vi->format->numPlanes; ++plane) {
+        const auto width_bytes = vsapi->getFrameWidth(frame, plane) * vi->format->bytesPerSample;
+        const auto height = vsapi->getFrameHeight(frame, plane);
+        const auto stride = vsapi->getStride(frame, plane);
+        uint8_t * ptr = vsapi->getWritePtr(frame, plane);
+
+        if (stride == width_bytes) {
+            input.read(reinterpret_cast<char *>(ptr), static_cast<std::streamsize>(width_bytes) * height);
+        } else {
+            for (int y = 0; y < height && input; ++y, ptr += stride) {
+                input.read(reinterpret_cast<char *>(ptr), width_bytes);
+            }
+        }
+    }
+
+    if (!input) {
+        vsapi->freeFrame(frame);
+        return nullptr;
+    }
+
+    // the modification time tracks the last use of an entry for eviction
+    std::error_code ec;
+    std::filesystem::last_write_time(path, std::filesystem::file_time_type::clock::now(), ec);
+
+    return frame;
+} catch (const std::exception &) {
+    return nullptr;
+}
+
+
+// removes the least recently used entries of the cache directory until
+// it fits in the low watermark of the size limit
+static void evictEntries(ResultCache * cache) {
+    std::lock_guard lock { cache->evict_lock };
+
+    if (cache->total_size.load(std::memory_order_relaxed) <= cache->max_size) {
+        return ;
+    }
+
+    // other instances and processes may share the directory
+    auto entries = listEntries(cache->root);
+
+    uint64_t total_size = 0;
+    for (const auto & [time, size, path] : entries) {
+        total_size += size;
+    }
+
+    const auto target = static_cast<uint64_t>(cache->max_size * result_cache_low_watermark);
+
+    std::error_code ec;
+    for (const auto & [time, size, path] : entries) {
+        if (total_size <= target) {
+            break;
+        }
+
+        if (std::filesystem::remove(path, ec)) {
+            total_size -= size;
+        }
+    }
+
+    cache->total_size.store(total_size, std::memory_order_relaxed);
+}
+
+
+// writes the frame to a temporary file that is renamed into the entry,
+// so that concurrent readers never observe a partially written entry
+static void storeEntry(
+    ResultCache * cache,
+    const std::filesystem::path & path,
+    const VSFrameRef * frame,
+    const VSVideoInfo * vi,
+    const VSAPI * vsapi
+) noexcept try {
+
+    auto unique_id = (
+        std::hash<std::thread::id>{}(std::this_thread::get_id()) ^
+        static_cast<size_t>(std::chrono::steady_clock::now().time_since_epoch().count())
+    );
+    auto temp_path = path;
+    temp_path += "." + toHex(unique_id) + ".tmp";
+
+    uint64_t size = sizeof(ResultHeader);
+    {
+        std::ofstream output { temp_path, std::ios::binary | std::ios::trunc };
+
+        const auto header = makeHeader(vi);
+        output.write(reinterpret_cast<const char *>(&header), sizeof(header));
+
+        for (int plane = 0; plane < vi->format->numPlanes; ++plane) {
+            const auto width_bytes = vsapi->getFrameWidth(frame, plane) * vi->format->bytesPerSample;
+            const auto height = vsapi->getFrameHeight(frame, plane);
+            const auto stride = vsapi->getStride(frame, plane);
+            const uint8_t * ptr = vsapi->getReadPtr(frame, plane);
+
+            for (int y = 0; y < height; ++y, ptr += stride) {
+                output.write(reinterpret_cast<const char *>(ptr), width_bytes);
+            }
+
+            size += static_cast<uint64_t>(width_bytes) * height;
+        }
+
+        output.close();
+        if (!output) {
+            std::error_code ec;
+            std::filesystem::remove(temp_path, ec);
+            return ;
+        }
+    }
+
+    std::error_code ec;
+    std::filesystem::rename(temp_path, path, ec);
+    if (ec) {
+        std::filesystem::remove(temp_path, ec);
+        return ;
+    }
+
+    if (cache->total_size.fetch_add(size, std::memory_order_relaxed) + size > cache->max_size) {
+        evictEntries(cache);
+    }
+} catch (const std::exception &) {
+    return ;
+}
+
+
+static void setResultCacheProps(
+    VSMap * props,
+    const ResultCache * cache,
+    bool hit,
+    const VSAPI * vsapi
+) noexcept {
+
+    vsapi->propSetInt(props, "MLRTResultCacheHit", hit, paReplace);
+    vsapi->propSetInt(props, "MLRTResultCacheHits", cache->hits.load(std::memory_order_relaxed), paReplace);
+    vsapi->propSetInt(props, "MLRTResultCacheMisses", cache->misses.load(std::memory_order_relaxed), paReplace);
+}
+
+
+// Returns the stored output of the input frames if it exists in the cache,
+// or the output of "process" otherwise, which is then stored.
+// Failures of the cache directory are not errors, the frame is processed
+// as if the cache were disabled.
+const VSFrameRef * resultCacheGetFrame(
+    ResultCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    const VSVideoInfo * vi,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept try {
+
+    const auto start = std::chrono::steady_clock::now();
+
+    std::vector<const VSFrameRef *> src_frames;
+    src_frames.reserve(std::size(nodes));
+    for (const auto & node : nodes) {
+        src_frames.emplace_back(vsapi->getFrameFilter(n, node, frameCtx));
+    }
+
+    const auto path = cache->dir / (hashFrames(src_frames, vsapi) + result_cache_suffix);
+
+    const auto read_start = std::chrono::steady_clock::now();
+
+    VSFrameRef * cached = loadEntry(path, vi, src_frames.front(), core, vsapi);
+
+    for (const auto & frame : src_frames) {
+        vsapi->freeFrame(frame);
+    }
+
+    if (cached) {
+        cache->hits.fetch_add(1, std::memory_order_relaxed);
+
+        auto props = vsapi->getFramePropsRW(cached);
+        setResultCacheProps(props, cache, true, vsapi);
+
+        if (stats) {
+            const auto end = std::chrono::steady_clock::now();
+            const auto seconds = [](std::chrono::steady_clock::duration time) {
+                return std::chrono::duration<double>(time).count();
+            };
+
+            vsapi->propSetFloat(props, "MLRTWaitTime", seconds(read_start - start), paReplace);
+            vsapi->propSetFloat(props, "MLRTCopyTime", seconds(end - read_start), paReplace);
+            vsapi->propSetFloat(props, "MLRTInferenceTime", 0.0, paReplace);
+            vsapi->propSetInt(props, "MLRTTiles", 0, paReplace);
+        }
+
+        return cached;
+    }
+
+    cache->misses.fetch_add(1, std::memory_order_relaxed);
+
+    const VSFrameRef * dst_frame = process();
+
+    if (dst_frame) {
+        storeEntry(cache, path, dst_frame, vi, vsapi);
+
+        // the frame is not shared until it is returned
+        setResultCacheProps(vsapi->getFramePropsRW(const_cast<VSFrameRef *>(dst_frame)), cache, false, vsapi);
+    }
+
+    return dst_frame;
+} catch (const std::exception & e) {
+    vsapi->setFilterError(e.what(), frameCtx);
+    return nullptr;
+}
@@ -0,0 +1,159 @@
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <cstdio>
+#include <exception>
+#include <memory>
+#include <mutex>
+#include <string>
+#include <thread>
+
+
+void traceStart(size_t capacity) noexcept;
+
+std::string traceStop() noexcept;
+
+bool traceEnabled() noexcept;
+
+int64_t traceNow() noexcept;
+
+int traceThreadId() noexcept;
+
+void traceEvent(
+    const char * name,
+    int64_t begin,
+    int64_t end,
+    int tid,
+    int frame,
+    int tile
+) noexcept;
+
+
+// Tracks of the timeline, in the "tid" of the events:
+//   [0, 1000): work on a stream (copies and inference of tiles)
+//   [1000, 2000): asynchronous inference of a stream, if it overlaps with
+//                 the copies of the stream
+//   [10000, ...): work of a thread of the core (frames and waits for a stream)
+static constexpr int thread_track_offset = 10000;
+
+
+// a complete event, "name" must be a string literal
+struct TraceSlot {
+    const char * name;
+    int64_t begin;
+    int64_t end;
+    int tid;
+    int frame;
+    int tile;
+};
+
+
+static std::mutex trace_lock; // serializes traceStart() and traceStop()
+static std::atomic<bool> trace_enabled {};
+static std::atomic<int> trace_writers {}; // number of traceEvent() in flight
+static std::atomic<uint64_t> trace_head {}; // number of recorded events
+static std::unique_ptr<TraceSlot[]> trace_slots;
+static size_t trace_capacity {};
+
+
+bool traceEnabled() noexcept {
+    return trace_enabled.load(std::memory_order_relaxed);
+}
+
+
+int64_t traceNow() noexcept {
+    return std::chrono::duration_cast<std::chrono::nanoseconds>(
+        std::chrono::steady_clock::now().time_since_epoch()
+    ).count();
+}
+
+
+int traceThreadId() noexcept {
+    static std::atomic<int> next_id {};
+    thread_local int id = next_id.fetch_add(1, std::memory_order_relaxed);
+    return thread_track_offset + id;
+}
+
+
+// Recording is lock-free: a writer claims a slot of the ring buffer by
+// incrementing the head, the oldest events are overwritten once it is full.
+// traceStop() disables recording and waits for the writers in flight
+// before the buffer is read.
+void traceEvent(
+    const char * name,
+    int64_t begin,
+    int64_t end,
+    int tid,
+    int frame,
+    int tile
+) noexcept {
+
+    trace_writers.fetch_add(1, std::memory_order_seq_cst);
+
+    if (trace_enabled.load(std::memory_order_seq_cst)) {
+        auto index = trace_head.fetch_add(1, std::memory_order_relaxed);
+        trace_slots[index % trace_capacity] = { name, begin, end, tid, frame, tile };
+    }
+
+    trace_writers.fetch_sub(1, std::memory_order_release);
+}
+
+
+void traceStart(size_t capacity) noexcept try {
+    std::lock_guard<std::mutex> lock { trace_lock };
+
+    if (trace_enabled.load(std::memory_order_relaxed) || capacity == 0) {
+        return ;
+    }
+
+    if (capacity != trace_capacity) {
+        trace_slots = std::make_unique<TraceSlot[]>(capacity);
+        trace_capacity = capacity;
+    }
+
+    trace_head.store(0, std::memory_order_relaxed);
+    trace_enabled.store(true, std::memory_order_seq_cst);
+} catch (const std::exception &) {
+    return ;
+}
+
+
+// returns the recorded events as a json array of chrome trace events,
+// with timestamps in microseconds
+std::string traceStop() noexcept try {
+    std::lock_guard<std::mutex> lock { trace_lock };
+
+    if (!trace_enabled.load(std::memory_order_relaxed)) {
+        return "[]";
+    }
+
+    trace_enabled.store(false, std::memory_order_seq_cst);
+    while (trace_writers.load(std::memory_order_acquire) != 0) {
+        std::this_thread::yield();
+    }
+
+    auto head = trace_head.load(std::memory_order_relaxed);
+    auto first = head > trace_capacity ? head - trace_capacity : 0;
+
+    std::string events = "[";
+    char buffer[256];
+    for (auto i = first; i < head; i++) {
+        const auto & slot = trace_slots[i % trace_capacity];
+        std::snprintf(
+            buffer, sizeof(buffer),
+            "%s{\"name\":\"%s\",\"ph\":\"X\",\"ts\":%.3f,\"dur\":%.3f,"
+            "\"tid\":%d,\"args\":{\"frame\":%d,\"tile\":%d}}",
+            i == first ? "" : ",",
+            slot.name,
+            static_cast<double>(slot.begin) / 1e3,
+            static_cast<double>(slot.end - slot.begin) / 1e3,
+            slot.tid, slot.frame, slot.tile
+        );
+        events += buffer;
+    }
+    events += "]";
+
+    return events;
+} catch (const std::exception &) {
+    return "[]";
+}
@@ -10,9 +10,13 @@ __all__ = [
     "RIFE", "RIFEModel", "RIFEMerge"
 ]
 
+import atexit
+import contextlib
 import copy
 from dataclasses import dataclass, field
 import enum
+import functools
+import json
 import math
 import os
 import subprocess
@@ -47,6 +51,30 @@ def get_plugins_path() -> str:
 plugins_path: str = get_plugins_path()
 trtexec_path: str = os.path.join(plugins_path, "vsmlrt-cuda", "trtexec")
 models_path: str = os.path.join(plugins_path, "models")
+# directory of the on-disk cache of shape-specialized and fp16-converted models
+# for the ort, ov and ncnn backends, disabled if None
+model_cache_path: typing.Optional[str] = os.environ.get("VSMLRT_MODEL_CACHE_PATH")
+model_cache_size: int = 2048 # in MiB
+# root directory of the engines built by trtexec, next to the onnx models if None
+engine_cache_path: typing.Optional[str] = os.environ.get("VSMLRT_ENGINE_CACHE_PATH")
+engine_cache_size: typing.Optional[int] = None # in MiB, unbounded if None
+# directory of the on-disk cache of output frames, keyed by the input frames
+# and the model with its settings, disabled if None
+result_cache_path: typing.Optional[str] = os.environ.get("VSMLRT_RESULT_CACHE_PATH")
+result_cache_size: int = 10240 # in MiB
+# per-stream memory budget of tiles="auto", and the memory usage of a tile pixel
+# for networks whose activations cannot be estimated by estimate_bytes_per_pixel()
+tile_memory_budget: int = 2048 # in MiB
+tile_bytes_per_pixel: int = 1024 # in fp32
+# directory of the per-host profiles written by autotune()
+autotune_profile_path: str = os.environ.get(
+    "VSMLRT_AUTOTUNE_PROFILE_PATH",
+    os.path.join(os.path.expanduser("~"), ".vsmlrt")
+)
+# whether different engines may be built concurrently on the same device
+parallel_engine_builds: bool = True
+# file the timeline of the plugins is written to at exit, disabled if None
+trace_path: typing.Optional[str] = os.environ.get("VSMLRT_TRACE")
 
 
 class Backend:
@@ -56,9 +84,25 @@ class Backend:
         verbosity: int = 2
         fp16: bool = False
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
+        batch_size: int = 1
+        temporal_batching: bool = False # batches frames instead of tiles
+        max_batch_wait: int = 10 # in milliseconds
+        pipeline: bool = False # overlaps tile copies with inference
+        optimized_model_cache: typing.Optional[str] = None
+        share_session: bool = False # shares sessions between streams and filter instances
+        intra_op_num_threads: int = 0 # 0: default
+        inter_op_num_threads: int = 0 # 0: default
+        dynamic_edge_tiles: bool = False # runs the last column and row of tiles at their actual size
+        stats: bool = False # attaches per-frame timings as frame properties
+        dedup: int = 0 # number of recent inputs whose outputs are reused for identical frames, 0: disabled
+        dedup_threshold: float = 0.0 # maximum mean absolute difference of matching frames, 0: exact match
+        skip_flat_tiles: bool = False # reuses the output of a constant tile for tiles of a single color
+        auto_crop: bool = False # runs the network only on the picture inside borders of a single color
+        flat_tolerance: float = 0.0 # maximum absolute difference of the samples of flat tiles and borders
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
+        _tile_multiple: int = field(default=1, init=False, repr=False, compare=False)
 
     @dataclass(frozen=False)
     class ORT_CUDA:
@@ -70,6 +114,13 @@ class Backend:
         fp16: bool = False
         use_cuda_graph: bool = False # preview, not supported by all models
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
+        optimized_model_cache: typing.Optional[str] = None
+        stats: bool = False # attaches per-frame timings as frame properties
+        dedup: int = 0 # number of recent inputs whose outputs are reused for identical frames, 0: disabled
+        dedup_threshold: float = 0.0 # maximum mean absolute difference of matching frames, 0: exact match
+        skip_flat_tiles: bool = False # reuses the output of a constant tile for tiles of a single color
+        auto_crop: bool = False # runs the network only on the picture inside borders of a single color
+        flat_tolerance: float = 0.0 # maximum absolute difference of the samples of flat tiles and borders
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -81,9 +132,22 @@ class Backend:
         bind_thread: bool = True
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
         bf16: bool = False
+        batch_size: int = 1
+        temporal_batching: bool = False # batches frames instead of tiles
+        max_batch_wait: int = 10 # in milliseconds
+        pipeline: bool = False # overlaps tile copies with inference
+        cache_dir: typing.Optional[str] = None # compiled network cache
+        dynamic_edge_tiles: bool = False # runs the last column and row of tiles at their actual size
+        stats: bool = False # attaches per-frame timings as frame properties
+        dedup: int = 0 # number of recent inputs whose outputs are reused for identical frames, 0: disabled
+        dedup_threshold: float = 0.0 # maximum mean absolute difference of matching frames, 0: exact match
+        skip_flat_tiles: bool = False # reuses the output of a constant tile for tiles of a single color
+        auto_crop: bool = False # runs the network only on the picture inside borders of a single color
+        flat_tolerance: float = 0.0 # maximum absolute difference of the samples of flat tiles and borders
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
+        _tile_multiple: int = field(default=1, init=False, repr=False, compare=False)
 
     @dataclass(frozen=False)
     class TRT:
@@ -108,8 +172,19 @@ class Backend:
 
         heuristic: bool = False # only supported on Ampere+ with TensorRT 8.5+
 
+        # runs the last column and row of tiles at their actual size, requires static_shape=False
+        dynamic_edge_tiles: bool = False
+
+        stats: bool = False # attaches per-frame timings as frame properties
+        dedup: int = 0 # number of recent inputs whose outputs are reused for identical frames, 0: disabled
+        dedup_threshold: float = 0.0 # maximum mean absolute difference of matching frames, 0: exact match
+        skip_flat_tiles: bool = False # reuses the output of a constant tile for tiles of a single color
+        auto_crop: bool = False # runs the network only on the picture inside borders of a single color
+        flat_tolerance: float = 0.0 # maximum absolute difference of the samples of flat tiles and borders
+
         # internal backend attributes
         _channels: int = field(init=False, repr=False, compare=False)
+        _tile_multiple: int = field(default=1, init=False, repr=False, compare=False)
         supports_onnx_serialization: bool = False
 
     @dataclass(frozen=False)
@@ -119,6 +194,13 @@ class Backend:
         num_streams: typing.Union[int, str] = 1
         device_id: int = 0
         fp16_blacklist_ops: typing.Optional[typing.Sequence[str]] = None
+        cache_dir: typing.Optional[str] = None # compiled network cache
+        stats: bool = False # attaches per-frame timings as frame properties
+        dedup: int = 0 # number of recent inputs whose outputs are reused for identical frames, 0: disabled
+        dedup_threshold: float = 0.0 # maximum mean absolute difference of matching frames, 0: exact match
+        skip_flat_tiles: bool = False # reuses the output of a constant tile for tiles of a single color
+        auto_crop: bool = False # runs the network only on the picture inside borders of a single color
+        flat_tolerance: float = 0.0 # maximum absolute difference of the samples of flat tiles and borders
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -129,6 +211,9 @@ class Backend:
         fp16: bool = False
         device_id: int = 0
         num_streams: int = 1
+        stats: bool = False # attaches per-frame timings as frame properties
+        dedup: int = 0 # number of recent inputs whose outputs are reused for identical frames, 0: disabled
+        dedup_threshold: float = 0.0 # maximum mean absolute difference of matching frames, 0: exact match
 
         # internal backend attributes
         supports_onnx_serialization: bool = True
@@ -162,9 +247,9 @@ def Waifu2x(
     clip: vs.VideoNode,
     noise: typing.Literal[-1, 0, 1, 2, 3] = -1,
     scale: typing.Literal[1, 2] = 2,
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
-    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     model: typing.Literal[0, 1, 2, 3, 4, 5, 6] = 6,
     backend: backendT = Backend.OV_CPU(),
     preprocess: bool = True
@@ -199,18 +284,59 @@ def Waifu2x(
     elif clip.format.id != vs.RGBS:
         raise ValueError(f'{func_name}: "clip" must be of RGBS format')
 
-    if overlap is None:
-        overlap_w = overlap_h = [8, 8, 8, 8, 8, 4, 4][model]
-    elif isinstance(overlap, int):
-        overlap_w = overlap_h = overlap
+    folder_path = os.path.join(
+        models_path,
+        "waifu2x",
+        tuple(Waifu2xModel.__members__)[model]
+    )
+
+    if model in (0, 1, 2):
+        if noise == -1:
+            model_name = "scale2.0x_model.onnx"
+        else:
+            model_name = f"noise{noise}_model.onnx"
+    elif model in (3, 4, 5):
+        if noise == -1:
+            model_name = "scale2.0x_model.onnx"
+        else:
+            model_name = f"noise{noise}_scale2.0x_model.onnx"
     else:
-        overlap_w, overlap_h = overlap
+        if scale == 1:
+            scale_name = ""
+        else:
+            scale_name = "scale2.0x_"
+
+        if noise == -1:
+            model_name = "scale2.0x_model.onnx"
+        else:
+            model_name = f"noise{noise}_{scale_name}model.onnx"
+
+    network_path = os.path.join(folder_path, model_name)
+
+    tuned = load_tuned_settings(
+        backend, "Waifu2x", clip.width, clip.height,
+        dict(noise=noise, scale=scale, model=model, preprocess=preprocess)
+    )
+    if tuned is not None and tiles is None and tilesize is None:
+        tiles = tuned["tiles"]
 
     if model == 6:
         multiple = 4
     else:
         multiple = 1
 
+    if overlap is None:
+        overlap_w = overlap_h = [8, 8, 8, 8, 8, 4, 4][model]
+    elif overlap == "auto":
+        overlap_w, multiple = calc_overlap(
+            network_path, default=[8, 8, 8, 8, 8, 4, 4][model], multiple=multiple
+        )
+        overlap_h = overlap_w
+    elif isinstance(overlap, int):
+        overlap_w = overlap_h = overlap
+    else:
+        overlap_w, overlap_h = overlap
+
     width, height = clip.width, clip.height
     if preprocess and model in (0, 1, 2):
         # emulating cv2.resize(interpolation=cv2.INTER_CUBIC)
@@ -224,7 +350,8 @@ def Waifu2x(
         tiles=tiles, tilesize=tilesize,
         width=clip.width, height=clip.height,
         multiple=multiple,
-        overlap_w=overlap_w, overlap_h=overlap_h
+        overlap_w=overlap_w, overlap_h=overlap_h,
+        backend=backend, network_path=network_path
     )
 
     if tile_w % multiple != 0 or tile_h % multiple != 0:
@@ -240,38 +367,11 @@ def Waifu2x(
     backend = init_backend(
         backend=backend,
         channels=channels,
-        trt_max_shapes=(tile_w, tile_h)
-    )
-
-    folder_path = os.path.join(
-        models_path,
-        "waifu2x",
-        tuple(Waifu2xModel.__members__)[model]
+        trt_max_shapes=(tile_w, tile_h),
+        multiple=multiple,
+        tuned=tuned
     )
 
-    if model in (0, 1, 2):
-        if noise == -1:
-            model_name = "scale2.0x_model.onnx"
-        else:
-            model_name = f"noise{noise}_model.onnx"
-    elif model in (3, 4, 5):
-        if noise == -1:
-            model_name = "scale2.0x_model.onnx"
-        else:
-            model_name = f"noise{noise}_scale2.0x_model.onnx"
-    else:
-        if scale == 1:
-            scale_name = ""
-        else:
-            scale_name = "scale2.0x_"
-
-        if noise == -1:
-            model_name = "scale2.0x_model.onnx"
-        else:
-            model_name = f"noise{noise}_{scale_name}model.onnx"
-
-    network_path = os.path.join(folder_path, model_name)
-
     clip = inference_with_fallback(
         clips=[clip], network_path=network_path,
         overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
@@ -301,9 +401,9 @@ class DPIRModel(enum.IntEnum):
 def DPIR(
     clip: vs.VideoNode,
     strength: typing.Optional[typing.Union[typing.SupportsFloat, vs.VideoNode]],
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
-    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     model: typing.Literal[0, 1, 2, 3] = 0,
     backend: backendT = Backend.OV_CPU()
 ) -> vs.VideoNode:
@@ -344,20 +444,34 @@ def DPIR(
 
         strength = core.std.BlankClip(clip, format=vs.GRAYS, color=strength / 255)
 
+    network_path = os.path.join(
+        models_path,
+        "dpir",
+        f"{tuple(DPIRModel.__members__)[model]}.onnx"
+    )
+
+    tuned = load_tuned_settings(backend, "DPIR", clip.width, clip.height, dict(model=model))
+    if tuned is not None and tiles is None and tilesize is None:
+        tiles = tuned["tiles"]
+
+    multiple = 8
+
     if overlap is None:
         overlap_w = overlap_h = 0
+    elif overlap == "auto":
+        overlap_w, multiple = calc_overlap(network_path, default=0, multiple=multiple)
+        overlap_h = overlap_w
     elif isinstance(overlap, int):
         overlap_w = overlap_h = overlap
     else:
         overlap_w, overlap_h = overlap
 
-    multiple = 8
-
     (tile_w, tile_h), (overlap_w, overlap_h) = calc_tilesize(
         tiles=tiles, tilesize=tilesize,
         width=clip.width, height=clip.height,
         multiple=multiple,
-        overlap_w=overlap_w, overlap_h=overlap_h
+        overlap_w=overlap_w, overlap_h=overlap_h,
+        backend=backend, network_path=network_path
     )
 
     if tile_w % multiple != 0 or tile_h % multiple != 0:
@@ -373,13 +487,9 @@ def DPIR(
     backend = init_backend(
         backend=backend,
         channels=channels,
-        trt_max_shapes=(tile_w, tile_h)
-    )
-
-    network_path = os.path.join(
-        models_path,
-        "dpir",
-        f"{tuple(DPIRModel.__members__)[model]}.onnx"
+        trt_max_shapes=(tile_w, tile_h),
+        multiple=multiple,
+        tuned=tuned
     )
 
     clip = inference_with_fallback(
@@ -404,9 +514,9 @@ RealESRGANv2Model = RealESRGANModel
 
 def RealESRGAN(
     clip: vs.VideoNode,
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
-    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     model: typing.Literal[0, 1, 2] = 0,
     backend: backendT = Backend.OV_CPU(),
     scale: typing.Optional[float] = None
@@ -426,20 +536,41 @@ def RealESRGAN(
     if not isinstance(model, int) or model not in RealESRGANv2Model.__members__.values():
         raise ValueError(f'{func_name}: "model" must be 0, 1 or 2')
 
+    if model in [0, 1]:
+        network_path = os.path.join(
+            models_path,
+            "RealESRGANv2",
+            f"RealESRGANv2-{tuple(RealESRGANv2Model.__members__)[model]}.onnx".replace('_', '-')
+        )
+    elif model == 2:
+        network_path = os.path.join(
+            models_path,
+            "RealESRGANv2",
+            "realesr-animevideov3.onnx"
+        )
+
+    tuned = load_tuned_settings(backend, "RealESRGAN", clip.width, clip.height, dict(model=model, scale=scale))
+    if tuned is not None and tiles is None and tilesize is None:
+        tiles = tuned["tiles"]
+
+    multiple = 1
+
     if overlap is None:
         overlap_w = overlap_h = 8
+    elif overlap == "auto":
+        overlap_w, multiple = calc_overlap(network_path, default=8, multiple=multiple)
+        overlap_h = overlap_w
     elif isinstance(overlap, int):
         overlap_w = overlap_h = overlap
     else:
         overlap_w, overlap_h = overlap
 
-    multiple = 1
-
     (tile_w, tile_h), (overlap_w, overlap_h) = calc_tilesize(
         tiles=tiles, tilesize=tilesize,
         width=clip.width, height=clip.height,
         multiple=multiple,
-        overlap_w=overlap_w, overlap_h=overlap_h
+        overlap_w=overlap_w, overlap_h=overlap_h,
+        backend=backend, network_path=network_path
     )
 
     channels = 3
@@ -447,22 +578,11 @@ def RealESRGAN(
     backend = init_backend(
         backend=backend,
         channels=channels,
-        trt_max_shapes=(tile_w, tile_h)
+        trt_max_shapes=(tile_w, tile_h),
+        multiple=multiple,
+        tuned=tuned
     )
 
-    if model in [0, 1]:
-        network_path = os.path.join(
-            models_path,
-            "RealESRGANv2",
-            f"RealESRGANv2-{tuple(RealESRGANv2Model.__members__)[model]}.onnx".replace('_', '-')
-        )
-    elif model == 2:
-        network_path = os.path.join(
-            models_path,
-            "RealESRGANv2",
-            "realesr-animevideov3.onnx"
-        )
-
     clip_org = clip
     clip = inference_with_fallback(
         clips=[clip], network_path=network_path,
@@ -493,9 +613,9 @@ def CUGAN(
     clip: vs.VideoNode,
     noise: typing.Literal[-1, 0, 1, 2, 3] = -1,
     scale: typing.Literal[2, 3, 4] = 2,
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
-    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     backend: backendT = Backend.OV_CPU(),
     preprocess: bool = True,
     alpha: float = 1.0,
@@ -533,22 +653,57 @@ def CUGAN(
     if clip.format.id != vs.RGBS:
         raise ValueError(f'{func_name}: "clip" must be of RGBS format')
 
+    folder_path = os.path.join(models_path, "cugan")
+
+    if version == 1:
+        if noise == -1:
+            model_name = f"up{scale}x-latest-no-denoise.onnx"
+        elif noise == 0:
+            model_name = f"up{scale}x-latest-conservative.onnx"
+        else:
+            model_name = f"up{scale}x-latest-denoise{noise}x.onnx"
+    elif version == 2:
+        if noise == -1:
+            model_name = f"pro-no-denoise3x-up{scale}x.onnx"
+        elif noise == 0:
+            model_name = f"pro-conservative-up{scale}x.onnx"
+        else:
+            model_name = f"pro-denoise{noise}x-up{scale}x.onnx"
+    else:
+        raise ValueError(f'{func_name}: unknown version ({version}), must be 1 (legacy) or 2 (pro)')
+
+    network_path = os.path.join(folder_path, model_name)
+
+    tuned = load_tuned_settings(
+        backend, "CUGAN", clip.width, clip.height,
+        dict(
+            noise=noise, scale=scale, preprocess=preprocess,
+            alpha=alpha, version=version, conformance=conformance
+        )
+    )
+    if tuned is not None and tiles is None and tilesize is None:
+        tiles = tuned["tiles"]
+
+    multiple = 2
+
     if overlap is None:
         overlap_w = overlap_h = 4
+    elif overlap == "auto":
+        overlap_w, multiple = calc_overlap(network_path, default=4, multiple=multiple)
+        overlap_h = overlap_w
     elif isinstance(overlap, int):
         overlap_w = overlap_h = overlap
     else:
         overlap_w, overlap_h = overlap
 
-    multiple = 2
-
     width, height = clip.width, clip.height
 
     (tile_w, tile_h), (overlap_w, overlap_h) = calc_tilesize(
         tiles=tiles, tilesize=tilesize,
         width=clip.width, height=clip.height,
         multiple=multiple,
-        overlap_w=overlap_w, overlap_h=overlap_h
+        overlap_w=overlap_w, overlap_h=overlap_h,
+        backend=backend, network_path=network_path
     )
 
     if tile_w % multiple != 0 or tile_h % multiple != 0:
@@ -561,30 +716,11 @@ def CUGAN(
     backend = init_backend(
         backend=backend,
         channels=channels,
-        trt_max_shapes=(tile_w, tile_h)
+        trt_max_shapes=(tile_w, tile_h),
+        multiple=multiple,
+        tuned=tuned
     )
 
-    folder_path = os.path.join(models_path, "cugan")
-
-    if version == 1:
-        if noise == -1:
-            model_name = f"up{scale}x-latest-no-denoise.onnx"
-        elif noise == 0:
-            model_name = f"up{scale}x-latest-conservative.onnx"
-        else:
-            model_name = f"up{scale}x-latest-denoise{noise}x.onnx"
-    elif version == 2:
-        if noise == -1:
-            model_name = f"pro-no-denoise3x-up{scale}x.onnx"
-        elif noise == 0:
-            model_name = f"pro-conservative-up{scale}x.onnx"
-        else:
-            model_name = f"pro-denoise{noise}x-up{scale}x.onnx"
-    else:
-        raise ValueError(f'{func_name}: unknown version ({version}), must be 1 (legacy) or 2 (pro)')
-
-    network_path = os.path.join(folder_path, model_name)
-
     # https://github.com/bilibili/ailab/blob/978f3be762183d7fa79525f29a43e65afb995f6b/Real-CUGAN/upcunet_v3.py#L207
     # mutates network_path
     if alpha != 1.0:
@@ -656,9 +792,28 @@ def CUGAN(
     return clip
 
 
+@functools.lru_cache(maxsize=8)
+def get_rife_grid(size: int) -> typing.Any:
+    """ normalized coordinates of the pixels along an axis of the given size """
+
+    import numpy as np
+
+    grid = 2 * np.arange(size, dtype=np.float64) / (size - 1) - 1
+    grid = grid.astype(np.float32)
+    grid.flags.writeable = False
+    return grid
+
+
 def get_rife_input(clip: vs.VideoNode) -> typing.List[vs.VideoNode]:
+    """ coordinate grid and flow multipliers of RIFE as extra input planes
+
+    only used by backends that cannot generate them inside the graph (ncnn)
+    """
+
     from functools import partial
 
+    import numpy as np
+
     def meshgrid_core(n: int, f: vs.VideoFrame, horizontal: bool) -> vs.VideoFrame:
         fout = f.copy()
 
@@ -668,16 +823,13 @@ def get_rife_input(clip: vs.VideoNode) -> typing.List[vs.VideoNode]:
         else:
             mem_view = fout.get_write_array(0)
 
-        height, width = mem_view.shape
+        plane = np.asarray(mem_view)
+        height, width = plane.shape
 
         if horizontal:
-            for i in range(height):
-                for j in range(width):
-                    mem_view[i, j] = 2 * j / (width - 1) - 1
+            plane[...] = get_rife_grid(width)[np.newaxis, :]
         else:
-            for i in range(height):
-                for j in range(width):
-                    mem_view[i, j] = 2 * i / (height - 1) - 1
+            plane[...] = get_rife_grid(height)[:, np.newaxis]
 
         return fout
 
@@ -696,6 +848,102 @@ def get_rife_input(clip: vs.VideoNode) -> typing.List[vs.VideoNode]:
     return [horizontal, vertical, multiplier_h, multiplier_w]
 
 
+def patch_rife_grid(model: typing.Any) -> None:
+    """ generates the coordinate grid and flow multipliers of RIFE inside the graph
+
+    The bundled models take 11 input channels, the last 4 of which are the
+    planes of get_rife_input(). The input is reduced to the 7 channels of the
+    two frames and the time step, and the planes are computed from the shape
+    of the input with Range and Expand and concatenated to it, so that the
+    nodes of the model are unchanged. The planes are those of the tile,
+    which is the tensor the flow warps sample from.
+    """
+
+    import numpy as np
+    import onnx
+    from onnx import numpy_helper
+
+    graph = model.graph
+    opset = max(
+        (opset_import.version for opset_import in model.opset_import if opset_import.domain in ("", "ai.onnx")),
+        default=0
+    )
+    if opset < 11:
+        raise ValueError("invalid rife model")
+
+    network_input = graph.input[0]
+    dims = network_input.type.tensor_type.shape.dim
+    if len(dims) != 4 or (dims[1].HasField("dim_value") and dims[1].dim_value != 11):
+        raise ValueError("invalid rife model")
+
+    input_name = network_input.name
+    full_input_name = f"{input_name}_grid"
+    dims[1].dim_value = 7
+
+    for node in graph.node:
+        for i, name in enumerate(node.input):
+            if name == input_name:
+                node.input[i] = full_input_name
+
+    nodes = []
+
+    def add_node(op_type: str, inputs: typing.List[str], **kwargs: typing.Any) -> str:
+        output = f"rife_grid_{len(nodes)}"
+        nodes.append(onnx.helper.make_node(op_type, inputs=inputs, outputs=[output], **kwargs))
+        return output
+
+    def add_constant(value: typing.Any, dtype: typing.Any) -> str:
+        return add_node("Constant", [], value=numpy_helper.from_array(np.array(value, dtype=dtype)))
+
+    one = add_constant(1.0, np.float32)
+    two = add_constant(2.0, np.float32)
+
+    shape = add_node("Shape", [input_name])
+    # [N, 1, H, W]
+    plane_shape = add_node("Add", [
+        add_node("Mul", [shape, add_constant([1, 0, 1, 1], np.int64)]),
+        add_constant([0, 1, 0, 0], np.int64)
+    ])
+
+    def add_axis(axis: int, grid_shape: typing.List[int]) -> typing.Tuple[str, str]:
+        size = add_node("Gather", [shape, add_constant(axis, np.int64)])
+        indices = add_node("Range", [add_constant(0, np.int64), size, add_constant(1, np.int64)])
+
+        # 2 * i / (size - 1) - 1
+        denominator = add_node("Sub", [add_node("Cast", [size], to=onnx.TensorProto.FLOAT), one])
+        grid = add_node("Sub", [
+            add_node("Div", [
+                add_node("Mul", [add_node("Cast", [indices], to=onnx.TensorProto.FLOAT), two]),
+                denominator
+            ]),
+            one
+        ])
+        grid = add_node("Reshape", [grid, add_constant(grid_shape, np.int64)])
+
+        multiplier = add_node("Reshape", [
+            add_node("Div", [two, denominator]),
+            add_constant([1, 1, 1, 1], np.int64)
+        ])
+
+        return (
+            add_node("Expand", [grid, plane_shape]),
+            add_node("Expand", [multiplier, plane_shape])
+        )
+
+    horizontal, multiplier_h = add_axis(3, [1, 1, 1, -1])
+    vertical, multiplier_w = add_axis(2, [1, 1, -1, 1])
+
+    nodes.append(onnx.helper.make_node(
+        "Concat",
+        inputs=[input_name, horizontal, vertical, multiplier_h, multiplier_w],
+        outputs=[full_input_name],
+        axis=1
+    ))
+
+    for i, node in enumerate(nodes):
+        graph.node.insert(i, node)
+
+
 @enum.unique
 class RIFEModel(enum.IntEnum):
     v4_0 = 40
@@ -711,7 +959,7 @@ def RIFEMerge(
     clipb: vs.VideoNode,
     mask: vs.VideoNode,
     scale: float = 1.0,
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     model: typing.Literal[40, 42, 43, 44, 45, 46] = 44,
@@ -748,6 +996,10 @@ def RIFEMerge(
     if mask.format.id != vs.GRAYS:
         raise ValueError(f'{func_name}: "mask" must be of RGBS format')
 
+    tuned = load_tuned_settings(backend, "RIFE", clipa.width, clipa.height, dict(scale=scale, model=model))
+    if tuned is not None and tiles is None and tilesize is None:
+        tiles = tuned["tiles"]
+
     if overlap is None:
         overlap_w = overlap_h = 0
     elif isinstance(overlap, int):
@@ -761,11 +1013,18 @@ def RIFEMerge(
     multiple = int(multiple_frac.numerator)
     scale = float(Fraction(scale))
 
+    network_path = os.path.join(
+        models_path,
+        "rife",
+        f"rife_v{model // 10}.{model % 10}.onnx"
+    )
+
     (tile_w, tile_h), (overlap_w, overlap_h) = calc_tilesize(
         tiles=tiles, tilesize=tilesize,
         width=clip.width, height=clip.height,
         multiple=multiple,
-        overlap_w=overlap_w, overlap_h=overlap_h
+        overlap_w=overlap_w, overlap_h=overlap_h,
+        backend=backend, network_path=network_path
     )
 
     if tile_w % multiple != 0 or tile_h % multiple != 0:
@@ -773,34 +1032,41 @@ def RIFEMerge(
             f'{func_name}: tile size must be divisible by {multiple} ({tile_w}, {tile_h})'
         )
 
-    channels = 3 + 3 + 1 + 2 + 2
+    # the coordinate grid is generated inside the graph, except on ncnn
+    # whose converter does not support Range
+    grid_in_graph = not isinstance(backend, Backend.NCNN_VK)
+
+    if grid_in_graph:
+        channels = 3 + 3 + 1
+    else:
+        channels = 3 + 3 + 1 + 2 + 2
 
     backend = init_backend(
         backend=backend,
         channels=channels,
-        trt_max_shapes=(tile_w, tile_h)
-    )
-
-    network_path = os.path.join(
-        models_path,
-        "rife",
-        f"rife_v{model // 10}.{model % 10}.onnx"
+        trt_max_shapes=(tile_w, tile_h),
+        multiple=multiple,
+        tuned=tuned
     )
 
-    clips = [clipa, clipb, mask, *get_rife_input(clipa)]
+    if grid_in_graph:
+        clips = [clipa, clipb, mask]
+    else:
+        clips = [clipa, clipb, mask, *get_rife_input(clipa)]
 
-    if scale == 1.0:
+    if scale == 1.0 and not grid_in_graph:
         return inference_with_fallback(
             clips=clips, network_path=network_path,
             overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
             backend=backend
         )
-    else:
-        import onnx
-        from onnx.numpy_helper import from_array, to_array
 
-        model = onnx.load(network_path)
+    import onnx
+    from onnx.numpy_helper import from_array, to_array
+
+    model = onnx.load(network_path)
 
+    if scale != 1.0:
         resize_counter = 0
         for i in range(len(model.graph.node)):
             node = model.graph.node[i]
@@ -833,32 +1099,38 @@ def RIFEMerge(
         if multiplier_counter != 7:
             raise ValueError("invalid rife model")
 
-        if backend.supports_onnx_serialization:
-            return inference_with_fallback(
-                clips=clips, network_path=model.SerializeToString(),
-                overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
-                backend=backend, path_is_serialization=True
-            )
-        else:
-            network_path = f"{network_path}_scale{scale!r}.onnx"
-            onnx.save(model, network_path)
+        network_path = f"{network_path}_scale{scale!r}.onnx"
 
-            return inference_with_fallback(
-                clips=clips, network_path=network_path,
-                overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
-                backend=backend
-            )
+    if grid_in_graph:
+        patch_rife_grid(model)
+        network_path = f"{network_path}_grid.onnx"
+
+    if backend.supports_onnx_serialization:
+        return inference_with_fallback(
+            clips=clips, network_path=model.SerializeToString(),
+            overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
+            backend=backend, path_is_serialization=True
+        )
+    else:
+        onnx.save(model, network_path)
+
+        return inference_with_fallback(
+            clips=clips, network_path=network_path,
+            overlap=(overlap_w, overlap_h), tilesize=(tile_w, tile_h),
+            backend=backend
+        )
 
 
 def RIFE(
     clip: vs.VideoNode,
     multi: int = 2,
     scale: float = 1.0,
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]] = None,
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     overlap: typing.Optional[typing.Union[int, typing.Tuple[int, int]]] = None,
     model: typing.Literal[40, 42, 43, 44, 45, 46] = 44,
-    backend: backendT = Backend.OV_CPU()
+    backend: backendT = Backend.OV_CPU(),
+    batch_timesteps: bool = False
 ) -> vs.VideoNode:
     """ RIFE: Real-Time Intermediate Flow Estimation for Video Frame Interpolation
 
@@ -876,6 +1148,14 @@ def RIFE(
         scale: Controls the process resolution for optical flow model.
             32 / fractions.Fraction(scale) must be an integer.
             scale=0.5 is recommended for 4K video.
+
+        batch_timesteps: Runs the (multi - 1) timesteps of a frame pair as a single
+            inference with the timestep on the batch dimension, using the temporal
+            batching of the ORT_CPU and OV_CPU backends. Requires the frame to be
+            processed as a single tile.
+            The network is conditioned on the timestep from its first block,
+            so the timesteps share the call overhead rather than the flow.
+            Default: False.
     """
 
     func_name = "vsmlrt.RIFE"
@@ -892,6 +1172,25 @@ def RIFE(
     if multi < 2:
         raise ValueError(f'{func_name}: RIFE: multi must be at least 2')
 
+    if batch_timesteps and multi > 2:
+        backend_type = backend if isinstance(backend, type) else type(backend)
+        if not issubclass(backend_type, (Backend.ORT_CPU, Backend.OV_CPU)):
+            raise ValueError(f'{func_name}: "batch_timesteps" is only supported by the ORT_CPU and OV_CPU backends')
+
+        if isinstance(backend, type):
+            # the tiles of the tuned settings are not applied,
+            # as the timesteps are batched as single tiles
+            tuned = load_tuned_settings(
+                backend, "RIFE", clip.width, clip.height, dict(scale=scale, model=model)
+            )
+            backend = backend(**tuned["backend"]) if tuned is not None else backend()
+        else:
+            backend = copy.deepcopy(backend)
+
+        # the timesteps of a pair are adjacent frames of the merged clip
+        backend.batch_size = multi - 1
+        backend.temporal_batching = True
+
     initial = core.std.Interleave([clip] * (multi - 1))
 
     terminal = clip.std.DuplicateFrames(frames=clip.num_frames - 1).std.Trim(first=1)
@@ -923,20 +1222,240 @@ def RIFE(
         ])
 
 
-def get_engine_path(
-    network_path: str,
-    opt_shapes: typing.Tuple[int, int],
-    max_shapes: typing.Tuple[int, int],
-    workspace: int,
-    fp16: bool,
+def get_ov_cache_path(cache_dir: str, device: str) -> str:
+    """ returns the directory of the compiled network cache of openvino
+
+    openvino keys the entries by the network and the configuration,
+    and the directory separates the runtime versions and devices
+    """
+
+    ov_version = core.ov.Version()["inference_engine_version"].decode()
+
+    return os.path.join(cache_dir, f"ov-{ov_version}_{device}")
+
+
+@contextlib.contextmanager
+def file_lock(path: str) -> typing.Iterator[None]:
+    """ exclusive inter-process lock on the file, blocks until it is acquired """
+
+    if sys.platform == "win32":
+        import msvcrt
+
+        with open(path, "a+b") as f:
+            while True:
+                try:
+                    f.seek(0)
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after 10 attempts a second apart,
+                    # keep waiting like flock() does
+                    pass
+
+            try:
+                yield
+            finally:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+    else:
+        import fcntl
+
+        while True:
+            with open(path, "a+b") as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+                # remove_lock_file() may have unlinked the file while we waited,
+                # in which case another process can lock a new file at the path
+                try:
+                    current = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                if not os.path.samestat(os.fstat(f.fileno()), current):
+                    continue
+
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+                return
+
+
+def remove_lock_file(path: str) -> bool:
+    """ removes a lock file of file_lock() unless another process holds it
+
+    file_lock() retries on the path when its file is removed while it waits
+    """
+
+    if sys.platform == "win32":
+        # fails while the file is open elsewhere
+        try:
+            os.remove(path)
+        except OSError:
+            return False
+        return True
+
+    import fcntl
+
+    try:
+        with open(path, "rb") as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            os.remove(path)
+    except OSError:
+        return False
+
+    return True
+
+
+def get_engine_cache_index_path() -> str:
+    root = engine_cache_path if engine_cache_path is not None else tempfile.gettempdir()
+    return os.path.join(root, "vsmlrt_engine_cache.json")
+
+
+def load_engine_cache_index() -> typing.Dict[str, typing.Any]:
+    try:
+        with open(get_engine_cache_index_path(), "r") as f:
+            index = json.load(f)
+
+        if index.get("version") == 1:
+            return index
+    except (OSError, ValueError):
+        pass
+
+    return dict(version=1, checksums={}, engines={})
+
+
+def save_engine_cache_index(index: typing.Dict[str, typing.Any]) -> None:
+    index_path = get_engine_cache_index_path()
+    temp_path = f"{index_path}.{os.getpid()}.tmp"
+
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+
+        with open(temp_path, "w") as f:
+            json.dump(index, f)
+
+        os.replace(temp_path, index_path)
+    except OSError:
+        # the index is only a cache
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+def get_checksum(network_path: str) -> int:
+    """ adler32 checksum of the network, memoized by its path, size and modification time """
+
+    stat = os.stat(network_path)
+    key = os.path.abspath(network_path)
+
+    index = load_engine_cache_index()
+    entry = index["checksums"].get(key)
+    if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime_ns:
+        return entry["checksum"]
+
+    with open(network_path, "rb") as file:
+        checksum = zlib.adler32(file.read())
+
+    try:
+        with file_lock(f"{get_engine_cache_index_path()}.lock"):
+            index = load_engine_cache_index()
+            index["checksums"][key] = dict(size=stat.st_size, mtime=stat.st_mtime_ns, checksum=checksum)
+            save_engine_cache_index(index)
+    except OSError:
+        pass
+
+    return checksum
+
+
+def prune_engine_cache(
+    index: typing.Dict[str, typing.Any],
+    max_size: typing.Optional[int] = None,
+    max_age: typing.Optional[float] = None,
+    keep: typing.Optional[str] = None
+) -> typing.List[str]:
+    """ removes the least recently used engines of the index in place
+
+    max_size is in bytes and max_age in seconds, returns the removed engines
+    """
+
+    engines: typing.Dict[str, typing.Dict[str, typing.Any]] = index["engines"]
+
+    for path in list(engines):
+        if not os.path.exists(path):
+            del engines[path]
+
+    for path in list(index["checksums"]):
+        if not os.path.exists(path):
+            del index["checksums"][path]
+
+    total_size = sum(entry["size"] for entry in engines.values())
+    now = time.time()
+
+    removed = []
+    for path, entry in sorted(engines.items(), key=lambda item: item[1]["last_used"]):
+        expired = max_age is not None and now - entry["last_used"] > max_age
+        oversized = max_size is not None and total_size > max_size
+
+        if not (expired or oversized):
+            break
+
+        if path == keep:
+            continue
+
+        try:
+            os.remove(path)
+        except OSError:
+            # maybe in use
+            continue
+
+        try:
+            os.remove(f"{path}.cache")
+        except OSError:
+            pass
+
+        remove_lock_file(f"{path}.lock")
+
+        total_size -= entry["size"]
+        del engines[path]
+        removed.append(path)
+
+    return removed
+
+
+def update_engine_cache(engine_path: str) -> None:
+    """ records the use of an engine and evicts the least recently used engines """
+
+    os.makedirs(os.path.dirname(get_engine_cache_index_path()), exist_ok=True)
+
+    with file_lock(f"{get_engine_cache_index_path()}.lock"):
+        index = load_engine_cache_index()
+
+        engine_path = os.path.abspath(engine_path)
+        index["engines"][engine_path] = dict(size=os.path.getsize(engine_path), last_used=time.time())
+
+        prune_engine_cache(
+            index,
+            max_size=engine_cache_size * 1024 ** 2 if engine_cache_size is not None else None,
+            keep=engine_path
+        )
+
+        save_engine_cache_index(index)
+
+
+def get_engine_path(
+    network_path: str,
+    opt_shapes: typing.Tuple[int, int],
+    max_shapes: typing.Tuple[int, int],
+    workspace: int,
+    fp16: bool,
     device_id: int,
     use_cublas: bool,
     static_shape: bool,
     tf32: bool
 ) -> str:
 
-    with open(network_path, "rb") as file:
-        checksum = zlib.adler32(file.read())
+    checksum = get_checksum(network_path)
 
     trt_version = core.trt.Version()["tensorrt_version"].decode()
 
@@ -951,8 +1470,13 @@ def get_engine_path(
     else:
         shape_str = f".opt{opt_shapes[0]}x{opt_shapes[1]}" + f"_max{max_shapes[0]}x{max_shapes[1]}"
 
+    if engine_cache_path is not None:
+        prefix = os.path.join(engine_cache_path, os.path.basename(network_path))
+    else:
+        prefix = network_path
+
     return (
-        network_path +
+        prefix +
         shape_str +
         ("_fp16" if fp16 else "") +
         ("_no-tf32" if not tf32 else "") +
@@ -1007,6 +1531,7 @@ def trtexec(
     )
 
     if os.access(engine_path, mode=os.R_OK):
+        update_engine_cache(engine_path)
         return engine_path
 
     alter_engine_path = os.path.join(
@@ -1015,13 +1540,16 @@ def trtexec(
     )
 
     if os.access(alter_engine_path, mode=os.R_OK):
+        update_engine_cache(alter_engine_path)
         return alter_engine_path
 
+    if engine_cache_path is not None:
+        os.makedirs(engine_cache_path, exist_ok=True)
+
     try:
         # test writability
-        with open(engine_path, "w") as f:
+        with open(f"{engine_path}.lock", "a") as f:
             pass
-        os.remove(engine_path)
     except PermissionError:
         print(f"{engine_path} not writable", file=sys.stderr)
         engine_path = alter_engine_path
@@ -1030,110 +1558,446 @@ def trtexec(
             os.makedirs(dirname)
         print(f"change engine path to {engine_path}", file=sys.stderr)
 
-    if trt_version >= 840:
-        workspace_arg = f"--memPoolSize=workspace:{workspace}"
-    else:
-        workspace_arg = f"--workspace{workspace}"
-    
-    args = [
-        trtexec_path,
-        f"--onnx={network_path}",
-        workspace_arg,
-        f"--timingCacheFile={engine_path}.cache",
-        f"--device={device_id}",
-        f"--saveEngine={engine_path}"
-    ]
+    # concurrent builds of the same engine are serialized across processes,
+    # and the engine is written to a temporary file that is renamed afterwards
+    with contextlib.ExitStack() as locks:
+        locks.enter_context(file_lock(f"{engine_path}.lock"))
 
-    if static_shape:
-        args.append(f"--shapes=input:1x{channels}x{max_shapes[1]}x{max_shapes[0]}")
-    else:
-        args.extend([
-            f"--minShapes=input:1x{channels}x0x0",
-            f"--optShapes=input:1x{channels}x{opt_shapes[1]}x{opt_shapes[0]}",
-            f"--maxShapes=input:1x{channels}x{max_shapes[1]}x{max_shapes[0]}"
-        ])
+        # the engine may have been built by another process in the meantime
+        if os.access(engine_path, mode=os.R_OK):
+            update_engine_cache(engine_path)
+            return engine_path
 
-    if fp16:
-        args.append("--fp16")
-
-    if verbose:
-        args.append("--verbose")
-
-    disabled_tactic_sources = []
-    if not use_cublas:
-        disabled_tactic_sources.extend(["-CUBLAS", "-CUBLAS_LT"])
-    if not use_cudnn:
-        disabled_tactic_sources.append("-CUDNN")
-    if not use_edge_mask_convolutions and trt_version >= 841:
-        disabled_tactic_sources.append("-EDGE_MASK_CONVOLUTIONS")
-    if not use_jit_convolutions and trt_version >= 850:
-        disabled_tactic_sources.append("-JIT_CONVOLUTIONS")
-    if disabled_tactic_sources:
-        args.append(f"--tacticSources={','.join(disabled_tactic_sources)}")
-
-    if use_cuda_graph:
-        args.extend((
-            "--useCudaGraph",
-            "--noDataTransfers"
-        ))
-    else:
-        args.append("--buildOnly")
+        if not parallel_engine_builds:
+            lock_root = engine_cache_path if engine_cache_path is not None else tempfile.gettempdir()
+            locks.enter_context(file_lock(
+                os.path.join(lock_root, f"vsmlrt_trtexec_device{device_id}.lock")
+            ))
 
-    if not tf32:
-        args.append("--noTF32")
+        temp_engine_path = f"{engine_path}.{os.getpid()}.tmp"
 
-    if heuristic and trt_version >= 850 and core.trt.DeviceProperties(device_id)["major"] >= 8:
-        args.append("--heuristic")
+        if trt_version >= 840:
+            workspace_arg = f"--memPoolSize=workspace:{workspace}"
+        else:
+            workspace_arg = f"--workspace{workspace}"
+
+        args = [
+            trtexec_path,
+            f"--onnx={network_path}",
+            workspace_arg,
+            f"--timingCacheFile={engine_path}.cache",
+            f"--device={device_id}",
+            f"--saveEngine={temp_engine_path}"
+        ]
+
+        if static_shape:
+            args.append(f"--shapes=input:1x{channels}x{max_shapes[1]}x{max_shapes[0]}")
+        else:
+            args.extend([
+                f"--minShapes=input:1x{channels}x0x0",
+                f"--optShapes=input:1x{channels}x{opt_shapes[1]}x{opt_shapes[0]}",
+                f"--maxShapes=input:1x{channels}x{max_shapes[1]}x{max_shapes[0]}"
+            ])
+
+        if fp16:
+            args.append("--fp16")
+
+        if verbose:
+            args.append("--verbose")
+
+        disabled_tactic_sources = []
+        if not use_cublas:
+            disabled_tactic_sources.extend(["-CUBLAS", "-CUBLAS_LT"])
+        if not use_cudnn:
+            disabled_tactic_sources.append("-CUDNN")
+        if not use_edge_mask_convolutions and trt_version >= 841:
+            disabled_tactic_sources.append("-EDGE_MASK_CONVOLUTIONS")
+        if not use_jit_convolutions and trt_version >= 850:
+            disabled_tactic_sources.append("-JIT_CONVOLUTIONS")
+        if disabled_tactic_sources:
+            args.append(f"--tacticSources={','.join(disabled_tactic_sources)}")
+
+        if use_cuda_graph:
+            args.extend((
+                "--useCudaGraph",
+                "--noDataTransfers"
+            ))
+        else:
+            args.append("--buildOnly")
 
-    if log:
-        env_key = "TRTEXEC_LOG_FILE"
-        prev_env_value = os.environ.get(env_key)
+        if not tf32:
+            args.append("--noTF32")
 
-        if prev_env_value is not None and len(prev_env_value) > 0:
-            # env_key has been set, no extra action
-            env = {env_key: prev_env_value}
-            subprocess.run(args, env=env, check=True, stdout=sys.stderr)
-        else:
-            time_str = time.strftime('%y%m%d_%H%M%S', time.localtime())
+        if heuristic and trt_version >= 850 and core.trt.DeviceProperties(device_id)["major"] >= 8:
+            args.append("--heuristic")
 
-            log_filename = os.path.join(
-                tempfile.gettempdir(),
-                f"trtexec_{time_str}.log"
-            )
+        try:
+            if log:
+                env_key = "TRTEXEC_LOG_FILE"
+                prev_env_value = os.environ.get(env_key)
+
+                if prev_env_value is not None and len(prev_env_value) > 0:
+                    # env_key has been set, no extra action
+                    env = {env_key: prev_env_value}
+                    subprocess.run(args, env=env, check=True, stdout=sys.stderr)
+                else:
+                    time_str = time.strftime('%y%m%d_%H%M%S', time.localtime())
+
+                    log_filename = os.path.join(
+                        tempfile.gettempdir(),
+                        f"trtexec_{time_str}.log"
+                    )
+
+                    env = {env_key: log_filename}
+
+                    completed_process = subprocess.run(args, env=env, check=False, stdout=sys.stderr)
+
+                    if completed_process.returncode == 0:
+                        try:
+                            os.remove(log_filename)
+                        except FileNotFoundError:
+                            # maybe the official trtexec is used?
+                            pass
+                    else:
+                        if os.path.exists(log_filename):
+                            raise RuntimeError(f"trtexec execution fails, log has been written to {log_filename}")
+                        else:
+                            raise RuntimeError(f"trtexec execution fails but no log is found")
+            else:
+                subprocess.run(args, check=True, stdout=sys.stderr)
 
-            env = {env_key: log_filename}
+            os.replace(temp_engine_path, engine_path)
+        finally:
+            if os.path.exists(temp_engine_path):
+                os.remove(temp_engine_path)
 
-            completed_process = subprocess.run(args, env=env, check=False, stdout=sys.stderr)
+    update_engine_cache(engine_path)
 
-            if completed_process.returncode == 0:
-                try:
-                    os.remove(log_filename)
-                except FileNotFoundError:
-                    # maybe the official trtexec is used?
-                    pass
+    return engine_path
+
+
+@functools.lru_cache(maxsize=None)
+def get_receptive_field(network_path: str) -> typing.Optional[typing.Tuple[int, int]]:
+    """ analyzes the receptive field of the network
+
+    returns the radius of the receptive field and the alignment of the network,
+    both in pixels of the network input, or None if an output pixel may depend on
+    the whole input, e.g. because of global pooling or GridSample
+    """
+
+    from fractions import Fraction
+
+    import onnx
+    from onnx import numpy_helper
+
+    model = onnx.load(network_path)
+    graph = model.graph
+
+    constants = {
+        initializer.name: numpy_helper.to_array(initializer)
+        for initializer in graph.initializer
+    }
+    for node in graph.node:
+        if node.op_type == "Constant" and len(node.attribute) == 1 and node.attribute[0].name == "value":
+            constants[node.output[0]] = numpy_helper.to_array(node.attribute[0].t)
+
+    # (scale relative to the input, radius in input pixels, alignment in input pixels)
+    fields: typing.Dict[str, typing.Tuple[Fraction, Fraction, int]] = {
+        graph.input[0].name: (Fraction(1), Fraction(0), 1)
+    }
+
+    def lcm(a: int, b: int) -> int:
+        return a * b // math.gcd(a, b)
+
+    def align(multiple: int, period: Fraction) -> int:
+        return lcm(multiple, period.numerator)
+
+    for node in graph.node:
+        inputs = [fields[name] for name in node.input if name in fields]
+        if not inputs:
+            continue
+
+        scale = inputs[0][0]
+        radius = max(field[1] for field in inputs)
+        multiple = functools.reduce(lcm, (field[2] for field in inputs))
+
+        attributes = {
+            attribute.name: onnx.helper.get_attribute_value(attribute)
+            for attribute in node.attribute
+        }
+
+        op = node.op_type
+
+        if op in ("Conv", "MaxPool", "AveragePool", "LpPool"):
+            if "kernel_shape" in attributes:
+                kernel = list(attributes["kernel_shape"])
             else:
-                if os.path.exists(log_filename):
-                    raise RuntimeError(f"trtexec execution fails, log has been written to {log_filename}")
+                kernel = list(constants[node.input[1]].shape[2:])
+            strides = list(attributes.get("strides", [1, 1]))
+            dilations = list(attributes.get("dilations", [1, 1]))
+            pads = list(attributes.get("pads", [0] * (2 * len(kernel))))
+
+            reach = 0
+            for axis in range(len(kernel)):
+                extent = (kernel[axis] - 1) * dilations[axis]
+                if attributes.get("auto_pad", b"NOTSET") in (b"SAME_UPPER", b"SAME_LOWER"):
+                    reach = max(reach, math.ceil(extent / 2))
                 else:
-                    raise RuntimeError(f"trtexec execution fails but no log is found")
+                    # (begin, end) pads of the axis
+                    for pad in (pads[axis], pads[axis + len(kernel)]):
+                        reach = max(reach, pad, extent - pad)
+            radius += Fraction(reach) / scale
+
+            stride = max(strides)
+            if stride > 1:
+                multiple = align(multiple, stride / scale)
+                scale /= stride
+        elif op == "ConvTranspose":
+            kernel = list(attributes.get("kernel_shape", constants[node.input[1]].shape[2:]))
+            strides = list(attributes.get("strides", [1, 1]))
+
+            reach = max(math.ceil(k / s) for k, s in zip(kernel, strides))
+            radius += Fraction(reach) / scale
+            scale *= max(strides)
+        elif op == "DepthToSpace":
+            scale *= attributes["blocksize"]
+        elif op == "SpaceToDepth":
+            multiple = align(multiple, attributes["blocksize"] / scale)
+            scale /= attributes["blocksize"]
+        elif op in ("Resize", "Upsample"):
+            if op == "Upsample":
+                scales_name = node.input[1] if len(node.input) > 1 else None
+            else:
+                scales_name = node.input[2] if len(node.input) > 2 else None
+
+            if scales_name not in constants or constants[scales_name].size != 4:
+                # resized to a fixed size
+                return None
+
+            factor = Fraction(float(constants[scales_name][-1])).limit_denominator(64)
+
+            mode = attributes.get("mode", b"nearest")
+            reach = 2 if mode == b"cubic" else 1
+            radius += Fraction(reach) / scale
+
+            if factor < 1:
+                multiple = align(multiple, 1 / (factor * scale))
+            scale *= factor
+        elif op in ("Pad", "Slice"):
+            # shifts the pixels
+            if op == "Pad":
+                if "pads" in attributes:
+                    offsets = list(attributes["pads"])
+                elif node.input[1] in constants:
+                    offsets = list(constants[node.input[1]])
+                else:
+                    return None
+                shift = max(abs(int(offset)) for offset in offsets)
+            else:
+                if node.input[1] not in constants:
+                    return None
+                starts = constants[node.input[1]]
+                shift = max((abs(int(start)) for start in starts if abs(int(start)) < 2 ** 30), default=0)
+
+            radius += Fraction(shift) / scale
+        elif op in ("GlobalAveragePool", "GlobalMaxPool", "GridSample", "Flatten", "Gemm", "MatMul"):
+            return None
+        elif op.startswith("Reduce"):
+            axes = attributes.get("axes")
+            if axes is None and len(node.input) > 1 and node.input[1] in constants:
+                axes = list(constants[node.input[1]])
+            if axes is None or any(axis in (2, 3, -1, -2) for axis in axes):
+                return None
+
+        for name in node.output:
+            fields[name] = (scale, radius, multiple)
+
+    output = fields.get(graph.output[0].name)
+    if output is None:
+        return None
+
+    _, radius, multiple = output
+
+    return math.ceil(radius), multiple
+
+
+def calc_overlap(network_path: str, default: int, multiple: int = 1) -> typing.Tuple[int, int]:
+    """ smallest overlap that keeps the tiled output identical to the untiled one
+
+    returns the overlap and the tile size multiple, which is the given multiple
+    aligned to the downsampling of the network
+    """
+
+    try:
+        receptive_field = get_receptive_field(network_path)
+    except Exception as e:
+        receptive_field = None
+        error = e
     else:
-        subprocess.run(args, check=True, stdout=sys.stderr)
+        error = None
 
-    return engine_path
+    if receptive_field is None:
+        import logging
+        logger = logging.getLogger("vsmlrt")
+        reason = f"analysis failed ({error})" if error is not None else "global receptive field"
+        logger.warning(f'overlap="auto" on {network_path}: {reason}, using {default}')
+        return default, multiple
+
+    radius, alignment = receptive_field
+
+    # tiles must be sized and placed at multiples of the alignment of the network
+    multiple = multiple * alignment // math.gcd(multiple, alignment)
+    step = multiple // math.gcd(multiple, 2)
+
+    return math.ceil(radius / step) * step, multiple
 
 
 def calc_size(width: int, tiles: int, overlap: int, multiple: int = 1) -> int:
     return math.ceil((width + 2 * overlap * (tiles - 1)) / (tiles * multiple)) * multiple
 
 
+def count_tiles(width: int, tile: int, overlap: int) -> int:
+    """ number of tiles along a dimension as computed by the plugins """
+
+    if tile >= width:
+        return 1
+
+    step = tile - 2 * overlap
+    return math.ceil((width - tile) / step) + 1
+
+
+@functools.lru_cache(maxsize=None)
+def estimate_bytes_per_pixel(network_path: str) -> typing.Optional[int]:
+    """ estimates the activation memory of the network in fp32 bytes per input pixel
+
+    the shapes are inferred for a 256x256 input. the estimate is twice the largest
+    total size of the inputs and outputs of a node, the factor accounting for
+    the tensors kept alive by skip connections and the workspaces of the runtime.
+    returns None if no shape can be inferred
+    """
+
+    import onnx
+    from onnx import shape_inference
+
+    size = 256
+
+    model = onnx.load(network_path)
+    graph = model.graph
+
+    for value in graph.input:
+        dims = value.type.tensor_type.shape.dim
+        if len(dims) == 4:
+            for dim, dim_value in zip(dims, (1, None, size, size)):
+                if dim_value is not None:
+                    dim.dim_value = dim_value
+
+    graph = shape_inference.infer_shapes(model).graph
+
+    initializers = {initializer.name for initializer in graph.initializer}
+
+    elements = {}
+    for value in (*graph.input, *graph.value_info, *graph.output):
+        dims = value.type.tensor_type.shape.dim
+        if value.name not in initializers and dims and all(dim.HasField("dim_value") for dim in dims):
+            elements[value.name] = math.prod(dim.dim_value for dim in dims)
+
+    peak = max(
+        (sum(elements.get(name, 0) for name in (*node.input, *node.output)) for node in graph.node),
+        default=0
+    )
+
+    if peak == 0:
+        return None
+
+    return math.ceil(2 * 4 * peak / (size * size))
+
+
+def plan_tiles(
+    width: int,
+    height: int,
+    multiple: int,
+    overlap_w: int,
+    overlap_h: int,
+    backend: typing.Optional[backendT] = None,
+    memory_budget: typing.Optional[int] = None,
+    max_tiles: int = 64,
+    network_path: typing.Optional[str] = None
+) -> typing.Tuple[typing.Tuple[int, int], float]:
+    """ finds the tile size of the least cost under the per-stream memory budget (in MiB)
+
+    the cost is the number of computed pixels, including the overlaps and
+    the edge tiles, plus a per-tile overhead of the backend.
+    the memory usage of a tile pixel is estimated from the network if given,
+    and tile_bytes_per_pixel otherwise.
+    returns the tile size and the fraction of redundantly computed pixels
+    """
+
+    if memory_budget is None:
+        memory_budget = tile_memory_budget
+
+    backend_type = backend if isinstance(backend, type) else type(backend)
+
+    bytes_per_pixel = None
+    if network_path is not None:
+        try:
+            bytes_per_pixel = estimate_bytes_per_pixel(network_path)
+        except Exception:
+            pass
+    if bytes_per_pixel is None:
+        bytes_per_pixel = tile_bytes_per_pixel
+
+    if getattr(backend, "fp16", False):
+        bytes_per_pixel //= 2
+    max_pixels = memory_budget * 1024 ** 2 // max(bytes_per_pixel, 1)
+
+    if backend_type in (Backend.ORT_CUDA, Backend.TRT, Backend.OV_GPU, Backend.NCNN_VK):
+        overhead = 256 * 256
+    else:
+        overhead = 64 * 64
+
+    def candidates(size: int, overlap: int) -> typing.List[int]:
+        tiles = set()
+        for n in range(1, max_tiles + 1):
+            tile = calc_size(size, n, overlap, multiple)
+            if tile <= size and tile - 2 * overlap > 0:
+                tiles.add(tile)
+        return sorted(tiles)
+
+    best = None
+    for tile_w in candidates(width, overlap_w):
+        num_w = count_tiles(width, tile_w, overlap_w)
+
+        for tile_h in candidates(height, overlap_h):
+            if tile_w * tile_h > max_pixels:
+                continue
+
+            num_h = count_tiles(height, tile_h, overlap_h)
+            cost = num_w * num_h * (tile_w * tile_h + overhead)
+
+            if best is None or cost < best[0]:
+                best = (cost, tile_w, tile_h, num_w * num_h * tile_w * tile_h)
+
+    if best is None:
+        raise ValueError(
+            f"no tile size of a multiple of {multiple} fits in "
+            f"the memory budget of {memory_budget} MiB"
+        )
+
+    _, tile_w, tile_h, computed = best
+
+    return (tile_w, tile_h), computed / (width * height) - 1
+
+
 def calc_tilesize(
-    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int]]],
+    tiles: typing.Optional[typing.Union[int, typing.Tuple[int, int], typing.Literal["auto"]]],
     tilesize: typing.Optional[typing.Union[int, typing.Tuple[int, int]]],
     width: int,
     height: int,
     multiple: int,
     overlap_w: int,
-    overlap_h: int
+    overlap_h: int,
+    backend: typing.Optional[backendT] = None,
+    network_path: typing.Optional[str] = None
 ) -> typing.Tuple[typing.Tuple[int, int], typing.Tuple[int, int]]:
 
     if tilesize is None:
@@ -1142,6 +2006,24 @@ def calc_tilesize(
             overlap_h = 0
             tile_w = width
             tile_h = height
+        elif tiles == "auto":
+            (tile_w, tile_h), waste = plan_tiles(
+                width, height, multiple,
+                overlap_w, overlap_h,
+                backend=backend,
+                network_path=network_path
+            )
+
+            if tile_w >= width and tile_h >= height:
+                overlap_w = 0
+                overlap_h = 0
+
+            import logging
+            logger = logging.getLogger("vsmlrt")
+            logger.info(
+                f"tiles=\"auto\": tile size {tile_w}x{tile_h} for {width}x{height}, "
+                f"{waste:.1%} of the pixels are computed redundantly"
+            )
         elif isinstance(tiles, int):
             tile_w = calc_size(width, tiles, overlap_w, multiple)
             tile_h = calc_size(height, tiles, overlap_h, multiple)
@@ -1157,12 +2039,100 @@ def calc_tilesize(
     return (tile_w, tile_h), (overlap_w, overlap_h)
 
 
+def get_autotune_profile_path() -> str:
+    import platform
+    return os.path.join(autotune_profile_path, f"autotune_{platform.node() or 'localhost'}.json")
+
+
+def load_autotune_profile() -> typing.Dict[str, typing.Any]:
+    try:
+        with open(get_autotune_profile_path(), "r") as f:
+            profile = json.load(f)
+
+        if profile.get("version") == 1:
+            return profile
+    except (OSError, ValueError):
+        pass
+
+    return dict(version=1, profiles={})
+
+
+def save_autotune_profile(profile: typing.Dict[str, typing.Any]) -> None:
+    profile_path = get_autotune_profile_path()
+    temp_path = f"{profile_path}.{os.getpid()}.tmp"
+
+    with open(temp_path, "w") as f:
+        json.dump(profile, f, indent=2)
+
+    os.replace(temp_path, profile_path)
+
+
+# the arguments of the wrappers that select their network, part of the autotune key
+autotune_arguments: typing.Dict[str, typing.Tuple[str, ...]] = {
+    "Waifu2x": ("noise", "scale", "model", "preprocess"),
+    "DPIR": ("model",),
+    "RealESRGAN": ("model", "scale"),
+    "CUGAN": ("noise", "scale", "preprocess", "alpha", "version", "conformance"),
+    "RIFE": ("scale", "model")
+}
+
+
+def get_autotune_key(
+    backend_type: type,
+    model: str,
+    width: int,
+    height: int,
+    arguments: typing.Dict[str, typing.Any]
+) -> str:
+    """ arguments holds the values of autotune_arguments[model] """
+
+    import numbers
+
+    def normalize(value: typing.Any) -> str:
+        # e.g. 2 from the command line and 2.0 in a script, or an IntEnum
+        if isinstance(value, numbers.Real) and not isinstance(value, bool):
+            value = float(value)
+            return repr(int(value)) if value.is_integer() else repr(value)
+        return repr(value)
+
+    selected = ",".join(
+        f"{name}={normalize(arguments[name])}"
+        for name in sorted(autotune_arguments.get(model, ()))
+    )
+
+    return f"{backend_type.__name__}/{model}:{selected}/{width}x{height}"
+
+
+def load_tuned_settings(
+    backend: backendT,
+    model: str,
+    width: int,
+    height: int,
+    arguments: typing.Dict[str, typing.Any]
+) -> typing.Optional[typing.Dict[str, typing.Any]]:
+    """ returns the settings saved by autotune() for the model on this host
+
+    only a backend passed as the bare class, e.g. Backend.OV_CPU, is tuned
+    """
+
+    if not isinstance(backend, type):
+        return None
+
+    key = get_autotune_key(backend, model, width, height, arguments)
+    return load_autotune_profile()["profiles"].get(key)
+
+
 def init_backend(
     backend: backendT,
     channels: int,
-    trt_max_shapes: typing.Tuple[int, int]
+    trt_max_shapes: typing.Tuple[int, int],
+    multiple: int = 1,
+    tuned: typing.Optional[typing.Dict[str, typing.Any]] = None
 ) -> backendT:
 
+    if tuned is not None and isinstance(backend, type):
+        backend = backend(**tuned["backend"])
+
     if backend is Backend.ORT_CPU: # type: ignore
         backend = Backend.ORT_CPU()
     elif backend is Backend.ORT_CUDA: # type: ignore
@@ -1178,6 +2148,9 @@ def init_backend(
 
     backend = copy.deepcopy(backend)
 
+    if isinstance(backend, (Backend.ORT_CPU, Backend.OV_CPU, Backend.TRT)):
+        backend._tile_multiple = multiple
+
     if isinstance(backend, Backend.TRT):
         backend._channels = channels
 
@@ -1216,7 +2189,26 @@ def inference(
             verbosity=backend.verbosity,
             fp16=backend.fp16,
             path_is_serialization=path_is_serialization,
-            fp16_blacklist_ops=backend.fp16_blacklist_ops
+            fp16_blacklist_ops=backend.fp16_blacklist_ops,
+            batch_size=backend.batch_size,
+            temporal_batching=backend.temporal_batching,
+            max_batch_wait=backend.max_batch_wait,
+            pipeline=backend.pipeline,
+            cache_dir=model_cache_path,
+            cache_size=model_cache_size,
+            optimized_model_cache=backend.optimized_model_cache,
+            share_session=backend.share_session,
+            intra_op_num_threads=backend.intra_op_num_threads,
+            inter_op_num_threads=backend.inter_op_num_threads,
+            tile_multiple=backend._tile_multiple if backend.dynamic_edge_tiles else 0,
+            stats=backend.stats,
+            dedup=backend.dedup,
+            dedup_threshold=backend.dedup_threshold,
+            skip_flat_tiles=backend.skip_flat_tiles,
+            auto_crop=backend.auto_crop,
+            flat_tolerance=backend.flat_tolerance,
+            result_cache_dir=result_cache_path,
+            result_cache_size=result_cache_size
         )
     elif isinstance(backend, Backend.ORT_CUDA):
         clip = core.ort.Model(
@@ -1230,14 +2222,28 @@ def inference(
             fp16=backend.fp16,
             path_is_serialization=path_is_serialization,
             use_cuda_graph=backend.use_cuda_graph,
-            fp16_blacklist_ops=backend.fp16_blacklist_ops
+            fp16_blacklist_ops=backend.fp16_blacklist_ops,
+            cache_dir=model_cache_path,
+            cache_size=model_cache_size,
+            optimized_model_cache=backend.optimized_model_cache,
+            stats=backend.stats,
+            dedup=backend.dedup,
+            dedup_threshold=backend.dedup_threshold,
+            skip_flat_tiles=backend.skip_flat_tiles,
+            auto_crop=backend.auto_crop,
+            flat_tolerance=backend.flat_tolerance,
+            result_cache_dir=result_cache_path,
+            result_cache_size=result_cache_size
         )
     elif isinstance(backend, Backend.OV_CPU):
-        config = lambda: dict(
+        config_dict = dict(
             CPU_THROUGHPUT_STREAMS=backend.num_streams,
             CPU_BIND_THREAD="YES" if backend.bind_thread else "NO",
             ENFORCE_BF16="YES" if backend.bf16 else "NO"
         )
+        if backend.cache_dir is not None:
+            config_dict["CACHE_DIR"] = get_ov_cache_path(backend.cache_dir, "CPU")
+        config = lambda: config_dict
 
         clip = core.ov.Model(
             clips, network_path,
@@ -1246,12 +2252,32 @@ def inference(
             fp16=backend.fp16,
             config=config,
             path_is_serialization=path_is_serialization,
-            fp16_blacklist_ops=backend.fp16_blacklist_ops
+            fp16_blacklist_ops=backend.fp16_blacklist_ops,
+            batch_size=backend.batch_size,
+            temporal_batching=backend.temporal_batching,
+            max_batch_wait=backend.max_batch_wait,
+            pipeline=backend.pipeline,
+            cache_dir=model_cache_path,
+            cache_size=model_cache_size,
+            tile_multiple=backend._tile_multiple if backend.dynamic_edge_tiles else 0,
+            stats=backend.stats,
+            dedup=backend.dedup,
+            dedup_threshold=backend.dedup_threshold,
+            skip_flat_tiles=backend.skip_flat_tiles,
+            auto_crop=backend.auto_crop,
+            flat_tolerance=backend.flat_tolerance,
+            result_cache_dir=result_cache_path,
+            result_cache_size=result_cache_size
         )
     elif isinstance(backend, Backend.OV_GPU):
-        config = lambda: dict(
+        config_dict = dict(
             GPU_THROUGHPUT_STREAMS=backend.num_streams
         )
+        if backend.cache_dir is not None:
+            config_dict["CACHE_DIR"] = get_ov_cache_path(
+                backend.cache_dir, f"GPU.{backend.device_id}"
+            )
+        config = lambda: config_dict
         clip = core.ov.Model(
             clips, network_path,
             overlap=overlap, tilesize=tilesize,
@@ -1259,12 +2285,25 @@ def inference(
             fp16=backend.fp16,
             config=config,
             path_is_serialization=path_is_serialization,
-            fp16_blacklist_ops=backend.fp16_blacklist_ops
+            fp16_blacklist_ops=backend.fp16_blacklist_ops,
+            cache_dir=model_cache_path,
+            cache_size=model_cache_size,
+            stats=backend.stats,
+            dedup=backend.dedup,
+            dedup_threshold=backend.dedup_threshold,
+            skip_flat_tiles=backend.skip_flat_tiles,
+            auto_crop=backend.auto_crop,
+            flat_tolerance=backend.flat_tolerance,
+            result_cache_dir=result_cache_path,
+            result_cache_size=result_cache_size
         )
     elif isinstance(backend, Backend.TRT):
         if path_is_serialization:
             raise ValueError('"path_is_serialization" must be False for trt backend')
 
+        if backend.dynamic_edge_tiles and backend.static_shape:
+            raise ValueError('"dynamic_edge_tiles" requires "static_shape=False" for trt backend')
+
         network_path = typing.cast(str, network_path)
 
         engine_path = trtexec(
@@ -1293,7 +2332,16 @@ def inference(
             device_id=backend.device_id,
             use_cuda_graph=backend.use_cuda_graph,
             num_streams=backend.num_streams,
-            verbosity=4 if backend.verbose else 2
+            verbosity=4 if backend.verbose else 2,
+            tile_multiple=backend._tile_multiple if backend.dynamic_edge_tiles else 0,
+            stats=backend.stats,
+            dedup=backend.dedup,
+            dedup_threshold=backend.dedup_threshold,
+            skip_flat_tiles=backend.skip_flat_tiles,
+            auto_crop=backend.auto_crop,
+            flat_tolerance=backend.flat_tolerance,
+            result_cache_dir=result_cache_path,
+            result_cache_size=result_cache_size
         )
     elif isinstance(backend, Backend.NCNN_VK):
         clip = core.ncnn.Model(
@@ -1304,6 +2352,13 @@ def inference(
             builtin=False,
             fp16=backend.fp16,
             path_is_serialization=path_is_serialization,
+            cache_dir=model_cache_path,
+            cache_size=model_cache_size,
+            stats=backend.stats,
+            dedup=backend.dedup,
+            dedup_threshold=backend.dedup_threshold,
+            result_cache_dir=result_cache_path,
+            result_cache_size=result_cache_size
         )
     else:
         raise TypeError(f'unknown backend {backend}')
@@ -1341,3 +2396,776 @@ def inference_with_fallback(
             )
         else:
             raise e
+
+
+def parse_arguments(text: str) -> typing.Tuple[str, typing.Dict[str, typing.Any]]:
+    """ parses "name:key=value,key=value" into the name and the keyword arguments """
+
+    import ast
+
+    name, _, arguments = text.partition(":")
+
+    # commas inside brackets belong to the value, e.g. "tilesize=(256,256)"
+    parts = [""]
+    depth = 0
+    for c in arguments:
+        if c in "([{":
+            depth += 1
+        elif c in ")]}":
+            depth -= 1
+
+        if c == "," and depth == 0:
+            parts.append("")
+        else:
+            parts[-1] += c
+
+    kwargs: typing.Dict[str, typing.Any] = {}
+    for argument in filter(None, parts):
+        key, sep, value = argument.partition("=")
+        if not sep:
+            raise ValueError(f'invalid argument "{argument}" in "{text}"')
+
+        try:
+            kwargs[key.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            kwargs[key.strip()] = value.strip()
+
+    return name.strip(), kwargs
+
+
+def prewarm(
+    jobs: typing.Sequence[typing.Tuple[str, typing.Dict[str, typing.Any]]],
+    backends: typing.Sequence[backendT],
+    num_workers: int = 1
+) -> None:
+    """ builds the engines and the models required by the jobs ahead of time
+
+    each job is the name of a wrapper, e.g. "CUGAN", and its keyword arguments,
+    with the additional keys "width", "height" and "format" describing the input clip
+    """
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    wrappers = {
+        name: globals()[name]
+        for name in ("Waifu2x", "DPIR", "RealESRGAN", "RealESRGANv2", "CUGAN", "RIFE")
+    }
+
+    def run(job: typing.Tuple[str, typing.Dict[str, typing.Any]], backend: backendT) -> None:
+        name, kwargs = job
+        kwargs = dict(kwargs)
+
+        clip = core.std.BlankClip(
+            format=getattr(vs, kwargs.pop("format", "RGBS")),
+            width=kwargs.pop("width", 1920),
+            height=kwargs.pop("height", 1080),
+            length=1, keep=True
+        )
+
+        # filter creation performs everything done at the startup of a script
+        wrappers[name](clip, backend=copy.deepcopy(backend), **kwargs)
+
+        print(f"prewarmed {name} {kwargs} with {backend}", file=sys.stderr)
+
+    for name, _ in jobs:
+        if name not in wrappers:
+            raise ValueError(f'unknown wrapper "{name}"')
+
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = [
+            executor.submit(run, job, backend)
+            for job in jobs
+            for backend in backends
+        ]
+
+        for future in futures:
+            future.result()
+
+
+def list_caches() -> None:
+    index = load_engine_cache_index()
+    for path, entry in sorted(index["engines"].items(), key=lambda item: item[1]["last_used"]):
+        last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry["last_used"]))
+        print(f"engine {entry['size'] / 1024 ** 2:10.1f} MiB  {last_used}  {path}")
+
+    if model_cache_path is not None and os.path.isdir(model_cache_path):
+        for entry in sorted(os.scandir(model_cache_path), key=lambda entry: entry.stat().st_mtime):
+            if entry.is_file() and entry.name.endswith(".onnx"):
+                stat = entry.stat()
+                last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(stat.st_mtime))
+                print(f"model  {stat.st_size / 1024 ** 2:10.1f} MiB  {last_used}  {entry.path}")
+
+    if result_cache_path is not None and os.path.isdir(result_cache_path):
+        for entry in os.scandir(result_cache_path):
+            if not entry.is_dir():
+                continue
+
+            stats = [
+                frame.stat() for frame in os.scandir(entry.path)
+                if frame.is_file() and frame.name.endswith(".frame")
+            ]
+            if not stats:
+                continue
+
+            size = sum(stat.st_size for stat in stats)
+            last_used = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(max(stat.st_mtime for stat in stats)))
+            print(f"result {size / 1024 ** 2:10.1f} MiB  {last_used}  {entry.path} ({len(stats)} frames)")
+
+
+def prune_caches(
+    max_size: typing.Optional[int] = None,
+    max_age: typing.Optional[float] = None
+) -> None:
+    """ max_size is in MiB and applies to each cache, max_age is in days """
+
+    max_size_bytes = max_size * 1024 ** 2 if max_size is not None else None
+    max_age_seconds = max_age * 86400 if max_age is not None else None
+
+    os.makedirs(os.path.dirname(get_engine_cache_index_path()), exist_ok=True)
+    with file_lock(f"{get_engine_cache_index_path()}.lock"):
+        index = load_engine_cache_index()
+
+        engine_dirs = {os.path.dirname(path) for path in index["engines"]}
+        if engine_cache_path is not None:
+            engine_dirs.add(os.path.abspath(engine_cache_path))
+
+        for path in prune_engine_cache(index, max_size=max_size_bytes, max_age=max_age_seconds):
+            print(f"removed {path}", file=sys.stderr)
+        save_engine_cache_index(index)
+
+        # lock files of failed builds and evicted engines
+        for engine_dir in engine_dirs:
+            if not os.path.isdir(engine_dir):
+                continue
+
+            for entry in os.scandir(engine_dir):
+                if (
+                    entry.is_file() and entry.name.endswith(".engine.lock") and
+                    not os.path.exists(entry.path[:-len(".lock")])
+                ):
+                    remove_lock_file(entry.path)
+
+    if model_cache_path is not None and os.path.isdir(model_cache_path):
+        entries = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in os.scandir(model_cache_path)
+            if entry.is_file() and entry.name.endswith(".onnx")
+        ]
+
+        for path in prune_files(entries, max_size=max_size_bytes, max_age=max_age_seconds):
+            print(f"removed {path}", file=sys.stderr)
+
+    if result_cache_path is not None and os.path.isdir(result_cache_path):
+        entries = [
+            (frame.stat().st_mtime, frame.stat().st_size, frame.path)
+            for entry in os.scandir(result_cache_path) if entry.is_dir()
+            for frame in os.scandir(entry.path)
+            if frame.is_file() and frame.name.endswith(".frame")
+        ]
+
+        removed = prune_files(entries, max_size=max_size_bytes, max_age=max_age_seconds)
+        if removed:
+            print(f"removed {len(removed)} frames from {result_cache_path}", file=sys.stderr)
+
+
+def prune_files(
+    entries: typing.List[typing.Tuple[float, int, str]],
+    max_size: typing.Optional[int] = None,
+    max_age: typing.Optional[float] = None
+) -> typing.List[str]:
+    """ removes the least recently used of (mtime, size, path) entries,
+    returns the removed paths """
+
+    total_size = sum(size for _, size, _ in entries)
+    now = time.time()
+
+    removed = []
+    for mtime, size, path in sorted(entries):
+        expired = max_age is not None and now - mtime > max_age
+        oversized = max_size is not None and total_size > max_size
+
+        if not (expired or oversized):
+            break
+
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+        total_size -= size
+        removed.append(path)
+
+    return removed
+
+
+def expand_sweep(kwargs: typing.Dict[str, typing.Any]) -> typing.List[typing.Dict[str, typing.Any]]:
+    """ expands the list-valued arguments into their cartesian product
+
+    e.g. {"num_streams": [1, 2], "fp16": True} gives two sets of arguments,
+    sequence-valued arguments such as "tilesize" have to be passed as tuples
+    """
+
+    import itertools
+
+    keys = [key for key, value in kwargs.items() if isinstance(value, list)]
+
+    return [
+        {**kwargs, **dict(zip(keys, values))}
+        for values in itertools.product(*(kwargs[key] for key in keys))
+    ]
+
+
+def _percentile(values: typing.Sequence[float], percent: float) -> float:
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, math.ceil(percent / 100 * len(values)) - 1))]
+
+
+def frame_stats(
+    clip: vs.VideoNode,
+    frames: typing.Optional[typing.Iterable[int]] = None
+) -> typing.Dict[str, typing.Any]:
+    """ summarizes the per-frame timings attached by the backends with stats=True
+
+    requests the frames of the clip, or the given frame numbers, and returns
+    the mean and the percentiles of "MLRTWaitTime", "MLRTCopyTime" and "MLRTInferenceTime"
+    in seconds, the mean number of tiles, the number of frames per stream, and the "bound",
+    i.e. the largest of the wait, copy and inference times in total.
+    with dedup enabled, the number of frames reusing the output of a recent input
+    is returned in "dedup_hits"
+    """
+
+    keys = {"wait": "MLRTWaitTime", "copy": "MLRTCopyTime", "inference": "MLRTInferenceTime"}
+
+    times: typing.Dict[str, typing.List[float]] = {name: [] for name in keys}
+    tiles: typing.List[int] = []
+    streams: typing.Dict[int, int] = {}
+    dedup_hits: typing.Optional[int] = None
+
+    if frames is None:
+        frames = range(clip.num_frames)
+
+    for n in frames:
+        props = clip.get_frame(n).props
+
+        if keys["inference"] not in props:
+            raise ValueError(f'frame {n} has no timings, the backend must be created with "stats=True"')
+
+        for name, key in keys.items():
+            times[name].append(props[key])
+
+        tiles.append(props["MLRTTiles"])
+
+        if "MLRTStream" in props:
+            streams[props["MLRTStream"]] = streams.get(props["MLRTStream"], 0) + 1
+
+        if "MLRTDedupHit" in props:
+            dedup_hits = (dedup_hits or 0) + props["MLRTDedupHit"]
+
+    if not tiles:
+        raise ValueError("no frames")
+
+    summary: typing.Dict[str, typing.Any] = {"frames": len(tiles)}
+
+    for name, values in times.items():
+        summary[name] = {
+            "total": sum(values),
+            "mean": sum(values) / len(values),
+            **{f"p{percent}": _percentile(values, percent) for percent in (50, 90, 99)}
+        }
+
+    summary["tiles"] = sum(tiles) / len(tiles)
+    summary["streams"] = dict(sorted(streams.items()))
+    summary["bound"] = max(keys, key=lambda name: summary[name]["total"])
+
+    if dedup_hits is not None:
+        summary["dedup_hits"] = dedup_hits
+
+    return summary
+
+
+def _trace_thread_name(tid: int) -> str:
+    # the tracks of the plugins, see common/trace.cpp
+    if tid >= 10000:
+        return f"thread {tid - 10000}"
+    elif tid >= 1000:
+        return f"stream {tid - 1000} (async inference)"
+    else:
+        return f"stream {tid}"
+
+
+@contextlib.contextmanager
+def trace(path: str, capacity: int = 1 << 20) -> typing.Iterator[None]:
+    """ records the timeline of the plugins into a chrome trace file
+
+    the plugins record the frames, the waits for a stream, and the copies and
+    inference of the tiles on each stream into a ring buffer of "capacity" events
+    per plugin. the file can be opened in chrome://tracing or ui.perfetto.dev.
+
+    example:
+        with vsmlrt.trace("trace.json"):
+            for _ in clip.frames(close=True):
+                pass
+    """
+
+    # plugins that are not loaded or predate tracing are skipped
+    namespaces = [
+        namespace for namespace in ("ort", "ov", "trt", "ncnn")
+        if hasattr(getattr(core, namespace, None), "TraceStart")
+    ]
+
+    for namespace in namespaces:
+        getattr(core, namespace).TraceStart(capacity=capacity)
+
+    try:
+        yield
+    finally:
+        events: typing.List[typing.Dict[str, typing.Any]] = []
+
+        for pid, namespace in enumerate(namespaces, start=1):
+            data = getattr(core, namespace).TraceStop()
+            if isinstance(data, dict):
+                data = data["trace"]
+            if isinstance(data, bytes):
+                data = data.decode()
+
+            plugin_events = json.loads(data)
+
+            events.append({"name": "process_name", "ph": "M", "pid": pid, "args": {"name": f"vs{namespace}"}})
+            for tid in sorted({event["tid"] for event in plugin_events}):
+                events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": _trace_thread_name(tid)}})
+                events.append({"name": "thread_sort_index", "ph": "M", "pid": pid, "tid": tid, "args": {"sort_index": tid}})
+
+            for event in plugin_events:
+                event["pid"] = pid
+                event["cat"] = namespace
+            events.extend(plugin_events)
+
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _benchmark_one(
+    name: str,
+    kwargs: typing.Dict[str, typing.Any],
+    backend: backendT,
+    num_frames: int,
+    warmup: int,
+    num_threads: typing.Optional[int]
+) -> typing.Dict[str, typing.Any]:
+
+    kwargs = dict(kwargs)
+
+    if name == "Waifu2x" and kwargs.get("model", Waifu2xModel.cunet) == Waifu2xModel.anime_style_art:
+        default_format = "GRAYS"
+    elif name == "DPIR" and kwargs.get("model", DPIRModel.drunet_gray) in (
+        DPIRModel.drunet_gray, DPIRModel.drunet_deblocking_grayscale
+    ):
+        default_format = "GRAYS"
+    else:
+        default_format = "RGBS"
+
+    if name == "DPIR":
+        kwargs.setdefault("strength", 5.0)
+
+    result: typing.Dict[str, typing.Any] = {
+        "wrapper": name,
+        "format": kwargs.pop("format", default_format),
+        "width": kwargs.pop("width", 1920),
+        "height": kwargs.pop("height", 1080),
+        "arguments": dict(kwargs),
+        "backend": repr(backend)
+    }
+
+    if num_threads is not None:
+        core.num_threads = num_threads
+
+    try:
+        # frames [warmup, warmup + num_frames) are measured for throughput,
+        # the following num_frames frames are measured one at a time for latency
+        clip = core.std.BlankClip(
+            format=getattr(vs, result["format"]),
+            width=result["width"], height=result["height"],
+            length=warmup + 2 * num_frames, keep=True
+        )
+
+        start = time.perf_counter()
+
+        if name == "RIFEMerge":
+            mask = core.std.BlankClip(clip, format=vs.GRAYS, color=0.5)
+            output = RIFEMerge(clip, clip.std.Invert(), mask, backend=backend, **kwargs)
+        else:
+            output = globals()[name](clip, backend=backend, **kwargs)
+
+        # filter creation builds or loads the engines, the first frame initializes the runtime
+        output.get_frame(0)
+        result["startup"] = time.perf_counter() - start
+
+        for i in range(1, warmup):
+            output.get_frame(i)
+
+        measured = output[warmup:warmup + num_frames]
+        start = time.perf_counter()
+        for _ in measured.frames(close=True):
+            pass
+        result["fps"] = measured.num_frames / (time.perf_counter() - start)
+
+        latencies = []
+        for i in range(warmup + num_frames, min(warmup + 2 * num_frames, output.num_frames)):
+            start = time.perf_counter()
+            output.get_frame(i)
+            latencies.append(time.perf_counter() - start)
+
+        for percent in (50, 90, 99):
+            result[f"latency_p{percent}"] = _percentile(latencies, percent) if latencies else None
+    except Exception as e:
+        result["error"] = str(e)
+
+    try:
+        import resource
+        peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # bytes on macOS, kilobytes elsewhere
+        result["peak_rss"] = peak_rss / 1024 ** (2 if sys.platform == "darwin" else 1)
+    except ImportError:
+        result["peak_rss"] = None
+
+    return result
+
+
+def benchmark(
+    jobs: typing.Sequence[typing.Tuple[str, typing.Dict[str, typing.Any]]],
+    backends: typing.Sequence[backendT],
+    num_frames: int = 20,
+    warmup: int = 2,
+    num_threads: typing.Optional[int] = None,
+    isolate: bool = True
+) -> typing.List[typing.Dict[str, typing.Any]]:
+    """ measures the wrappers on blank clips with each of the backends
+
+    each job is the name of a wrapper, e.g. "CUGAN", and its keyword arguments,
+    with the additional keys "width", "height" and "format" describing the input clip,
+    list-valued arguments of the jobs are swept as in expand_sweep().
+
+    returns one result per job and backend, with the fps, the per-frame latency percentiles
+    "latency_p50", "latency_p90" and "latency_p99" in seconds, the "startup" time to the first frame
+    in seconds and the "peak_rss" in MiB, or the "error" of a failed configuration.
+
+    isolate runs each configuration in a fresh process, so that the startup time includes
+    loading the runtimes and the peak rss is not shared between configurations.
+    """
+
+    from concurrent.futures import ProcessPoolExecutor
+    from concurrent.futures.process import BrokenProcessPool
+    import multiprocessing
+
+    wrappers = ("Waifu2x", "DPIR", "RealESRGAN", "RealESRGANv2", "CUGAN", "RIFE", "RIFEMerge")
+
+    for name, _ in jobs:
+        if name not in wrappers:
+            raise ValueError(f'unknown wrapper "{name}"')
+
+    results = []
+
+    for name, job_kwargs in jobs:
+        for kwargs in expand_sweep(job_kwargs):
+            for backend in backends:
+                args = (name, kwargs, copy.deepcopy(backend), num_frames, warmup, num_threads)
+
+                if isolate:
+                    context = multiprocessing.get_context("spawn")
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                        try:
+                            result = executor.submit(_benchmark_one, *args).result()
+                        except BrokenProcessPool:
+                            result = {
+                                "wrapper": name,
+                                "arguments": kwargs,
+                                "backend": repr(backend),
+                                "error": "the benchmark process terminated abruptly"
+                            }
+                else:
+                    result = _benchmark_one(*args)
+
+                if "error" in result:
+                    import logging
+                    logger = logging.getLogger("vsmlrt")
+                    logger.warning(f'benchmark of {name} {kwargs} with {backend} failed: {result["error"]}')
+                else:
+                    print(f'benchmarked {name} {kwargs} with {backend}: {result["fps"]:.3f} fps', file=sys.stderr)
+
+                results.append(result)
+
+    return results
+
+
+def write_benchmark_results(
+    results: typing.Sequence[typing.Dict[str, typing.Any]],
+    file: typing.TextIO,
+    file_format: typing.Literal["json", "csv"] = "json"
+) -> None:
+
+    if file_format == "json":
+        json.dump(list(results), file, indent=2, default=str)
+        file.write("\n")
+    elif file_format == "csv":
+        import csv
+
+        fieldnames = [
+            "wrapper", "format", "width", "height", "arguments", "backend",
+            "fps", "latency_p50", "latency_p90", "latency_p99", "startup", "peak_rss", "error"
+        ]
+
+        writer = csv.DictWriter(file, fieldnames=fieldnames, restval="")
+        writer.writeheader()
+        for result in results:
+            writer.writerow({**result, "arguments": json.dumps(result.get("arguments", {}), default=str)})
+    else:
+        raise ValueError(f'unknown format "{file_format}"')
+
+
+def autotune(
+    model: str,
+    resolution: typing.Tuple[int, int],
+    backend_class: typing.Union[typing.Type[Backend.OV_CPU], typing.Type[Backend.ORT_CPU]],
+    candidates: typing.Optional[typing.Dict[str, typing.Sequence[typing.Any]]] = None,
+    num_frames: int = 10,
+    warmup: int = 2,
+    save: bool = True
+) -> typing.Dict[str, typing.Any]:
+    """ searches the backend settings and the number of tiles of the highest throughput on this host
+
+    model is the name of a wrapper and its arguments, e.g. "CUGAN:noise=-1,scale=2",
+    and resolution is the size of its input clip.
+
+    the parameters in candidates are tuned one at a time in order, keeping the best values found so far.
+    by default, "num_streams", "tiles", "bind_thread" and "bf16" are searched for OV_CPU
+    and "num_streams", "tiles", "intra_op_num_threads" and "inter_op_num_threads" for ORT_CPU.
+
+    the result is saved in the profile of this host,
+    from which it is used when the wrapper is called on a clip of the same resolution
+    with the same arguments selecting the network, e.g. "noise" and "scale" of CUGAN,
+    the bare backend class, e.g. backend=Backend.OV_CPU, and without "tiles" and "tilesize".
+    """
+
+    import inspect
+
+    name, kwargs = parse_arguments(model)
+    name = {"RealESRGANv2": "RealESRGAN", "RIFEMerge": "RIFE"}.get(name, name)
+
+    width, height = resolution
+
+    if name not in autotune_arguments:
+        raise ValueError(f"autotune: unknown wrapper {name}")
+
+    # the network selected by the arguments, with the defaults of the wrapper
+    parameters = inspect.signature(globals()[name]).parameters
+    arguments = {
+        key: kwargs.get(key, parameters[key].default)
+        for key in autotune_arguments.get(name, ())
+    }
+
+    streams = [n for n in (1, 2, 4, 8, 16, 32) if n <= (os.cpu_count() or 1)]
+
+    if candidates is None:
+        if backend_class is Backend.OV_CPU:
+            candidates = {
+                "num_streams": streams,
+                "tiles": [None, 2, 4],
+                "bind_thread": [True, False],
+                "bf16": [False, True]
+            }
+        elif backend_class is Backend.ORT_CPU:
+            candidates = {
+                "num_streams": streams,
+                "tiles": [None, 2, 4],
+                "intra_op_num_threads": [0, *streams],
+                "inter_op_num_threads": [0, 1]
+            }
+        else:
+            raise ValueError(f"autotune: unsupported backend {backend_class}")
+
+    measured: typing.Dict[typing.Tuple[typing.Tuple[str, typing.Any], ...], typing.Optional[float]] = {}
+
+    def measure(settings: typing.Dict[str, typing.Any]) -> typing.Optional[float]:
+        key = tuple(settings.items())
+        if key not in measured:
+            backend_kwargs = dict(settings)
+            job_kwargs = dict(kwargs, width=width, height=height)
+
+            tiles = backend_kwargs.pop("tiles", None)
+            if tiles is not None:
+                job_kwargs["tiles"] = tiles
+
+            [result] = benchmark(
+                [(name, job_kwargs)], [backend_class(**backend_kwargs)],
+                num_frames=num_frames, warmup=warmup
+            )
+            measured[key] = result.get("fps")
+
+        return measured[key]
+
+    best = {key: values[0] for key, values in candidates.items()}
+    best_fps = None
+
+    for key, values in candidates.items():
+        for value in values:
+            settings = {**best, key: value}
+            fps = measure(settings)
+
+            if fps is not None and (best_fps is None or fps > best_fps):
+                best, best_fps = settings, fps
+
+    if best_fps is None:
+        raise RuntimeError(f"autotune: every configuration of {model} with {backend_class} failed")
+
+    tuned = {
+        "backend": {key: value for key, value in best.items() if key != "tiles"},
+        "tiles": best.get("tiles"),
+        "fps": best_fps,
+        "model": model,
+        "time": time.time()
+    }
+
+    if save:
+        os.makedirs(autotune_profile_path, exist_ok=True)
+        with file_lock(f"{get_autotune_profile_path()}.lock"):
+            profile = load_autotune_profile()
+            profile["profiles"][get_autotune_key(backend_class, name, width, height, arguments)] = tuned
+            save_autotune_profile(profile)
+
+    return tuned
+
+
+def main() -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python -m vsmlrt")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prewarm_parser = subparsers.add_parser(
+        "prewarm",
+        help="build engines and models ahead of time",
+        description=(
+            'example: python -m vsmlrt prewarm '
+            '"CUGAN:width=1920,height=1080,tiles=2,noise=-1,scale=2" '
+            '"RIFE:width=1920,height=1080,scale=0.5" '
+            '--backend "TRT:fp16=True" --backend "OV_CPU"'
+        )
+    )
+    prewarm_parser.add_argument(
+        "jobs", nargs="+",
+        help='wrapper and its arguments, e.g. "DPIR:width=1280,height=720,format=GRAYS,strength=5"'
+    )
+    prewarm_parser.add_argument(
+        "--backend", action="append", required=True,
+        help='backend and its arguments, e.g. "TRT:fp16=True,num_streams=2", may be repeated'
+    )
+    prewarm_parser.add_argument("--workers", type=int, default=1, help="number of concurrent builds")
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help="measure the wrappers on blank clips",
+        description=(
+            'example: python -m vsmlrt benchmark '
+            '"CUGAN:width=1280,height=720,tiles=[1,2,4]" '
+            '"RIFE:width=1280,height=720" '
+            '--backend "ORT_CPU:num_streams=[1,2]" --backend "OV_CPU:fp16=[False,True]" '
+            '--format csv --output results.csv; '
+            'list-valued arguments are swept'
+        )
+    )
+    benchmark_parser.add_argument(
+        "jobs", nargs="+",
+        help='wrapper and its arguments, e.g. "DPIR:width=1280,height=720,format=GRAYS,strength=5"'
+    )
+    benchmark_parser.add_argument(
+        "--backend", action="append", default=None,
+        help='backend and its arguments, e.g. "TRT:fp16=True,num_streams=[1,2]", '
+             'may be repeated (default: ORT_CPU and OV_CPU)'
+    )
+    benchmark_parser.add_argument("--frames", type=int, default=20, help="number of measured frames")
+    benchmark_parser.add_argument("--warmup", type=int, default=2, help="number of frames before measurement")
+    benchmark_parser.add_argument("--threads", type=int, default=None, help="number of vapoursynth threads")
+    benchmark_parser.add_argument(
+        "--no-isolate", action="store_true",
+        help="run all configurations in this process instead of a fresh process each"
+    )
+    benchmark_parser.add_argument("--format", choices=("json", "csv"), default="json")
+    benchmark_parser.add_argument("--output", default=None, help="output file (default: stdout)")
+
+    autotune_parser = subparsers.add_parser(
+        "autotune",
+        help="search the backend settings of the highest throughput on this host",
+        description=(
+            'example: python -m vsmlrt autotune "CUGAN:noise=-1,scale=2" '
+            '--width 1920 --height 1080 --backend OV_CPU'
+        )
+    )
+    autotune_parser.add_argument("model", help='wrapper and its arguments, e.g. "DPIR:model=1,strength=5"')
+    autotune_parser.add_argument("--width", type=int, required=True, help="width of the input clip")
+    autotune_parser.add_argument("--height", type=int, required=True, help="height of the input clip")
+    autotune_parser.add_argument("--backend", choices=("OV_CPU", "ORT_CPU"), required=True)
+    autotune_parser.add_argument("--frames", type=int, default=10, help="number of measured frames")
+    autotune_parser.add_argument("--warmup", type=int, default=2, help="number of frames before measurement")
+
+    cache_parser = subparsers.add_parser("cache", help="list or prune the caches")
+    cache_subparsers = cache_parser.add_subparsers(dest="cache_command", required=True)
+    cache_subparsers.add_parser("list", help="list the cached engines, models and output frames")
+    prune_parser = cache_subparsers.add_parser("prune", help="remove the least recently used entries")
+    prune_parser.add_argument("--max-size", type=int, default=None, help="maximum size of each cache in MiB")
+    prune_parser.add_argument("--max-age", type=float, default=None, help="maximum age since last use in days")
+
+    args = parser.parse_args()
+
+    if args.command == "prewarm":
+        jobs = [parse_arguments(job) for job in args.jobs]
+
+        backends = []
+        for text in args.backend:
+            name, kwargs = parse_arguments(text)
+            backends.append(getattr(Backend, name)(**kwargs))
+
+        prewarm(jobs, backends, num_workers=args.workers)
+    elif args.command == "benchmark":
+        jobs = [parse_arguments(job) for job in args.jobs]
+
+        backends = []
+        for text in args.backend or ["ORT_CPU", "OV_CPU"]:
+            name, backend_kwargs = parse_arguments(text)
+            for kwargs in expand_sweep(backend_kwargs):
+                backends.append(getattr(Backend, name)(**kwargs))
+
+        results = benchmark(
+            jobs, backends,
+            num_frames=args.frames, warmup=args.warmup,
+            num_threads=args.threads, isolate=not args.no_isolate
+        )
+
+        if args.output is None:
+            write_benchmark_results(results, sys.stdout, file_format=args.format)
+        else:
+            with open(args.output, "w", newline="") as f:
+                write_benchmark_results(results, f, file_format=args.format)
+    elif args.command == "autotune":
+        tuned = autotune(
+            args.model, (args.width, args.height), getattr(Backend, args.backend),
+            num_frames=args.frames, warmup=args.warmup
+        )
+
+        print(f"saved to {get_autotune_profile_path()}", file=sys.stderr)
+        json.dump(tuned, sys.stdout, indent=2)
+        print()
+    elif args.command == "cache":
+        if args.cache_command == "list":
+            list_caches()
+        elif args.cache_command == "prune":
+            prune_caches(max_size=args.max_size, max_age=args.max_age)
+
+
+if trace_path is not None:
+    _trace = trace(trace_path)
+    _trace.__enter__()
+    atexit.register(_trace.__exit__, None, None, None)
+
+
+if __name__ == "__main__":
+    main()
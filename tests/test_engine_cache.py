@@ -0,0 +1,193 @@
+""" engine builds of vsmlrt.trtexec() against a fake trtexec """
+
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+pytest.importorskip("vapoursynth")
+
+try:
+    import vsmlrt
+except (AttributeError, AssertionError):
+    pytest.skip("no vs-mlrt plugin is installed", allow_module_level=True)
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32" or "fork" not in multiprocessing.get_all_start_methods(),
+    reason="the fake trtexec is a script run in forked processes"
+)
+
+
+# writes the engine in two steps so that a reader of a non-atomic rename
+# would see a truncated engine, and logs every build
+FAKE_TRTEXEC = """\
+#!{python}
+import os, sys, time
+
+args = dict(arg[2:].split("=", 1) for arg in sys.argv[1:] if "=" in arg)
+
+with open(os.environ["FAKE_TRTEXEC_LOG"], "a") as log:
+    log.write(args["saveEngine"] + "\\n")
+
+if os.environ.get("FAKE_TRTEXEC_FAIL"):
+    open(args["saveEngine"], "wb").close()
+    sys.exit(1)
+
+with open(args["saveEngine"], "wb") as f:
+    f.write(b"\\0" * (int(os.environ["FAKE_TRTEXEC_SIZE"]) // 2))
+    f.flush()
+    time.sleep(0.5)
+    f.write(b"\\0" * (int(os.environ["FAKE_TRTEXEC_SIZE"]) // 2))
+"""
+
+ENGINE_SIZE = 512 * 1024
+
+
+class FakeTRT:
+    def Version(self):
+        return {"tensorrt_version": b"8601", "path": b""}
+
+    def DeviceProperties(self, device_id):
+        return {"name": b"Fake GPU", "major": 8}
+
+
+class FakeCore:
+    trt = FakeTRT()
+
+
+@pytest.fixture
+def fake_trtexec(tmp_path, monkeypatch):
+    trtexec_path = tmp_path / "trtexec"
+    trtexec_path.write_text(FAKE_TRTEXEC.format(python=sys.executable))
+    trtexec_path.chmod(trtexec_path.stat().st_mode | stat.S_IXUSR)
+
+    log_path = tmp_path / "trtexec.log"
+    log_path.touch()
+
+    monkeypatch.setattr(vsmlrt, "core", FakeCore())
+    monkeypatch.setattr(vsmlrt, "trtexec_path", str(trtexec_path))
+    monkeypatch.setattr(vsmlrt, "engine_cache_path", str(tmp_path / "engines"))
+    monkeypatch.setattr(vsmlrt, "engine_cache_size", None)
+    monkeypatch.setenv("FAKE_TRTEXEC_LOG", str(log_path))
+    monkeypatch.setenv("FAKE_TRTEXEC_SIZE", str(ENGINE_SIZE))
+    monkeypatch.delenv("FAKE_TRTEXEC_FAIL", raising=False)
+
+    network_path = tmp_path / "network.onnx"
+    network_path.write_bytes(b"fake onnx model")
+
+    def builds():
+        return log_path.read_text().splitlines()
+
+    return str(network_path), builds
+
+
+def build(network_path, shape=64):
+    return vsmlrt.trtexec(
+        network_path, channels=3, opt_shapes=(shape, shape), max_shapes=(shape, shape),
+        fp16=False, device_id=0
+    )
+
+
+def leftovers(engine_dir):
+    return [name for name in os.listdir(engine_dir) if name.endswith(".tmp")]
+
+
+def test_concurrent_builds_run_trtexec_once(fake_trtexec):
+    network_path, builds = fake_trtexec
+
+    context = multiprocessing.get_context("fork")
+    with concurrent.futures.ProcessPoolExecutor(4, mp_context=context) as executor:
+        engine_paths = list(executor.map(build, [network_path] * 4))
+
+    assert len(set(engine_paths)) == 1
+    assert len(builds()) == 1
+
+    # renamed from the temporary file of the build once it is complete
+    engine_path = engine_paths[0]
+    assert builds()[0] != engine_path
+    assert builds()[0].startswith(engine_path)
+    assert os.path.getsize(engine_path) == ENGINE_SIZE
+    assert not leftovers(os.path.dirname(engine_path))
+
+    # the lock is released and the engine is reused afterwards
+    assert build(network_path) == engine_path
+    assert len(builds()) == 1
+
+
+def test_failed_build_leaves_no_engine(fake_trtexec, monkeypatch):
+    network_path, builds = fake_trtexec
+    monkeypatch.setenv("FAKE_TRTEXEC_FAIL", "1")
+
+    with pytest.raises(Exception):
+        build(network_path)
+
+    engine_dir = vsmlrt.engine_cache_path
+    assert not any(name.endswith(".engine") for name in os.listdir(engine_dir))
+    assert not leftovers(engine_dir)
+
+    monkeypatch.delenv("FAKE_TRTEXEC_FAIL")
+    assert os.path.getsize(build(network_path)) == ENGINE_SIZE
+    assert len(builds()) == 2
+
+
+def test_index_evicts_least_recently_used(fake_trtexec, monkeypatch):
+    network_path, builds = fake_trtexec
+
+    # room for two engines
+    monkeypatch.setattr(vsmlrt, "engine_cache_size", 1)
+
+    first = build(network_path, 32)
+    second = build(network_path, 64)
+    assert build(network_path, 32) == first
+    third = build(network_path, 128)
+
+    assert os.path.exists(first)
+    assert not os.path.exists(second)
+    assert not os.path.exists(f"{second}.lock")
+    assert os.path.exists(third)
+
+    with open(vsmlrt.get_engine_cache_index_path()) as f:
+        index = json.load(f)
+    assert set(index["engines"]) == {first, third}
+
+    assert build(network_path, 64) == second
+    assert len(builds()) == 4
+
+
+def test_lock_survives_removal_of_its_file(tmp_path):
+    import fcntl
+    import threading
+
+    path = str(tmp_path / "engine.lock")
+    acquired = []
+
+    def locker():
+        with vsmlrt.file_lock(path):
+            acquired.append(os.stat(path).st_ino)
+
+    with open(path, "a+b") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        thread = threading.Thread(target=locker)
+        thread.start()
+        thread.join(0.2)
+
+        # pruned while the other builder waits on the old file
+        removed_inode = os.fstat(f.fileno()).st_ino
+        os.remove(path)
+
+        # a third builder locks the new file at the path
+        with open(path, "a+b") as new_f:
+            fcntl.flock(new_f.fileno(), fcntl.LOCK_EX)
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            thread.join(0.2)
+            assert not acquired
+            new_inode = os.fstat(new_f.fileno()).st_ino
+
+    thread.join()
+    assert acquired == [new_inode] and new_inode != removed_inode
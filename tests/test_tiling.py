@@ -0,0 +1,112 @@
+""" tiled inference with overlap="auto" against untiled inference """
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir, "scripts"))
+
+vs = pytest.importorskip("vapoursynth")
+np = pytest.importorskip("numpy")
+onnx = pytest.importorskip("onnx")
+
+try:
+    import vsmlrt
+except (AttributeError, AssertionError):
+    pytest.skip("no vs-mlrt plugin is installed", allow_module_level=True)
+
+from onnx import helper, numpy_helper, TensorProto
+
+
+@pytest.fixture(scope="module")
+def network_path(tmp_path_factory):
+    """ conv, strided conv, nearest upsampling and a conv padded on one side only """
+
+    rng = np.random.default_rng(0)
+
+    def weight(name, shape):
+        return numpy_helper.from_array(rng.standard_normal(shape).astype(np.float32) / 4, name)
+
+    nodes = [
+        helper.make_node("Conv", ["input", "w1"], ["x1"], kernel_shape=[3, 3], pads=[1, 1, 1, 1]),
+        helper.make_node("Relu", ["x1"], ["x2"]),
+        helper.make_node("Conv", ["x2", "w2"], ["x3"], kernel_shape=[3, 3], pads=[1, 1, 1, 1], strides=[2, 2]),
+        helper.make_node("Resize", ["x3", "", "scales"], ["x4"], mode="nearest"),
+        helper.make_node("Conv", ["x4", "w3"], ["output"], kernel_shape=[3, 3], pads=[2, 2, 0, 0]),
+    ]
+
+    initializers = [
+        weight("w1", (8, 3, 3, 3)),
+        weight("w2", (8, 8, 3, 3)),
+        weight("w3", (3, 8, 3, 3)),
+        numpy_helper.from_array(np.array([1, 1, 2, 2], dtype=np.float32), "scales"),
+    ]
+
+    graph = helper.make_graph(
+        nodes, "tiling",
+        [helper.make_tensor_value_info("input", TensorProto.FLOAT, ["n", 3, "h", "w"])],
+        [helper.make_tensor_value_info("output", TensorProto.FLOAT, ["n", 3, "h", "w"])],
+        initializers
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.checker.check_model(model)
+
+    path = tmp_path_factory.mktemp("models") / "tiling.onnx"
+    onnx.save(model, str(path))
+    return str(path)
+
+
+def test_receptive_field(network_path):
+    # 1 + 1 (stride 2) + 1 * 2 (upsampled) + 2 (one-sided pads), aligned to 2
+    assert vsmlrt.get_receptive_field(network_path) == (6, 2)
+    assert vsmlrt.calc_overlap(network_path, default=0) == (6, 2)
+    assert vsmlrt.calc_overlap(network_path, default=0, multiple=4) == (6, 4)
+    assert vsmlrt.calc_overlap(network_path, default=0, multiple=3) == (6, 6)
+
+
+def test_bytes_per_pixel(network_path):
+    # Relu over 8 channels at the input resolution, doubled, in fp32
+    assert vsmlrt.estimate_bytes_per_pixel(network_path) == 2 * 4 * (8 + 8)
+
+
+@pytest.mark.parametrize("backend_name", ["ORT_CPU", "OV_CPU"])
+def test_tiled_matches_untiled(network_path, backend_name):
+    namespace = {"ORT_CPU": "ort", "OV_CPU": "ov"}[backend_name]
+    if not hasattr(vs.core, namespace):
+        pytest.skip(f"vs{namespace} is not installed")
+
+    backend = getattr(vsmlrt.Backend, backend_name)()
+
+    width, height = 96, 80
+    clip = vs.core.std.BlankClip(format=vs.RGBS, width=width, height=height, length=1)
+    clip = vs.core.std.Expr(clip, [
+        "X 7 * Y 13 * + 29 % 29 /",
+        "X Y * 31 % 31 /",
+        "X 3 * Y 5 * - abs 23 % 23 /"
+    ])
+
+    overlap, multiple = vsmlrt.calc_overlap(network_path, default=0)
+
+    untiled = vsmlrt.inference(
+        [clip], network_path, overlap=(0, 0), tilesize=(width, height), backend=backend
+    )
+
+    tilesize = (
+        vsmlrt.calc_size(width, 2, overlap, multiple),
+        vsmlrt.calc_size(height, 2, overlap, multiple)
+    )
+    tiled = vsmlrt.inference(
+        [clip], network_path, overlap=(overlap, overlap), tilesize=tilesize, backend=backend
+    )
+
+    diff = vs.core.std.Expr([tiled, untiled], "x y - abs")
+    diff = vs.core.std.PlaneStats(diff, plane=0)
+    for plane in range(1, 3):
+        diff = vs.core.std.PlaneStats(diff, plane=plane, prop=f"PlaneStats{plane}")
+
+    frame = diff.get_frame(0)
+    assert frame.props["PlaneStatsMax"] < 1e-4
+    for plane in range(1, 3):
+        assert frame.props[f"PlaneStats{plane}Max"] < 1e-4
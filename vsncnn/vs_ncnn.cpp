@@ -1,8 +1,10 @@
 #include <algorithm>
 #include <array>
 #include <atomic>
+#include <chrono>
 #include <cstdint>
 #include <fstream>
+#include <functional>
 #include <memory>
 #include <optional>
 #include <string>
@@ -11,7 +13,6 @@
 #include <vector>
 
 #if not __cpp_lib_atomic_wait
-#include <chrono>
 #include <thread>
 #endif
 
@@ -31,7 +32,74 @@ extern std::variant<std::string, ONNX_NAMESPACE::ModelProto> loadONNX(
     const std::string_view & path,
     int64_t tile_w,
     int64_t tile_h,
-    bool path_is_serialization
+    bool path_is_serialization,
+    int64_t batch,
+    const std::string & cache_dir,
+    uint64_t cache_size
+) noexcept;
+
+extern void traceStart(size_t capacity) noexcept;
+
+extern std::string traceStop() noexcept;
+
+extern bool traceEnabled() noexcept;
+
+extern int64_t traceNow() noexcept;
+
+extern int traceThreadId() noexcept;
+
+extern void traceEvent(
+    const char * name,
+    int64_t begin,
+    int64_t end,
+    int tid,
+    int frame,
+    int tile
+) noexcept;
+
+struct DedupCache;
+
+extern DedupCache * dedupCreate(int capacity, float threshold) noexcept;
+
+extern void dedupFree(DedupCache * cache, const VSAPI * vsapi) noexcept;
+
+extern const VSFrameRef * dedupGetFrame(
+    DedupCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+extern std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept;
+
+struct ResultCache;
+
+extern ResultCache * resultCacheCreate(
+    const std::string & cache_dir,
+    const std::string & key,
+    uint64_t max_size
+) noexcept;
+
+extern void resultCacheFree(ResultCache * cache) noexcept;
+
+extern const VSFrameRef * resultCacheGetFrame(
+    ResultCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    const VSVideoInfo * vi,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
 ) noexcept;
 
 
@@ -92,6 +160,59 @@ struct TicketSemaphore {
     }
 };
 
+// per-frame timings
+struct FrameStats {
+    std::chrono::nanoseconds wait {};
+    std::chrono::nanoseconds copy {};
+    std::chrono::nanoseconds inference {};
+};
+
+// adds its lifetime to "total"
+struct ScopedTimer {
+    std::chrono::nanoseconds & total;
+    std::chrono::steady_clock::time_point start { std::chrono::steady_clock::now() };
+
+    ~ScopedTimer() {
+        total += std::chrono::duration_cast<std::chrono::nanoseconds>(
+            std::chrono::steady_clock::now() - start
+        );
+    }
+};
+
+// records its lifetime as an event of the timeline if tracing is enabled
+struct TraceScope {
+    const char * name;
+    int tid;
+    int frame;
+    int tile = -1;
+    int64_t begin { traceEnabled() ? traceNow() : -1 };
+
+    ~TraceScope() {
+        if (begin >= 0) {
+            traceEvent(name, begin, traceNow(), tid, frame, tile);
+        }
+    }
+};
+
+static void setFrameStats(
+    VSMap * props,
+    const FrameStats & stats,
+    int num_tiles,
+    int stream,
+    const VSAPI * vsapi
+) noexcept {
+
+    const auto seconds = [](std::chrono::nanoseconds time) {
+        return std::chrono::duration<double>(time).count();
+    };
+
+    vsapi->propSetFloat(props, "MLRTWaitTime", seconds(stats.wait), paReplace);
+    vsapi->propSetFloat(props, "MLRTCopyTime", seconds(stats.copy), paReplace);
+    vsapi->propSetFloat(props, "MLRTInferenceTime", seconds(stats.inference), paReplace);
+    vsapi->propSetInt(props, "MLRTTiles", num_tiles, paReplace);
+    vsapi->propSetInt(props, "MLRTStream", stream, paReplace);
+}
+
 // per-stream context
 struct Resource {
     std::unique_ptr<ncnn::VkCompute> cmd;
@@ -118,6 +239,11 @@ struct vsNcnnData {
 
     bool fp16;
 
+    bool stats; // attaches FrameStats as frame properties
+
+    DedupCache * dedup_cache; // reuses the outputs of recent inputs if set
+    ResultCache * result_cache; // stores the outputs on disk if set
+
     std::vector<Resource> resources;
     std::vector<int> tickets;
     std::mutex ticket_lock;
@@ -203,9 +329,18 @@ static const VSFrameRef *VS_CC vsNcnnGetFrame(
         auto dst_stride = vsapi->getStride(dst_frame, 0);
         auto dst_bytes = vsapi->getFrameFormat(dst_frame)->bytesPerSample;
 
-        auto ticket = d->acquire();
+        FrameStats stats;
+
+        int ticket;
+        {
+            ScopedTimer timer { stats.wait };
+            TraceScope trace { "wait", traceThreadId(), n };
+            ticket = d->acquire();
+        }
         Resource & resource = d->resources[ticket];
 
+        TraceScope frame_trace { "frame", traceThreadId(), n };
+
         std::array<int64_t, 4> src_tile_shape { 1, d->in_tile_c, d->in_tile_h, d->in_tile_w };
         auto src_tile_h = src_tile_shape[2];
         auto src_tile_w = src_tile_shape[3];
@@ -259,6 +394,8 @@ static const VSFrameRef *VS_CC vsNcnnGetFrame(
         opt.workspace_vkallocator = resource.blob_vkallocator;
         opt.staging_vkallocator = resource.staging_vkallocator;
 
+        int num_tiles = 0;
+
         int y = 0;
         while (true) {
             int y_crop_start = (y == 0) ? 0 : d->overlap_h;
@@ -269,7 +406,12 @@ static const VSFrameRef *VS_CC vsNcnnGetFrame(
                 int x_crop_start = (x == 0) ? 0 : d->overlap_w;
                 int x_crop_end = (x == src_width - src_tile_w) ? 0 : d->overlap_w;
 
+                num_tiles++;
+
                 {
+                    ScopedTimer timer { stats.copy };
+                    TraceScope trace { "pack", ticket, n, num_tiles - 1 };
+
                     auto input_buffer = reinterpret_cast<uint8_t *>(d->fp16 ? resource.h_src_fp32.data : resource.h_src.data);
 
                     // assumes the pitches of ncnn::Mat to be
@@ -291,34 +433,44 @@ static const VSFrameRef *VS_CC vsNcnnGetFrame(
                 }
 
                 if (d->fp16) {
+                    ScopedTimer timer { stats.copy };
+                    TraceScope trace { "convert", ticket, n, num_tiles - 1 };
                     ncnn::cast_float32_to_float16(resource.h_src_fp32, resource.h_src);
                 }
 
-                resource.cmd->record_clone(resource.h_src, resource.d_src, opt);
-
                 {
+                    ScopedTimer timer { stats.inference };
+                    TraceScope trace { "infer", ticket, n, num_tiles - 1 };
+
+                    resource.cmd->record_clone(resource.h_src, resource.d_src, opt);
+
                     auto extractor = d->net.create_extractor();
                     extractor.set_blob_vkallocator(resource.blob_vkallocator);
                     extractor.set_workspace_vkallocator(resource.blob_vkallocator);
                     extractor.set_staging_vkallocator(resource.staging_vkallocator);
                     extractor.input(d->input_index, resource.d_src);
                     extractor.extract(d->output_index, resource.d_dst, *resource.cmd);
-                }
 
-                resource.cmd->record_clone(resource.d_dst, resource.h_dst, opt);
-                if (resource.cmd->submit_and_wait() != 0) {
-                    resource.cmd->reset();
-                    return set_error("inference failed");
-                }
-                if (resource.cmd->reset() != 0) {
-                    return set_error("cmd reset failed");
+                    resource.cmd->record_clone(resource.d_dst, resource.h_dst, opt);
+                    if (resource.cmd->submit_and_wait() != 0) {
+                        resource.cmd->reset();
+                        return set_error("inference failed");
+                    }
+                    if (resource.cmd->reset() != 0) {
+                        return set_error("cmd reset failed");
+                    }
                 }
 
                 if (d->fp16) {
+                    ScopedTimer timer { stats.copy };
+                    TraceScope trace { "convert", ticket, n, num_tiles - 1 };
                     ncnn::cast_float16_to_float32(resource.h_dst, resource.h_dst_fp32);
                 }
 
                 {
+                    ScopedTimer timer { stats.copy };
+                    TraceScope trace { "unpack", ticket, n, num_tiles - 1 };
+
                     auto output_buffer = reinterpret_cast<uint8_t *>(d->fp16 ? resource.h_dst_fp32.data : resource.h_dst.data);
 
                     for (int plane = 0; plane < dst_planes; ++plane) {
@@ -355,6 +507,10 @@ static const VSFrameRef *VS_CC vsNcnnGetFrame(
             y = std::min(y + step_h, src_height - src_tile_h);
         }
 
+        if (d->stats) {
+            setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, num_tiles, ticket, vsapi);
+        }
+
         d->release(ticket);
 
         for (const auto & frame : src_frames) {
@@ -368,6 +524,45 @@ static const VSFrameRef *VS_CC vsNcnnGetFrame(
 }
 
 
+// runs the network only for inputs that differ from the recent ones
+// and whose outputs are not stored in the result cache
+static const VSFrameRef *VS_CC vsNcnnGetFrameCached(
+    int n,
+    int activationReason,
+    void **instanceData,
+    void **frameData,
+    VSFrameContext *frameCtx,
+    VSCore *core,
+    const VSAPI *vsapi
+) noexcept {
+
+    auto d = static_cast<vsNcnnData *>(*instanceData);
+
+    if (activationReason == arAllFramesReady) {
+        const std::function<const VSFrameRef * ()> process = [&] {
+            return vsNcnnGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+        };
+
+        const std::function<const VSFrameRef * ()> cached = [&] {
+            if (d->result_cache) {
+                return resultCacheGetFrame(
+                    d->result_cache, n, d->nodes, d->out_vi.get(), d->stats,
+                    frameCtx, core, vsapi, process
+                );
+            }
+            return process();
+        };
+
+        if (d->dedup_cache) {
+            return dedupGetFrame(d->dedup_cache, n, d->nodes, d->stats, frameCtx, core, vsapi, cached);
+        }
+        return cached();
+    }
+
+    return vsNcnnGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+}
+
+
 static void VS_CC vsNcnnFree(
     void *instanceData,
     VSCore *core,
@@ -376,6 +571,9 @@ static void VS_CC vsNcnnFree(
 
     auto d = static_cast<vsNcnnData *>(instanceData);
 
+    dedupFree(d->dedup_cache, vsapi);
+    resultCacheFree(d->result_cache);
+
     for (const auto & node : d->nodes) {
         vsapi->freeNode(node);
     }
@@ -492,6 +690,40 @@ static void VS_CC vsNcnnCreate(
         d->fp16 = false;
     }
 
+    d->stats = !!vsapi->propGetInt(in, "stats", 0, &error);
+    if (error) {
+        d->stats = false;
+    }
+
+    int dedup = int64ToIntS(vsapi->propGetInt(in, "dedup", 0, &error));
+    if (error) {
+        dedup = 0;
+    }
+    if (dedup < 0) {
+        return set_error("\"dedup\" must be non-negative");
+    }
+
+    auto dedup_threshold = static_cast<float>(vsapi->propGetFloat(in, "dedup_threshold", 0, &error));
+    if (error) {
+        dedup_threshold = 0.f;
+    }
+    if (dedup_threshold < 0.f) {
+        return set_error("\"dedup_threshold\" must be non-negative");
+    }
+
+    const char * result_cache_dir = vsapi->propGetData(in, "result_cache_dir", 0, &error);
+    if (error) {
+        result_cache_dir = "";
+    }
+
+    int64_t result_cache_size = vsapi->propGetInt(in, "result_cache_size", 0, &error);
+    if (error) {
+        result_cache_size = 10240;
+    }
+    if (result_cache_size < 0) {
+        return set_error("\"result_cache_size\" must be non-negative");
+    }
+
     bool path_is_serialization = !!vsapi->propGetInt(in, "path_is_serialization", 0, &error);
     if (error) {
         path_is_serialization = false;
@@ -518,7 +750,23 @@ static void VS_CC vsNcnnCreate(
         path_view = path;
     }
 
-    auto result = loadONNX(path_view, tile_w, tile_h, path_is_serialization);
+    const char * cache_dir = vsapi->propGetData(in, "cache_dir", 0, &error);
+    if (error) {
+        cache_dir = "";
+    }
+
+    int64_t cache_size = vsapi->propGetInt(in, "cache_size", 0, &error);
+    if (error) {
+        cache_size = 2048;
+    }
+    if (cache_size < 0) {
+        return set_error("\"cache_size\" must be non-negative");
+    }
+
+    auto result = loadONNX(
+        path_view, tile_w, tile_h, path_is_serialization, /* batch */ 1,
+        cache_dir, static_cast<uint64_t>(cache_size) << 20
+    );
     if (std::holds_alternative<std::string>(result)) {
         return set_error(std::get<std::string>(result));
     }
@@ -601,9 +849,32 @@ static void VS_CC vsNcnnCreate(
         }
     }
 
+    if (result_cache_dir[0] != '\0') {
+        std::string description = (
+            std::string("result;ncnn;") + VERSION + ";" + std::to_string(d->fp16) + ";" +
+            std::to_string(tile_w) + "x" + std::to_string(tile_h) + ";" +
+            std::to_string(d->overlap_w) + "x" + std::to_string(d->overlap_h)
+        );
+
+        auto result_cache_key = getModelCacheKey(path_view, path_is_serialization, description);
+        if (result_cache_key.has_value()) {
+            d->result_cache = resultCacheCreate(
+                result_cache_dir, result_cache_key.value(),
+                static_cast<uint64_t>(result_cache_size) << 20
+            );
+        }
+        if (!d->result_cache) {
+            vsapi->logMessage(mtWarning, "vsNcnn: failed to open the result cache");
+        }
+    }
+
+    if (dedup > 0) {
+        d->dedup_cache = dedupCreate(dedup, dedup_threshold);
+    }
+
     vsapi->createFilter(
         in, out, "Model",
-        vsNcnnInit, vsNcnnGetFrame, vsNcnnFree,
+        vsNcnnInit, d->dedup_cache || d->result_cache ? vsNcnnGetFrameCached : vsNcnnGetFrame, vsNcnnFree,
         fmParallel, 0, d.release(), core
     );
 }
@@ -634,6 +905,13 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         "builtindir:data:opt;"
         "fp16:int:opt;"
         "path_is_serialization:int:opt;"
+        "cache_dir:data:opt;"
+        "cache_size:int:opt;"
+        "stats:int:opt;"
+        "dedup:int:opt;"
+        "dedup_threshold:float:opt;"
+        "result_cache_dir:data:opt;"
+        "result_cache_size:int:opt;"
         , vsNcnnCreate,
         nullptr,
         plugin
@@ -655,4 +933,21 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         vsapi->propSetData(out, "path", vsapi->getPluginPath(myself), -1, paReplace);
     };
     registerFunc("Version", "", getVersion, nullptr, plugin);
+
+    auto startTrace = [](const VSMap * in, VSMap *, void *, VSCore *, const VSAPI *vsapi) {
+        int error;
+        auto capacity = vsapi->propGetInt(in, "capacity", 0, &error);
+        if (error || capacity <= 0) {
+            capacity = 1 << 20;
+        }
+
+        traceStart(static_cast<size_t>(capacity));
+    };
+    registerFunc("TraceStart", "capacity:int:opt;", startTrace, nullptr, plugin);
+
+    auto stopTrace = [](const VSMap *, VSMap * out, void *, VSCore *, const VSAPI *vsapi) {
+        auto events = traceStop();
+        vsapi->propSetData(out, "trace", std::data(events), static_cast<int>(std::size(events)), paReplace);
+    };
+    registerFunc("TraceStop", "", stopTrace, nullptr, plugin);
 }
@@ -1,6 +1,12 @@
+#include <algorithm>
 #include <array>
 #include <atomic>
+#include <chrono>
+#include <condition_variable>
 #include <cstdint>
+#include <filesystem>
+#include <functional>
+#include <future>
 #include <ios>
 #include <memory>
 #include <mutex>
@@ -8,13 +14,13 @@
 #include <stdexcept>
 #include <string>
 #include <string_view>
+#include <thread>
+#include <unordered_map>
 #include <unordered_set>
 #include <variant>
 #include <vector>
 
 #if not __cpp_lib_atomic_wait
-#include <chrono>
-#include <thread>
 using namespace std::chrono_literals;
 #endif
 
@@ -37,7 +43,10 @@ extern std::variant<std::string, ONNX_NAMESPACE::ModelProto> loadONNX(
     const std::string_view & path,
     int64_t tile_w,
     int64_t tile_h,
-    bool path_is_serialization
+    bool path_is_serialization,
+    int64_t batch,
+    const std::string & cache_dir,
+    uint64_t cache_size
 ) noexcept;
 
 extern void convert_float_to_float16(
@@ -46,6 +55,152 @@ extern void convert_float_to_float16(
     const std::unordered_set<std::string> & op_block_list
 ) noexcept;
 
+extern std::string getHostIdentity() noexcept;
+
+extern std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept;
+
+extern std::optional<std::string> loadCachedModel(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept;
+
+extern void storeCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::string & data,
+    uint64_t max_size
+) noexcept;
+
+extern std::optional<std::filesystem::path> getCacheTempPath(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept;
+
+extern bool commitCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::filesystem::path & temp_path,
+    uint64_t max_size
+) noexcept;
+
+extern void traceStart(size_t capacity) noexcept;
+
+extern std::string traceStop() noexcept;
+
+extern bool traceEnabled() noexcept;
+
+extern int64_t traceNow() noexcept;
+
+extern int traceThreadId() noexcept;
+
+extern void traceEvent(
+    const char * name,
+    int64_t begin,
+    int64_t end,
+    int tid,
+    int frame,
+    int tile
+) noexcept;
+
+struct DedupCache;
+
+extern DedupCache * dedupCreate(int capacity, float threshold) noexcept;
+
+extern void dedupFree(DedupCache * cache, const VSAPI * vsapi) noexcept;
+
+extern const VSFrameRef * dedupGetFrame(
+    DedupCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+struct ResultCache;
+
+extern ResultCache * resultCacheCreate(
+    const std::string & cache_dir,
+    const std::string & key,
+    uint64_t max_size
+) noexcept;
+
+extern void resultCacheFree(ResultCache * cache) noexcept;
+
+extern const VSFrameRef * resultCacheGetFrame(
+    ResultCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    const VSVideoInfo * vi,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+struct FlatTiles;
+
+extern FlatTiles * flatTilesCreate(float tolerance) noexcept;
+
+extern void flatTilesFree(FlatTiles * flat_tiles) noexcept;
+
+extern std::optional<std::vector<float>> getFlatColor(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int x,
+    int y,
+    int width,
+    int height
+) noexcept;
+
+extern std::array<int, 4> getActiveArea(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int width,
+    int height
+) noexcept;
+
+extern std::array<int, 4> getCropArea(
+    const std::array<int, 4> & active_area,
+    int width,
+    int height,
+    int tile_w,
+    int tile_h,
+    int overlap_w,
+    int overlap_h
+) noexcept;
+
+extern std::shared_ptr<const std::vector<uint8_t>> findFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color
+) noexcept;
+
+extern void storeFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color,
+    std::vector<uint8_t> response
+) noexcept;
+
+extern void fillOutsideArea(
+    const std::vector<uint8_t *> & planes,
+    int stride,
+    int width,
+    int height,
+    const std::array<int, 4> & area,
+    const std::vector<uint8_t> & response,
+    int tile_w,
+    int tile_h
+) noexcept;
+
 
 #ifdef ENABLE_COREML
 extern "C" OrtStatusPtr OrtSessionOptionsAppendExecutionProvider_CoreML(OrtSessionOptions *so, int flags);
@@ -74,8 +229,49 @@ using namespace std::string_literals;
 static const VSPlugin * myself = nullptr;
 static const OrtApi * ortapi = nullptr;
 static std::atomic<int64_t> logger_id = 0;
+
+// onnxruntime keeps a single environment per process, created by the first
+// filter instance and released with the last one, which has global thread
+// pools only if the instance creating it set "share_session"
+static std::mutex environment_lock;
+static int environment_users = 0;
+static std::optional<std::array<int, 2>> global_num_threads; // intra-op and inter-op, if created
 static std::mutex capture_lock;
 
+// sessions shared by streams and filter instances, keyed by the model and the options
+//
+// an entry is added by the first filter instance before it builds the session,
+// so that the instances created concurrently wait for that build
+static std::mutex session_registry_lock;
+static std::unordered_map<std::string, std::shared_future<std::weak_ptr<OrtSession>>> session_registry;
+
+// entry of the session registry being built by a filter instance, which
+// is removed and resolved to an empty session if the build fails
+struct SessionReservation {
+    std::string key;
+    std::promise<std::weak_ptr<OrtSession>> promise;
+    bool fulfilled {};
+
+    void fulfill(const std::shared_ptr<OrtSession> & session) {
+        promise.set_value(session);
+        fulfilled = true;
+    }
+
+    ~SessionReservation() {
+        if (!fulfilled) {
+            {
+                std::lock_guard<std::mutex> lock(session_registry_lock);
+                session_registry.erase(key);
+            }
+            promise.set_value({});
+        }
+    }
+};
+
+static bool isReady(const std::shared_future<std::weak_ptr<OrtSession>> & future) {
+    return future.wait_for(std::chrono::seconds::zero()) == std::future_status::ready;
+}
+
 
 // rename GridSample to com.microsoft::GridSample
 // onnxruntime has support for CUDA-accelerated GridSample only in its own opset domain
@@ -212,7 +408,8 @@ static std::optional<std::string> checkNodes(
 [[nodiscard]]
 static std::optional<std::string> checkIOInfo(
     const OrtTypeInfo * info,
-    bool is_output
+    bool is_output,
+    int64_t batch_size
 ) noexcept {
 
     const auto set_error = [](const std::string & error_message) {
@@ -241,8 +438,8 @@ static std::optional<std::string> checkIOInfo(
     }
 
     auto shape = std::get<std::array<int64_t, 4>>(maybe_shape);
-    if (shape[0] != 1) {
-        return set_error("batch size of network must be 1");
+    if (shape[0] != batch_size) {
+        return set_error("batch size of network must be " + std::to_string(batch_size));
     }
 
     if (is_output) {
@@ -258,7 +455,8 @@ static std::optional<std::string> checkIOInfo(
 
 [[nodiscard]]
 static std::optional<std::string> checkSession(
-    const OrtSession * session
+    const OrtSession * session,
+    int64_t batch_size
 ) noexcept {
 
     const auto set_error = [](const std::string & error_message) {
@@ -275,7 +473,7 @@ static std::optional<std::string> checkSession(
     OrtTypeInfo * input_type_info;
     checkError(ortapi->SessionGetInputTypeInfo(session, 0, &input_type_info));
 
-    if (auto err = checkIOInfo(input_type_info, false); err.has_value()) {
+    if (auto err = checkIOInfo(input_type_info, false, batch_size); err.has_value()) {
         return set_error(err.value());
     }
 
@@ -291,7 +489,7 @@ static std::optional<std::string> checkSession(
     OrtTypeInfo * output_type_info;
     checkError(ortapi->SessionGetOutputTypeInfo(session, 0, &output_type_info));
 
-    if (auto err = checkIOInfo(output_type_info, true); err.has_value()) {
+    if (auto err = checkIOInfo(output_type_info, true, batch_size); err.has_value()) {
         return set_error(err.value());
     }
 
@@ -355,6 +553,87 @@ static void setDimensions(
     }
 }
 
+// start positions and sizes of the tiles covering an axis
+//
+// the last tile is moved back to end at the border of the frame, or with
+// a positive "multiple", shrunk to the smallest multiple of it that covers
+// the remaining pixels, for networks accepting variable input shapes
+static std::vector<std::array<int, 2>> getTileSpans(
+    int size,
+    int tile,
+    int step,
+    int multiple
+) noexcept {
+
+    std::vector<std::array<int, 2>> spans;
+
+    int pos = 0;
+    while (pos + tile < size) {
+        spans.push_back({ pos, tile });
+        pos += step;
+    }
+
+    int extent = tile;
+    if (multiple > 0) {
+        extent = std::min(tile, (size - pos + multiple - 1) / multiple * multiple);
+    }
+    spans.push_back({ size - extent, extent });
+
+    return spans;
+}
+
+// number of output pixels cropped at the start and at the end of the tiles
+//
+// the end of a tile is cropped where the next tile starts so that
+// tiles processed concurrently write to disjoint regions of the frame
+static std::vector<std::array<int, 2>> getTileCrops(
+    const std::vector<std::array<int, 2>> & spans,
+    int overlap,
+    int scale
+) noexcept {
+
+    std::vector<std::array<int, 2>> crops;
+    crops.reserve(std::size(spans));
+
+    for (size_t i = 0; i < std::size(spans); ++i) {
+        const auto [pos, extent] = spans[i];
+
+        int crop_start = (i == 0) ? 0 : overlap;
+
+        int crop_end = 0;
+        if (i + 1 < std::size(spans)) {
+            int next_pos = spans[i + 1][0];
+            crop_end = std::max(overlap, scale * (pos + extent - next_pos) - overlap);
+        }
+
+        crops.push_back({ crop_start, crop_end });
+    }
+
+    return crops;
+}
+
+// whether the planes are laid out back to back without padding,
+// i.e. as the nchw tensor of a single image
+static bool isContiguous(
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int64_t width_bytes,
+    int64_t height
+) noexcept {
+
+    if (stride != width_bytes) {
+        return false;
+    }
+
+    for (size_t i = 1; i < std::size(planes); ++i) {
+        if (planes[i] != planes[i - 1] + stride * height) {
+            return false;
+        }
+    }
+
+    return true;
+}
+
 struct TicketSemaphore {
     std::atomic<intptr_t> ticket {};
     std::atomic<intptr_t> current {};
@@ -374,6 +653,17 @@ struct TicketSemaphore {
         }
     }
 
+    // acquires a slot only if one is available without waiting
+    bool try_acquire() noexcept {
+        intptr_t tk { ticket.load(std::memory_order_acquire) };
+        while (tk <= current.load(std::memory_order_acquire)) {
+            if (ticket.compare_exchange_weak(tk, tk + 1, std::memory_order_acquire)) {
+                return true;
+            }
+        }
+        return false;
+    }
+
     void release() noexcept {
         current.fetch_add(1, std::memory_order_release);
 #if __cpp_lib_atomic_wait
@@ -382,6 +672,70 @@ struct TicketSemaphore {
     }
 };
 
+// per-frame timings in nanoseconds, summed over the streams working on the frame
+struct FrameStats {
+    std::atomic<int64_t> wait {};
+    std::atomic<int64_t> copy {};
+    std::atomic<int64_t> inference {};
+};
+
+// adds its lifetime to "total"
+struct ScopedTimer {
+    std::atomic<int64_t> & total;
+    std::chrono::steady_clock::time_point start { std::chrono::steady_clock::now() };
+
+    ~ScopedTimer() {
+        auto elapsed = std::chrono::steady_clock::now() - start;
+        total.fetch_add(
+            std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed).count(),
+            std::memory_order_relaxed
+        );
+    }
+};
+
+template <typename F>
+static inline auto timed(std::atomic<int64_t> & total, F && f) {
+    ScopedTimer timer { total };
+    return f();
+}
+
+static void setFrameStats(
+    VSMap * props,
+    const FrameStats & stats,
+    int num_tiles,
+    int stream,
+    const VSAPI * vsapi
+) noexcept {
+
+    const auto seconds = [](const std::atomic<int64_t> & time) {
+        return static_cast<double>(time.load(std::memory_order_relaxed)) / 1e9;
+    };
+
+    vsapi->propSetFloat(props, "MLRTWaitTime", seconds(stats.wait), paReplace);
+    vsapi->propSetFloat(props, "MLRTCopyTime", seconds(stats.copy), paReplace);
+    vsapi->propSetFloat(props, "MLRTInferenceTime", seconds(stats.inference), paReplace);
+    vsapi->propSetInt(props, "MLRTTiles", num_tiles, paReplace);
+    vsapi->propSetInt(props, "MLRTStream", stream, paReplace);
+}
+
+// records its lifetime as an event of the timeline if tracing is enabled
+struct TraceScope {
+    const char * name;
+    int tid;
+    int frame;
+    int tile = -1;
+    int64_t begin { traceEnabled() ? traceNow() : -1 };
+
+    ~TraceScope() {
+        if (begin >= 0) {
+            traceEvent(name, begin, traceNow(), tid, frame, tile);
+        }
+    }
+};
+
+// offset of the track of the asynchronous inference of a stream
+static constexpr int trace_async_offset = 1000;
+
 enum class Backend {
     CPU = 0,
     CUDA = 1,
@@ -396,13 +750,93 @@ struct CUDA_Resource_t {
 };
 #endif // ENABLE_CUDA
 
+// io tensors of a stream for the tiles of an edge shape
+struct EdgeBinding {
+    OrtValue * input_tensor;
+    OrtValue * output_tensor;
+    OrtIoBinding * binding;
+};
+
+// persistent thread of a stream that runs one job at a time, such as the
+// session in the pipelined tile loop, so that the stream packs and unpacks
+// tiles while the session runs, or the batches of a frame of another stream
+struct PipelineWorker {
+    std::mutex lock;
+    std::condition_variable cv;
+    std::function<std::optional<std::string> ()> job; // set until the thread takes it
+    std::optional<std::string> result;
+    bool done {}; // the result of the last job is ready
+    bool stop {};
+    std::thread thread { [this] { run(); } }; // started after the other members
+
+    ~PipelineWorker() {
+        {
+            std::lock_guard _ { lock };
+            stop = true;
+        }
+        cv.notify_all();
+        thread.join();
+    }
+
+    void submit(std::function<std::optional<std::string> ()> next_job) {
+        {
+            std::lock_guard _ { lock };
+            job = std::move(next_job);
+            done = false;
+        }
+        cv.notify_all();
+    }
+
+    std::optional<std::string> wait() {
+        std::unique_lock l { lock };
+        cv.wait(l, [this] { return done; });
+        done = false;
+        return std::move(result);
+    }
+
+private:
+    void run() {
+        std::unique_lock l { lock };
+        while (true) {
+            cv.wait(l, [this] { return stop || job; });
+            if (stop) {
+                return ;
+            }
+
+            auto current_job = std::move(job);
+            job = nullptr;
+
+            l.unlock();
+            auto current_result = current_job();
+            l.lock();
+
+            result = std::move(current_result);
+            done = true;
+            cv.notify_all();
+        }
+    }
+};
+
 // per-stream context
 struct Resource {
     OrtSession * session;
+    std::shared_ptr<OrtSession> shared_session; // set if the session is shared
     OrtValue * input_tensor;
     OrtValue * output_tensor;
     OrtIoBinding * binding;
 
+    // second set of io tensors, used by the pipelined tile loop
+    OrtValue * pipeline_input_tensor;
+    OrtValue * pipeline_output_tensor;
+    OrtIoBinding * pipeline_binding;
+    std::shared_ptr<PipelineWorker> pipeline_worker;
+
+    // runs batches of the frames of other streams on this stream
+    std::shared_ptr<PipelineWorker> helper_worker;
+
+    // indexed as vsOrtData::edge_shapes
+    std::vector<EdgeBinding> edge_bindings;
+
 #ifdef ENABLE_CUDA
     cudaStream_t stream;
     CUDA_Resource_t input;
@@ -411,17 +845,82 @@ struct Resource {
 #endif // ENABLE_CUDA
 };
 
+// frames collected from concurrent requests into a single batched run
+struct TemporalBatch {
+    struct Member {
+        std::vector<const uint8_t *> src_ptrs;
+        int src_stride;
+        std::array<uint8_t *, 3> dst_ptrs;
+        int dst_stride;
+    };
+
+    size_t size; // frames of the group, the batch runs once they are all members
+    std::vector<Member> members;
+    std::condition_variable cv;
+    bool done {};
+    std::optional<std::string> error;
+
+    // shared by the members
+    FrameStats stats;
+    std::chrono::steady_clock::time_point run_start;
+    int stream;
+};
+
+// shape of the last column or row of tiles that differs from the tile size,
+// run by a session specialized for it and shared by all of the streams
+struct EdgeShape {
+    int tile_w;
+    int tile_h;
+    size_t batch_size;
+    OrtSession * session;
+};
+
+// tiles of a frame sharing a shape, as indices into the column and row spans
+struct TileGroup {
+    std::vector<std::array<size_t, 2>> tiles;
+    int64_t tile_w;
+    int64_t tile_h;
+    size_t batch_size;
+};
+
 struct vsOrtData {
     std::vector<VSNodeRef *> nodes;
     std::unique_ptr<VSVideoInfo> out_vi;
 
     int overlap_w, overlap_h;
 
+    int tile_multiple; // positive if edge tiles are shrunk
+    std::vector<EdgeShape> edge_shapes;
+
+    bool pipeline;
+
+    bool stats; // attaches FrameStats as frame properties
+
+    DedupCache * dedup_cache; // reuses the outputs of recent inputs if set
+    ResultCache * result_cache; // stores the outputs on disk if set
+
+    // tiles of a single color take the output of a constant tile and
+    // the borders of that color are cropped, if set
+    FlatTiles * flat_tiles;
+    bool skip_flat_tiles;
+    bool auto_crop;
+
+    bool temporal_batching;
+    size_t batch_size;
+    std::chrono::milliseconds max_batch_wait;
+    std::mutex batch_lock;
+    // batches accepting new members by group of consecutive frames,
+    // i.e. by n / batch_size
+    std::unordered_map<int, std::shared_ptr<TemporalBatch>> open_batches;
+
     OrtEnv * environment;
     Backend backend;
 
     int device_id;
 
+    std::string input_name;
+    std::string output_name;
+
     std::vector<Resource> resources;
     std::vector<int> tickets;
     std::mutex ticket_lock;
@@ -437,6 +936,18 @@ struct vsOrtData {
         }
     }
 
+    std::optional<int> try_acquire() noexcept {
+        if (!semaphore.try_acquire()) {
+            return {};
+        }
+        {
+            std::lock_guard<std::mutex> lock(ticket_lock);
+            int ticket = tickets.back();
+            tickets.pop_back();
+            return ticket;
+        }
+    }
+
     void release(int ticket) noexcept {
         {
             std::lock_guard<std::mutex> lock(ticket_lock);
@@ -444,9 +955,174 @@ struct vsOrtData {
         }
         semaphore.release();
     }
+
+    int streamIndex(const Resource & resource) const noexcept {
+        return static_cast<int>(&resource - std::data(resources));
+    }
 };
 
 
+[[nodiscard]]
+static std::optional<std::string> runSession(
+    Resource & resource,
+    OrtIoBinding * binding,
+    [[maybe_unused]] Backend backend
+) noexcept {
+
+    const auto set_error = [](const std::string & error_message) {
+        return error_message;
+    };
+
+#ifdef ENABLE_CUDA
+    if (backend == Backend::CUDA) {
+        checkCUDAError(cudaMemcpyAsync(
+            resource.input.d_data,
+            resource.input.h_data,
+            resource.input.size,
+            cudaMemcpyHostToDevice,
+            resource.stream
+        ));
+
+        // OrtCUDAProviderOptionsV2 disallows using custom user stream
+        // and the inference is executed on a private non-blocking stream
+        checkCUDAError(cudaStreamSynchronize(resource.stream));
+    }
+#endif // ENABLE_CUDA
+
+#ifdef ENABLE_CUDA
+    if (resource.require_replay) [[unlikely]] {
+        resource.require_replay = false;
+
+        // runs it under a global lock
+        // onnxruntime uses global-mode stream capture on a private stream
+        // this lock prevents concurrent capture sequences in other threads
+        //
+        // note that this applies only to stream capture from the ort library
+        // this fails when another plugin also uses global-mode stream capture
+        std::lock_guard _ { capture_lock };
+        checkError(ortapi->RunWithBinding(resource.session, nullptr, binding));
+
+        // onnxruntime replays the graph itself in CUDAExecutionProvider::OnRunEnd
+    } else {
+#else // ENABLE_CUDA
+    {
+#endif // ENABLE_CUDA
+        checkError(ortapi->RunWithBinding(resource.session, nullptr, binding));
+    }
+
+#ifdef ENABLE_CUDA
+    if (backend == Backend::CUDA) {
+        checkCUDAError(cudaMemcpyAsync(
+            resource.output.h_data,
+            resource.output.d_data,
+            resource.output.size,
+            cudaMemcpyDeviceToHost,
+            resource.stream
+        ));
+        checkCUDAError(cudaStreamSynchronize(resource.stream));
+    }
+#endif // ENABLE_CUDA
+
+    return {};
+}
+
+
+// processes the frames of a closed temporal batch, one frame per batch entry
+[[nodiscard]]
+static std::optional<std::string> runTemporalBatch(
+    vsOrtData * d,
+    Resource & resource,
+    const std::vector<TemporalBatch::Member> & members,
+    FrameStats & stats,
+    int n
+) noexcept {
+
+    const auto set_error = [](const std::string & error_message) {
+        return error_message;
+    };
+
+#ifdef ENABLE_CUDA
+    if (d->backend == Backend::CUDA) {
+        checkCUDAError(cudaSetDevice(d->device_id));
+    }
+#endif // ENABLE_CUDA
+
+    auto src_tile_shape = std::get<std::array<int64_t, 4>>(getShape(resource.session, true));
+    auto src_tile_w_bytes = src_tile_shape[3] * static_cast<int64_t>(sizeof(float));
+    auto src_tile_bytes = src_tile_shape[2] * src_tile_w_bytes;
+
+    auto dst_tile_shape = std::get<std::array<int64_t, 4>>(getShape(resource.session, false));
+    auto dst_tile_w_bytes = dst_tile_shape[3] * static_cast<int64_t>(sizeof(float));
+    auto dst_tile_bytes = dst_tile_shape[2] * dst_tile_w_bytes;
+    auto dst_planes = dst_tile_shape[1];
+
+    const auto stream = d->streamIndex(resource);
+
+    {
+        ScopedTimer timer { stats.copy };
+        TraceScope trace { "pack", stream, n };
+
+        uint8_t * input_buffer;
+        checkError(ortapi->GetTensorMutableData(
+            resource.input_tensor,
+            reinterpret_cast<void **>(&input_buffer)
+        ));
+#ifdef ENABLE_CUDA
+        if (d->backend == Backend::CUDA) {
+            input_buffer = resource.input.h_data;
+        }
+#endif // ENABLE_CUDA
+
+        for (const auto & member : members) {
+            for (const auto & src_ptr : member.src_ptrs) {
+                vs_bitblt(
+                    input_buffer, src_tile_w_bytes,
+                    src_ptr, member.src_stride,
+                    src_tile_w_bytes, src_tile_shape[2]
+                );
+                input_buffer += src_tile_bytes;
+            }
+        }
+    }
+
+    if (auto err = timed(stats.inference, [&] {
+        TraceScope trace { "infer", stream, n };
+        return runSession(resource, resource.binding, d->backend);
+    }); err.has_value()) {
+        return err;
+    }
+
+    {
+        ScopedTimer timer { stats.copy };
+        TraceScope trace { "unpack", stream, n };
+
+        uint8_t * output_buffer;
+        checkError(ortapi->GetTensorMutableData(
+            resource.output_tensor,
+            reinterpret_cast<void **>(&output_buffer)
+        ));
+#ifdef ENABLE_CUDA
+        if (d->backend == Backend::CUDA) {
+            output_buffer = resource.output.h_data;
+        }
+#endif // ENABLE_CUDA
+
+        for (const auto & member : members) {
+            for (int plane = 0; plane < dst_planes; ++plane) {
+                vs_bitblt(
+                    member.dst_ptrs[plane], member.dst_stride,
+                    output_buffer, dst_tile_w_bytes,
+                    dst_tile_w_bytes, dst_tile_shape[2]
+                );
+                output_buffer += dst_tile_bytes;
+            }
+        }
+    }
+
+    return {};
+}
+
+
 static void VS_CC vsOrtInit(
     VSMap *in,
     VSMap *out,
@@ -502,10 +1178,126 @@ static const VSFrameRef *VS_CC vsOrtGetFrame(
         auto dst_stride = vsapi->getStride(dst_frame, 0);
         auto dst_bytes = vsapi->getFrameFormat(dst_frame)->bytesPerSample;
 
-        auto ticket = d->acquire();
-        Resource & resource = d->resources[ticket];
+        if (d->temporal_batching) {
+            TemporalBatch::Member member {};
+            for (unsigned i = 0; i < std::size(d->nodes); ++i) {
+                for (int j = 0; j < in_vis[i]->format->numPlanes; ++j) {
+                    member.src_ptrs.emplace_back(vsapi->getReadPtr(src_frames[i], j));
+                }
+            }
+            member.src_stride = src_stride;
+            for (int i = 0; i < d->out_vi->format->numPlanes; ++i) {
+                member.dst_ptrs[i] = vsapi->getWritePtr(dst_frame, i);
+            }
+            member.dst_stride = dst_stride;
+
+            const auto enqueue_time = std::chrono::steady_clock::now();
+
+            std::shared_ptr<TemporalBatch> batch;
+            bool is_leader;
+            {
+                TraceScope trace { "collect", traceThreadId(), n };
+                std::unique_lock lock { d->batch_lock };
+
+                // a batch holds the frames of its group only, so that
+                // e.g. the timesteps of a frame pair are run together
+                const int group = n / static_cast<int>(d->batch_size);
+
+                auto & open_batch = d->open_batches[group];
+                is_leader = !open_batch;
+                if (is_leader) {
+                    open_batch = std::make_shared<TemporalBatch>();
+
+                    // the last group of the clip may be smaller
+                    const auto first = static_cast<size_t>(group) * d->batch_size;
+                    open_batch->size = std::min(d->batch_size, static_cast<size_t>(d->out_vi->numFrames) - first);
+                }
+                batch = open_batch;
+
+                batch->members.emplace_back(std::move(member));
+                if (std::size(batch->members) == batch->size) {
+                    d->open_batches.erase(group);
+                    batch->cv.notify_all();
+                }
+
+                if (is_leader) {
+                    // the first frame of a batch waits for the other frames
+                    // of its group until the batch is full or the wait times out
+                    batch->cv.wait_for(lock, d->max_batch_wait, [&] {
+                        return std::size(batch->members) == batch->size;
+                    });
+
+                    auto iter = d->open_batches.find(group);
+                    if (iter != std::end(d->open_batches) && iter->second == batch) {
+                        d->open_batches.erase(iter);
+                    }
+                } else {
+                    batch->cv.wait(lock, [&] { return batch->done; });
+                }
+            }
+
+            if (is_leader) {
+                int ticket;
+                {
+                    TraceScope trace { "wait", traceThreadId(), n };
+                    ticket = d->acquire();
+                }
+                batch->run_start = std::chrono::steady_clock::now();
+                batch->stream = ticket;
+                std::optional<std::string> err;
+                {
+                    TraceScope trace { "frame", traceThreadId(), n };
+                    err = runTemporalBatch(d, d->resources[ticket], batch->members, batch->stats, n);
+                }
+                d->release(ticket);
+
+                {
+                    std::lock_guard lock { d->batch_lock };
+                    batch->error = std::move(err);
+                    batch->done = true;
+                }
+                batch->cv.notify_all();
+            }
+
+            for (const auto & frame : src_frames) {
+                vsapi->freeFrame(frame);
+            }
+
+            if (batch->error.has_value()) {
+                vsapi->setFilterError(
+                    (__func__ + ": "s + batch->error.value()).c_str(),
+                    frameCtx
+                );
+                vsapi->freeFrame(dst_frame);
+                return nullptr;
+            }
+
+            if (d->stats) {
+                // the wait includes the time to collect the batch
+                FrameStats stats;
+                stats.wait = std::chrono::duration_cast<std::chrono::nanoseconds>(
+                    batch->run_start - enqueue_time
+                ).count();
+                stats.copy = batch->stats.copy.load();
+                stats.inference = batch->stats.inference.load();
+                setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, 1, batch->stream, vsapi);
+            }
+
+            return dst_frame;
+        }
+
+        FrameStats stats;
+
+        auto ticket = timed(stats.wait, [&] {
+            TraceScope trace { "wait", traceThreadId(), n };
+            return d->acquire();
+        });
+        Resource & resource = d->resources[ticket];
+
+        TraceScope frame_trace { "frame", traceThreadId(), n };
 
         auto src_tile_shape = std::get<std::array<int64_t, 4>>(getShape(resource.session, true));
+        auto batch_size = static_cast<size_t>(src_tile_shape[0]);
         auto src_tile_h = src_tile_shape[2];
         auto src_tile_w = src_tile_shape[3];
         auto src_tile_w_bytes = src_tile_w * src_bytes;
@@ -553,31 +1345,230 @@ static const VSFrameRef *VS_CC vsOrtGetFrame(
             return nullptr;
         };
 
-#ifdef ENABLE_CUDA
-        if (d->backend == Backend::CUDA) {
-            checkCUDAError(cudaSetDevice(d->device_id));
+        // the tiles cover the active area of the frame with a margin of the
+        // overlap, whose output is dropped, and the borders of the active
+        // area are filled with the output of a constant tile of their color
+        std::array<int, 4> area { 0, 0, src_width, src_height };
+        std::array<int, 4> kept_area = area;
+        if (d->auto_crop) {
+            kept_area = getActiveArea(d->flat_tiles, src_ptrs, src_stride, src_width, src_height);
+            area = getCropArea(
+                kept_area, src_width, src_height,
+                static_cast<int>(src_tile_w), static_cast<int>(src_tile_h),
+                d->overlap_w, d->overlap_h
+            );
+        }
+        const bool cropped = area[2] != src_width || area[3] != src_height;
+        if (!cropped) {
+            kept_area = area;
+        }
+
+        auto x_spans = getTileSpans(
+            area[2], static_cast<int>(src_tile_w),
+            static_cast<int>(step_w), d->tile_multiple
+        );
+        for (auto & span : x_spans) {
+            span[0] += area[0];
+        }
+        auto y_spans = getTileSpans(
+            area[3], static_cast<int>(src_tile_h),
+            static_cast<int>(step_h), d->tile_multiple
+        );
+        for (auto & span : y_spans) {
+            span[0] += area[1];
+        }
+        auto x_crops = getTileCrops(x_spans, d->overlap_w, static_cast<int>(w_scale));
+        auto y_crops = getTileCrops(y_spans, d->overlap_h, static_cast<int>(h_scale));
+        if (cropped) {
+            x_crops.front()[0] += static_cast<int>(w_scale) * (kept_area[0] - area[0]);
+            x_crops.back()[1] += static_cast<int>(w_scale) * (area[0] + area[2] - kept_area[0] - kept_area[2]);
+            y_crops.front()[0] += static_cast<int>(h_scale) * (kept_area[1] - area[1]);
+            y_crops.back()[1] += static_cast<int>(h_scale) * (area[1] + area[3] - kept_area[1] - kept_area[3]);
+        }
+
+        // the tiles of the tile size come first, followed by a group per edge shape
+        std::vector<TileGroup> tile_groups(1 + std::size(d->edge_shapes));
+        tile_groups[0].tile_w = src_tile_w;
+        tile_groups[0].tile_h = src_tile_h;
+        tile_groups[0].batch_size = batch_size;
+        for (size_t i = 0; i < std::size(d->edge_shapes); ++i) {
+            tile_groups[i + 1].tile_w = d->edge_shapes[i].tile_w;
+            tile_groups[i + 1].tile_h = d->edge_shapes[i].tile_h;
+            tile_groups[i + 1].batch_size = d->edge_shapes[i].batch_size;
+        }
+        for (size_t iy = 0; iy < std::size(y_spans); ++iy) {
+            for (size_t ix = 0; ix < std::size(x_spans); ++ix) {
+                for (auto & group : tile_groups) {
+                    if (group.tile_w == x_spans[ix][1] && group.tile_h == y_spans[iy][1]) {
+                        group.tiles.push_back({ ix, iy });
+                        break;
+                    }
+                }
+            }
+        }
+
+        // tiles of the tile size whose samples share a color are not run
+        std::vector<std::pair<std::array<size_t, 2>, std::vector<float>>> flat_tiles;
+        if (d->skip_flat_tiles) {
+            auto & tiles = tile_groups[0].tiles;
+            auto kept = std::begin(tiles);
+            for (const auto & tile : tiles) {
+                auto color = getFlatColor(
+                    d->flat_tiles, src_ptrs, src_stride,
+                    x_spans[tile[0]][0], y_spans[tile[1]][0],
+                    static_cast<int>(src_tile_w), static_cast<int>(src_tile_h)
+                );
+                if (color.has_value()) {
+                    flat_tiles.emplace_back(tile, std::move(color.value()));
+                } else {
+                    *kept++ = tile;
+                }
+            }
+            tiles.erase(kept, std::end(tiles));
         }
+        const auto & tile_positions = tile_groups[0].tiles;
+
+        // runs a constant tile of a color on the stream of this frame,
+        // the output is kept for the later tiles and borders of that color
+        const auto get_flat_response = [&](
+            const std::vector<float> & color
+        ) -> std::variant<std::string, std::shared_ptr<const std::vector<uint8_t>>> {
+
+            const auto set_error = [](const std::string & error_message) {
+                return error_message;
+            };
+
+            if (auto response = findFlatResponse(d->flat_tiles, color); response) {
+                return response;
+            }
+
+            ScopedTimer timer { stats.inference };
+            TraceScope trace { "flat", ticket, n };
+
+            uint8_t * input_buffer;
+            checkError(ortapi->GetTensorMutableData(
+                resource.input_tensor,
+                reinterpret_cast<void **>(&input_buffer)
+            ));
+#ifdef ENABLE_CUDA
+            if (d->backend == Backend::CUDA) {
+                input_buffer = resource.input.h_data;
+            }
 #endif // ENABLE_CUDA
 
-        int y = 0;
-        while (true) {
-            int y_crop_start = (y == 0) ? 0 : d->overlap_h;
-            int y_crop_end = (y == src_height - src_tile_h) ? 0 : d->overlap_h;
+            for (const auto & value : color) {
+                std::fill_n(reinterpret_cast<float *>(input_buffer), src_tile_h * src_tile_w, value);
+                input_buffer += src_tile_bytes;
+            }
 
-            int x = 0;
-            while (true) {
-                int x_crop_start = (x == 0) ? 0 : d->overlap_w;
-                int x_crop_end = (x == src_width - src_tile_w) ? 0 : d->overlap_w;
+            if (auto err = runSession(resource, resource.binding, d->backend); err.has_value()) {
+                return err.value();
+            }
+
+            uint8_t * output_buffer;
+            checkError(ortapi->GetTensorMutableData(
+                resource.output_tensor,
+                reinterpret_cast<void **>(&output_buffer)
+            ));
+#ifdef ENABLE_CUDA
+            if (d->backend == Backend::CUDA) {
+                output_buffer = resource.output.h_data;
+            }
+#endif // ENABLE_CUDA
+
+            std::vector<uint8_t> response(output_buffer, output_buffer + dst_planes * dst_tile_bytes);
+            storeFlatResponse(d->flat_tiles, color, response);
+
+            return std::make_shared<const std::vector<uint8_t>>(std::move(response));
+        };
 
+        if (cropped) {
+            auto response = get_flat_response(getFlatColor(d->flat_tiles, src_ptrs, src_stride, 0, 0, 1, 1).value());
+            if (std::holds_alternative<std::string>(response)) {
+                return set_error(std::get<std::string>(response));
+            }
+
+            ScopedTimer timer { stats.copy };
+            fillOutsideArea(
+                std::vector<uint8_t *>(dst_ptrs, dst_ptrs + dst_planes), dst_stride,
+                d->out_vi->width, d->out_vi->height,
                 {
-                    uint8_t * input_buffer;
+                    static_cast<int>(w_scale) * kept_area[0], static_cast<int>(h_scale) * kept_area[1],
+                    static_cast<int>(w_scale) * kept_area[2], static_cast<int>(h_scale) * kept_area[3]
+                },
+                *std::get<std::shared_ptr<const std::vector<uint8_t>>>(response),
+                static_cast<int>(dst_tile_w), static_cast<int>(dst_tile_h)
+            );
+        }
+
+        for (const auto & [tile, color] : flat_tiles) {
+            auto response = get_flat_response(color);
+            if (std::holds_alternative<std::string>(response)) {
+                return set_error(std::get<std::string>(response));
+            }
+
+            ScopedTimer timer { stats.copy };
+
+            const auto [ix, iy] = tile;
+            const auto x = x_spans[ix][0];
+            const auto y = y_spans[iy][0];
+            const auto [y_crop_start, y_crop_end] = y_crops[iy];
+            const auto [x_crop_start, x_crop_end] = x_crops[ix];
+
+            const uint8_t * response_ptr = std::data(*std::get<std::shared_ptr<const std::vector<uint8_t>>>(response));
+            for (int plane = 0; plane < dst_planes; ++plane) {
+                auto dst_ptr = (dst_ptrs[plane] +
+                    h_scale * y * dst_stride + w_scale * x * dst_bytes
+                );
+
+                vs_bitblt(
+                    dst_ptr + (y_crop_start * dst_stride + x_crop_start * dst_bytes),
+                    dst_stride,
+                    response_ptr + (y_crop_start * dst_tile_w_bytes + x_crop_start * dst_bytes),
+                    dst_tile_w_bytes,
+                    dst_tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
+                    dst_tile_h - (y_crop_start + y_crop_end)
+                );
+
+                response_ptr += dst_tile_bytes;
+            }
+        }
+
+        const int num_tiles = static_cast<int>(std::size(x_spans) * std::size(y_spans) - std::size(flat_tiles));
+
+        // each run processes up to "batch_size" tiles packed along the batch dimension
+        const auto pack_batch = [&](
+            Resource & resource,
+            OrtValue * input_tensor,
+            const TileGroup & group,
+            size_t batch_start
+        ) -> std::optional<std::string> {
+
+            const auto set_error = [](const std::string & error_message) {
+                return error_message;
+            };
+
+            const size_t batch_end = std::min(batch_start + group.batch_size, std::size(group.tiles));
+
+            const auto tile_w_bytes = group.tile_w * src_bytes;
+            const auto tile_bytes = group.tile_h * tile_w_bytes;
+
+            {
+                ScopedTimer timer { stats.copy };
+                TraceScope trace { "pack", d->streamIndex(resource), n, static_cast<int>(batch_start) };
+
+                uint8_t * input_buffer;
 #ifdef ENABLE_CUDA
-                    uint8_t * h_input_buffer = resource.input.h_data;
+                uint8_t * h_input_buffer = resource.input.h_data;
 #endif // ENABLE_CUDA
-                    checkError(ortapi->GetTensorMutableData(
-                        resource.input_tensor,
-                        reinterpret_cast<void **>(&input_buffer)
-                    ));
+                checkError(ortapi->GetTensorMutableData(
+                    input_tensor,
+                    reinterpret_cast<void **>(&input_buffer)
+                ));
+
+                for (size_t i = batch_start; i < batch_end; ++i) {
+                    const auto x = x_spans[group.tiles[i][0]][0];
+                    const auto y = y_spans[group.tiles[i][1]][0];
 
                     for (const auto & _src_ptr : src_ptrs) {
                         const uint8_t * src_ptr { _src_ptr +
@@ -587,83 +1578,67 @@ static const VSFrameRef *VS_CC vsOrtGetFrame(
 #ifdef ENABLE_CUDA
                         if (d->backend == Backend::CUDA) {
                             vs_bitblt(
-                                h_input_buffer, src_tile_w_bytes,
+                                h_input_buffer, tile_w_bytes,
                                 src_ptr, src_stride,
-                                src_tile_w_bytes, src_tile_h
+                                tile_w_bytes, group.tile_h
                             );
-                            h_input_buffer += src_tile_bytes;
+                            h_input_buffer += tile_bytes;
                         } else
 #endif // ENABLE_CUDA
                         {
                             vs_bitblt(
-                                input_buffer, src_tile_w_bytes,
+                                input_buffer, tile_w_bytes,
                                 src_ptr, src_stride,
-                                src_tile_w_bytes, src_tile_h
+                                tile_w_bytes, group.tile_h
                             );
-                            input_buffer += src_tile_bytes;
+                            input_buffer += tile_bytes;
                         }
                     }
                 }
+            }
 
-#ifdef ENABLE_CUDA
-                if (d->backend == Backend::CUDA) {
-                    checkCUDAError(cudaMemcpyAsync(
-                        resource.input.d_data,
-                        resource.input.h_data,
-                        resource.input.size,
-                        cudaMemcpyHostToDevice,
-                        resource.stream
-                    ));
+            return {};
+        };
 
-                    // OrtCUDAProviderOptionsV2 disallows using custom user stream
-                    // and the inference is executed on a private non-blocking stream
-                    checkCUDAError(cudaStreamSynchronize(resource.stream));
-                }
-#endif // ENABLE_CUDA
+        const auto unpack_batch = [&](
+            Resource & resource,
+            OrtValue * output_tensor,
+            const TileGroup & group,
+            size_t batch_start
+        ) -> std::optional<std::string> {
 
-#ifdef ENABLE_CUDA
-                if (resource.require_replay) [[unlikely]] {
-                    resource.require_replay = false;
+            const auto set_error = [](const std::string & error_message) {
+                return error_message;
+            };
 
-                    // runs it under a global lock
-                    // onnxruntime uses global-mode stream capture on a private stream
-                    // this lock prevents concurrent capture sequences in other threads
-                    //
-                    // note that this applies only to stream capture from the ort library
-                    // this fails when another plugin also uses global-mode stream capture
-                    std::lock_guard _ { capture_lock };
-                    checkError(ortapi->RunWithBinding(resource.session, nullptr, resource.binding));
+            const size_t batch_end = std::min(batch_start + group.batch_size, std::size(group.tiles));
 
-                    // onnxruntime replays the graph itself in CUDAExecutionProvider::OnRunEnd
-                } else {
-#else // ENABLE_CUDA
-                {
-#endif // ENABLE_CUDA
-                    checkError(ortapi->RunWithBinding(resource.session, nullptr, resource.binding));
-                }
+            const auto tile_h = group.tile_h * h_scale;
+            const auto tile_w_bytes = group.tile_w * w_scale * dst_bytes;
+            const auto tile_bytes = tile_h * tile_w_bytes;
 
-#ifdef ENABLE_CUDA
-                if (d->backend == Backend::CUDA) {
-                    checkCUDAError(cudaMemcpyAsync(
-                        resource.output.h_data,
-                        resource.output.d_data,
-                        resource.output.size,
-                        cudaMemcpyDeviceToHost,
-                        resource.stream
-                    ));
-                    checkCUDAError(cudaStreamSynchronize(resource.stream));
-                }
-#endif // ENABLE_CUDA
+            {
+                ScopedTimer timer { stats.copy };
+                TraceScope trace { "unpack", d->streamIndex(resource), n, static_cast<int>(batch_start) };
 
-                {
-                    uint8_t * output_buffer;
+                uint8_t * output_buffer;
 #ifdef ENABLE_CUDA
-                    uint8_t * h_output_buffer = resource.output.h_data;
+                uint8_t * h_output_buffer = resource.output.h_data;
 #endif // ENABLE_CUDA
-                    checkError(ortapi->GetTensorMutableData(
-                        resource.output_tensor,
-                        reinterpret_cast<void **>(&output_buffer)
-                    ));
+                checkError(ortapi->GetTensorMutableData(
+                    output_tensor,
+                    reinterpret_cast<void **>(&output_buffer)
+                ));
+
+                for (size_t i = batch_start; i < batch_end; ++i) {
+                    const auto [ix, iy] = group.tiles[i];
+                    const auto x = x_spans[ix][0];
+                    const auto y = y_spans[iy][0];
+
+                    const auto y_crop_start = y_crops[iy][0];
+                    const auto y_crop_end = y_crops[iy][1];
+                    const auto x_crop_start = x_crops[ix][0];
+                    const auto x_crop_end = x_crops[ix][1];
 
                     for (int plane = 0; plane < dst_planes; ++plane) {
                         auto dst_ptr = (dst_ptrs[plane] +
@@ -675,42 +1650,312 @@ static const VSFrameRef *VS_CC vsOrtGetFrame(
                             vs_bitblt(
                                 dst_ptr + (y_crop_start * dst_stride + x_crop_start * dst_bytes),
                                 dst_stride,
-                                h_output_buffer + (y_crop_start * dst_tile_w_bytes + x_crop_start * dst_bytes),
-                                dst_tile_w_bytes,
-                                dst_tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
-                                dst_tile_h - (y_crop_start + y_crop_end)
+                                h_output_buffer + (y_crop_start * tile_w_bytes + x_crop_start * dst_bytes),
+                                tile_w_bytes,
+                                tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
+                                tile_h - (y_crop_start + y_crop_end)
                             );
 
-                            h_output_buffer += dst_tile_bytes;
+                            h_output_buffer += tile_bytes;
                         } else
 #endif // ENABLE_CUDA
                         {
                             vs_bitblt(
                                 dst_ptr + (y_crop_start * dst_stride + x_crop_start * dst_bytes),
                                 dst_stride,
-                                output_buffer + (y_crop_start * dst_tile_w_bytes + x_crop_start * dst_bytes),
-                                dst_tile_w_bytes,
-                                dst_tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
-                                dst_tile_h - (y_crop_start + y_crop_end)
+                                output_buffer + (y_crop_start * tile_w_bytes + x_crop_start * dst_bytes),
+                                tile_w_bytes,
+                                tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
+                                tile_h - (y_crop_start + y_crop_end)
                             );
 
-                            output_buffer += dst_tile_bytes;
+                            output_buffer += tile_bytes;
                         }
                     }
                 }
+            }
 
-                if (x + src_tile_w == src_width) {
-                    break;
+            return {};
+        };
+
+        // a frame processed in a single tile is bound to the network directly
+        // when its planes are laid out as the tensor, which saves the copies
+        if (std::size(x_spans) * std::size(y_spans) == 1 && num_tiles == 1 && !cropped && d->backend != Backend::CUDA) {
+            const std::vector<const uint8_t *> dst_plane_ptrs(dst_ptrs, dst_ptrs + dst_planes);
+            bool bind_input = isContiguous(src_ptrs, src_stride, src_tile_w_bytes, src_tile_h);
+            bool bind_output = isContiguous(dst_plane_ptrs, dst_stride, dst_tile_w_bytes, dst_tile_h);
+
+            const auto run_bound = [&]() -> std::optional<std::string> {
+                const auto set_error = [](const std::string & error_message) {
+                    return error_message;
+                };
+
+                // the objects created here are released on every return
+                const auto release_memory_info = [](OrtMemoryInfo * value) { ortapi->ReleaseMemoryInfo(value); };
+                const auto release_value = [](OrtValue * value) { ortapi->ReleaseValue(value); };
+                const auto release_binding = [](OrtIoBinding * value) { ortapi->ReleaseIoBinding(value); };
+
+                OrtMemoryInfo * memory_info;
+                checkError(ortapi->CreateMemoryInfo(
+                    "Cpu", OrtDeviceAllocator, /* device_id */ 0,
+                    OrtMemTypeDefault, &memory_info
+                ));
+                std::unique_ptr<OrtMemoryInfo, decltype(release_memory_info)> memory_info_holder {
+                    memory_info, release_memory_info
+                };
+
+                OrtValue * input_tensor = resource.input_tensor;
+                std::unique_ptr<OrtValue, decltype(release_value)> input_holder { nullptr, release_value };
+                if (bind_input) {
+                    checkError(ortapi->CreateTensorWithDataAsOrtValue(
+                        memory_info,
+                        const_cast<uint8_t *>(src_ptrs.front()), std::size(src_ptrs) * src_tile_bytes,
+                        std::data(src_tile_shape), std::size(src_tile_shape),
+                        ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT, &input_tensor
+                    ));
+                    input_holder.reset(input_tensor);
+                } else if (auto err = pack_batch(resource, input_tensor, tile_groups[0], 0); err.has_value()) {
+                    return err;
+                }
+
+                OrtValue * output_tensor = resource.output_tensor;
+                std::unique_ptr<OrtValue, decltype(release_value)> output_holder { nullptr, release_value };
+                if (bind_output) {
+                    checkError(ortapi->CreateTensorWithDataAsOrtValue(
+                        memory_info,
+                        dst_ptrs[0], dst_planes * dst_tile_bytes,
+                        std::data(dst_tile_shape), std::size(dst_tile_shape),
+                        ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT, &output_tensor
+                    ));
+                    output_holder.reset(output_tensor);
+                }
+
+                OrtIoBinding * binding;
+                checkError(ortapi->CreateIoBinding(resource.session, &binding));
+                std::unique_ptr<OrtIoBinding, decltype(release_binding)> binding_holder {
+                    binding, release_binding
+                };
+                checkError(ortapi->BindInput(binding, d->input_name.c_str(), input_tensor));
+                checkError(ortapi->BindOutput(binding, d->output_name.c_str(), output_tensor));
+
+                auto err = timed(stats.inference, [&] {
+                    TraceScope trace { "infer", ticket, n, 0 };
+                    return runSession(resource, binding, d->backend);
+                });
+
+                if (err.has_value()) {
+                    return err;
+                }
+
+                if (!bind_output) {
+                    return unpack_batch(resource, output_tensor, tile_groups[0], 0);
+                }
+
+                return {};
+            };
+
+            if (bind_input || bind_output) {
+                if (auto err = run_bound(); err.has_value()) {
+                    return set_error(err.value());
+                }
+
+                if (d->stats) {
+                    setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, 1, ticket, vsapi);
+                }
+
+                d->release(ticket);
+
+                for (const auto & frame : src_frames) {
+                    vsapi->freeFrame(frame);
+                }
+
+                return dst_frame;
+            }
+        }
+
+        // batches are pulled by the current stream and by any stream
+        // that is idle, so that a single frame may use all of the streams
+        std::atomic<size_t> next_batch_start {};
+        const auto process_full_batches = [&](Resource & resource) -> std::optional<std::string> {
+            const auto set_error = [](const std::string & error_message) {
+                return error_message;
+            };
+
+#ifdef ENABLE_CUDA
+            if (d->backend == Backend::CUDA) {
+                checkCUDAError(cudaSetDevice(d->device_id));
+            }
+#endif // ENABLE_CUDA
+
+            if (!d->pipeline) {
+                while (true) {
+                    size_t batch_start = next_batch_start.fetch_add(batch_size, std::memory_order_relaxed);
+                    if (batch_start >= std::size(tile_positions)) {
+                        return {};
+                    }
+
+                    if (auto err = pack_batch(resource, resource.input_tensor, tile_groups[0], batch_start); err.has_value()) {
+                        return err;
+                    }
+
+                    if (auto err = timed(stats.inference, [&] {
+                        TraceScope trace { "infer", d->streamIndex(resource), n, static_cast<int>(batch_start) };
+                        return runSession(resource, resource.binding, d->backend);
+                    }); err.has_value()) {
+                        return err;
+                    }
+
+                    if (auto err = unpack_batch(resource, resource.output_tensor, tile_groups[0], batch_start); err.has_value()) {
+                        return err;
+                    }
+                }
+            }
+
+            // double-buffered io: packing of the next batch and unpacking of
+            // the previous batch overlap with the run of the current batch
+            OrtValue * input_tensors[] { resource.input_tensor, resource.pipeline_input_tensor };
+            OrtValue * output_tensors[] { resource.output_tensor, resource.pipeline_output_tensor };
+            OrtIoBinding * bindings[] { resource.binding, resource.pipeline_binding };
+            std::optional<size_t> running_batch_starts[2];
+
+            for (int curr = 0; ; curr = 1 - curr) {
+                const int prev = 1 - curr;
+
+                size_t batch_start = next_batch_start.fetch_add(batch_size, std::memory_order_relaxed);
+                bool has_batch = batch_start < std::size(tile_positions);
+
+                std::optional<std::string> err;
+
+                if (has_batch) {
+                    err = pack_batch(resource, input_tensors[curr], tile_groups[0], batch_start);
+                }
+
+                if (running_batch_starts[prev].has_value()) {
+                    if (auto run_err = resource.pipeline_worker->wait(); !err.has_value()) {
+                        err = std::move(run_err);
+                    }
+                }
+
+                if (has_batch && !err.has_value()) {
+                    resource.pipeline_worker->submit([&, curr, batch_start] {
+                        return timed(stats.inference, [&] {
+                            TraceScope trace {
+                                "infer", trace_async_offset + d->streamIndex(resource),
+                                n, static_cast<int>(batch_start)
+                            };
+                            return runSession(resource, bindings[curr], d->backend);
+                        });
+                    });
+                    running_batch_starts[curr] = batch_start;
+                }
+
+                if (running_batch_starts[prev].has_value()) {
+                    if (!err.has_value()) {
+                        err = unpack_batch(
+                            resource, output_tensors[prev], tile_groups[0],
+                            running_batch_starts[prev].value()
+                        );
+                    }
+                    running_batch_starts[prev].reset();
+                }
+
+                if (err.has_value()) {
+                    if (running_batch_starts[curr].has_value()) {
+                        resource.pipeline_worker->wait();
+                    }
+                    return err;
+                }
+
+                if (!has_batch) {
+                    return {};
+                }
+            }
+        };
+
+        // the batches of edge tiles are pulled after those of the tile size
+        std::vector<std::array<size_t, 2>> edge_batches; // group index and batch start
+        for (size_t i = 1; i < std::size(tile_groups); ++i) {
+            const auto & group = tile_groups[i];
+            for (size_t batch_start = 0; batch_start < std::size(group.tiles); batch_start += group.batch_size) {
+                edge_batches.push_back({ i, batch_start });
+            }
+        }
+
+        std::atomic<size_t> next_edge_batch {};
+        const auto process_batches = [&](Resource & resource) -> std::optional<std::string> {
+            const auto set_error = [](const std::string & error_message) {
+                return error_message;
+            };
+
+            if (auto err = process_full_batches(resource); err.has_value()) {
+                return err;
+            }
+
+            while (true) {
+                size_t index = next_edge_batch.fetch_add(1, std::memory_order_relaxed);
+                if (index >= std::size(edge_batches)) {
+                    return {};
+                }
+
+                const auto [group_index, batch_start] = edge_batches[index];
+                const auto & group = tile_groups[group_index];
+                const auto & edge_binding = resource.edge_bindings[group_index - 1];
+
+                if (auto err = pack_batch(resource, edge_binding.input_tensor, group, batch_start); err.has_value()) {
+                    return err;
+                }
+
+                {
+                    ScopedTimer timer { stats.inference };
+                    TraceScope trace { "infer", d->streamIndex(resource), n, static_cast<int>(batch_start) };
+                    checkError(ortapi->RunWithBinding(
+                        d->edge_shapes[group_index - 1].session, nullptr, edge_binding.binding
+                    ));
                 }
 
-                x = std::min(x + step_w, src_width - src_tile_w);
+                if (auto err = unpack_batch(resource, edge_binding.output_tensor, group, batch_start); err.has_value()) {
+                    return err;
+                }
             }
+        };
+
+        const size_t num_batches = (
+            (std::size(tile_positions) + batch_size - 1) / batch_size +
+            std::size(edge_batches)
+        );
 
-            if (y + src_tile_h == src_height) {
+        std::vector<int> helper_tickets;
+        while (std::size(helper_tickets) + 1 < num_batches) {
+            auto helper_ticket = d->try_acquire();
+            if (!helper_ticket.has_value()) {
                 break;
             }
+            helper_tickets.push_back(helper_ticket.value());
+        }
+
+        // the helper streams run on their persistent workers
+        for (const auto & helper_ticket : helper_tickets) {
+            d->resources[helper_ticket].helper_worker->submit([&, helper_ticket] {
+                return process_batches(d->resources[helper_ticket]);
+            });
+        }
+
+        auto err = process_batches(resource);
+
+        for (const auto & helper_ticket : helper_tickets) {
+            auto helper_err = d->resources[helper_ticket].helper_worker->wait();
+            if (!err.has_value() && helper_err.has_value()) {
+                err = std::move(helper_err);
+            }
+            d->release(helper_ticket);
+        }
 
-            y = std::min(y + step_h, src_height - src_tile_h);
+        if (err.has_value()) {
+            return set_error(err.value());
+        }
+
+        if (d->stats) {
+            setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, num_tiles, ticket, vsapi);
         }
 
         d->release(ticket);
@@ -726,6 +1971,45 @@ static const VSFrameRef *VS_CC vsOrtGetFrame(
 }
 
 
+// runs the network only for inputs that differ from the recent ones
+// and whose outputs are not stored in the result cache
+static const VSFrameRef *VS_CC vsOrtGetFrameCached(
+    int n,
+    int activationReason,
+    void **instanceData,
+    void **frameData,
+    VSFrameContext *frameCtx,
+    VSCore *core,
+    const VSAPI *vsapi
+) noexcept {
+
+    auto d = static_cast<vsOrtData *>(*instanceData);
+
+    if (activationReason == arAllFramesReady) {
+        const std::function<const VSFrameRef * ()> process = [&] {
+            return vsOrtGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+        };
+
+        const std::function<const VSFrameRef * ()> cached = [&] {
+            if (d->result_cache) {
+                return resultCacheGetFrame(
+                    d->result_cache, n, d->nodes, d->out_vi.get(), d->stats,
+                    frameCtx, core, vsapi, process
+                );
+            }
+            return process();
+        };
+
+        if (d->dedup_cache) {
+            return dedupGetFrame(d->dedup_cache, n, d->nodes, d->stats, frameCtx, core, vsapi, cached);
+        }
+        return cached();
+    }
+
+    return vsOrtGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+}
+
+
 static void VS_CC vsOrtFree(
     void *instanceData,
     VSCore *core,
@@ -734,15 +2018,31 @@ static void VS_CC vsOrtFree(
 
     auto d = static_cast<vsOrtData *>(instanceData);
 
+    dedupFree(d->dedup_cache, vsapi);
+    resultCacheFree(d->result_cache);
+    flatTilesFree(d->flat_tiles);
+
     for (const auto & node : d->nodes) {
         vsapi->freeNode(node);
     }
 
     for (const auto & resource : d->resources) {
+        for (const auto & edge_binding : resource.edge_bindings) {
+            ortapi->ReleaseIoBinding(edge_binding.binding);
+            ortapi->ReleaseValue(edge_binding.output_tensor);
+            ortapi->ReleaseValue(edge_binding.input_tensor);
+        }
+        if (resource.pipeline_binding) {
+            ortapi->ReleaseIoBinding(resource.pipeline_binding);
+            ortapi->ReleaseValue(resource.pipeline_output_tensor);
+            ortapi->ReleaseValue(resource.pipeline_input_tensor);
+        }
         ortapi->ReleaseIoBinding(resource.binding);
         ortapi->ReleaseValue(resource.output_tensor);
         ortapi->ReleaseValue(resource.input_tensor);
-        ortapi->ReleaseSession(resource.session);
+        if (!resource.shared_session) {
+            ortapi->ReleaseSession(resource.session);
+        }
 
 #ifdef ENABLE_CUDA
         if (d->backend == Backend::CUDA) {
@@ -755,7 +2055,20 @@ static void VS_CC vsOrtFree(
 #endif // ENABLE_CUDA
     }
 
-    ortapi->ReleaseEnv(d->environment);
+    for (const auto & edge_shape : d->edge_shapes) {
+        ortapi->ReleaseSession(edge_shape.session);
+    }
+
+    // shared sessions must be released before the environment
+    d->resources.clear();
+
+    {
+        std::lock_guard _ { environment_lock };
+        ortapi->ReleaseEnv(d->environment);
+        if (--environment_users == 0) {
+            global_num_threads.reset();
+        }
+    }
 
     delete d;
 }
@@ -877,18 +2190,164 @@ static void VS_CC vsOrtCreate(
         return set_error("\"num_streams\" must be positive");
     }
 
-#ifdef ENABLE_CUDA
-    bool cudnn_benchmark = !!(vsapi->propGetInt(in, "cudnn_benchmark", 0, &error));
+    int batch_size = int64ToIntS(vsapi->propGetInt(in, "batch_size", 0, &error));
     if (error) {
-        cudnn_benchmark = true;
+        batch_size = 1;
+    }
+    if (batch_size <= 0) {
+        return set_error("\"batch_size\" must be positive");
     }
-#endif // ENABLE_CUDA
 
-    if (auto err = ortInit(); err.has_value()) {
-        return set_error(err.value());
+    if (tile_w > static_cast<size_t>(in_vis.front()->width) || tile_h > static_cast<size_t>(in_vis.front()->height)) {
+        return set_error("tile size larger than clip dimension");
     }
 
-    bool fp16 = !!vsapi->propGetInt(in, "fp16", 0, &error);
+    d->pipeline = !!vsapi->propGetInt(in, "pipeline", 0, &error);
+    if (error) {
+        d->pipeline = false;
+    }
+    if (d->pipeline && d->backend == Backend::CUDA) {
+        return set_error("\"pipeline\" is not supported by the CUDA provider");
+    }
+
+    d->temporal_batching = !!vsapi->propGetInt(in, "temporal_batching", 0, &error);
+    if (error) {
+        d->temporal_batching = false;
+    }
+
+    d->stats = !!vsapi->propGetInt(in, "stats", 0, &error);
+    if (error) {
+        d->stats = false;
+    }
+
+    int dedup = int64ToIntS(vsapi->propGetInt(in, "dedup", 0, &error));
+    if (error) {
+        dedup = 0;
+    }
+    if (dedup < 0) {
+        return set_error("\"dedup\" must be non-negative");
+    }
+
+    auto dedup_threshold = static_cast<float>(vsapi->propGetFloat(in, "dedup_threshold", 0, &error));
+    if (error) {
+        dedup_threshold = 0.f;
+    }
+    if (dedup_threshold < 0.f) {
+        return set_error("\"dedup_threshold\" must be non-negative");
+    }
+
+    const char * result_cache_dir = vsapi->propGetData(in, "result_cache_dir", 0, &error);
+    if (error) {
+        result_cache_dir = "";
+    }
+
+    int64_t result_cache_size = vsapi->propGetInt(in, "result_cache_size", 0, &error);
+    if (error) {
+        result_cache_size = 10240;
+    }
+    if (result_cache_size < 0) {
+        return set_error("\"result_cache_size\" must be non-negative");
+    }
+
+    int max_batch_wait = int64ToIntS(vsapi->propGetInt(in, "max_batch_wait", 0, &error));
+    if (error) {
+        max_batch_wait = 10;
+    }
+    if (max_batch_wait < 0) {
+        return set_error("\"max_batch_wait\" must be non-negative");
+    }
+    d->max_batch_wait = std::chrono::milliseconds(max_batch_wait);
+
+    d->tile_multiple = int64ToIntS(vsapi->propGetInt(in, "tile_multiple", 0, &error));
+    if (error) {
+        d->tile_multiple = 0;
+    }
+    if (d->tile_multiple < 0) {
+        return set_error("\"tile_multiple\" must be non-negative");
+    }
+    if (d->tile_multiple > 0 && d->backend != Backend::CPU) {
+        return set_error("\"tile_multiple\" is only supported by the CPU provider");
+    }
+
+    d->skip_flat_tiles = !!vsapi->propGetInt(in, "skip_flat_tiles", 0, &error);
+    if (error) {
+        d->skip_flat_tiles = false;
+    }
+
+    d->auto_crop = !!vsapi->propGetInt(in, "auto_crop", 0, &error);
+    if (error) {
+        d->auto_crop = false;
+    }
+
+    auto flat_tolerance = static_cast<float>(vsapi->propGetFloat(in, "flat_tolerance", 0, &error));
+    if (error) {
+        flat_tolerance = 0.f;
+    }
+    if (flat_tolerance < 0.f) {
+        return set_error("\"flat_tolerance\" must be non-negative");
+    }
+
+    if ((d->skip_flat_tiles || d->auto_crop) && d->temporal_batching) {
+        return set_error("\"skip_flat_tiles\" and \"auto_crop\" are not supported with \"temporal_batching\"");
+    }
+    if (d->auto_crop && d->tile_multiple > 0) {
+        return set_error("\"auto_crop\" is not supported with \"tile_multiple\"");
+    }
+    if (d->auto_crop && static_cast<int>(tile_w) >= in_vis.front()->width && static_cast<int>(tile_h) >= in_vis.front()->height) {
+        // the tiles cannot shrink to the active area
+        vsapi->logMessage(mtWarning, "vsOrt: \"auto_crop\" has no effect when a tile covers the whole frame");
+        d->auto_crop = false;
+    }
+
+    const auto x_spans = getTileSpans(
+        in_vis.front()->width, static_cast<int>(tile_w),
+        static_cast<int>(tile_w - 2 * d->overlap_w), d->tile_multiple
+    );
+    const auto y_spans = getTileSpans(
+        in_vis.front()->height, static_cast<int>(tile_h),
+        static_cast<int>(tile_h - 2 * d->overlap_h), d->tile_multiple
+    );
+
+    // shapes of the tiles and their numbers, starting with the tile size
+    std::vector<std::array<int, 3>> tile_shapes;
+    for (const auto & [y, span_h] : y_spans) {
+        for (const auto & [x, span_w] : x_spans) {
+            auto iter = std::find_if(
+                std::begin(tile_shapes), std::end(tile_shapes),
+                [&](const auto & shape) { return shape[0] == span_w && shape[1] == span_h; }
+            );
+            if (iter == std::end(tile_shapes)) {
+                tile_shapes.push_back({ span_w, span_h, 1 });
+            } else {
+                (*iter)[2] += 1;
+            }
+        }
+    }
+
+    const int requested_batch_size = batch_size;
+    if (d->temporal_batching) {
+        // the batch is filled with frames from concurrent requests
+        if (std::size(x_spans) * std::size(y_spans) != 1) {
+            return set_error("\"temporal_batching\" requires a single tile per frame");
+        }
+    } else {
+        // a batch never spans more than one frame
+        batch_size = std::min(batch_size, tile_shapes[0][2]);
+    }
+    d->batch_size = static_cast<size_t>(batch_size);
+
+#ifdef ENABLE_CUDA
+    bool cudnn_benchmark = !!(vsapi->propGetInt(in, "cudnn_benchmark", 0, &error));
+    if (error) {
+        cudnn_benchmark = true;
+    }
+#endif // ENABLE_CUDA
+
+    if (auto err = ortInit(); err.has_value()) {
+        return set_error(err.value());
+    }
+
+    bool fp16 = !!vsapi->propGetInt(in, "fp16", 0, &error);
     if (error) {
         fp16 = false;
     }
@@ -924,15 +2383,8 @@ static void VS_CC vsOrtCreate(
         path_view = path;
     }
 
-    auto result = loadONNX(path_view, tile_w, tile_h, path_is_serialization);
-    if (std::holds_alternative<std::string>(result)) {
-        return set_error(std::get<std::string>(result));
-    }
-
-    auto onnx_model = std::move(std::get<ONNX_NAMESPACE::ModelProto>(result));
-
+    std::unordered_set<std::string> fp16_blacklist_ops;
     if (fp16) {
-        std::unordered_set<std::string> fp16_blacklist_ops;
         int num = vsapi->propNumElements(in, "fp16_blacklist_ops");
         if (num == -1) {
             fp16_blacklist_ops = {
@@ -950,21 +2402,156 @@ static void VS_CC vsOrtCreate(
                 fp16_blacklist_ops.emplace(vsapi->propGetData(in, "fp16_blacklist_ops", i, nullptr));
             }
         }
-        convert_float_to_float16(onnx_model, false, fp16_blacklist_ops);
     }
 
-    rename(onnx_model);
+    const char * cache_dir = vsapi->propGetData(in, "cache_dir", 0, &error);
+    if (error) {
+        cache_dir = "";
+    }
+
+    int64_t cache_size = vsapi->propGetInt(in, "cache_size", 0, &error);
+    if (error) {
+        cache_size = 2048;
+    }
+    if (cache_size < 0) {
+        return set_error("\"cache_size\" must be non-negative");
+    }
+
+    // loads the model specialized for a tile shape, with the fp16-converted
+    // model cached on top of the shape-specialized one
+    auto prepare_model = [&](
+        int shape_w, int shape_h, int shape_batch_size, std::string & data
+    ) -> std::optional<std::string> {
+        std::optional<std::string> fp16_key;
+        if (fp16 && cache_dir[0] != '\0') {
+            std::vector<std::string> sorted_ops(
+                std::cbegin(fp16_blacklist_ops), std::cend(fp16_blacklist_ops)
+            );
+            std::sort(std::begin(sorted_ops), std::end(sorted_ops));
+
+            std::string description = (
+                "ort;"s + VERSION + ";" + ONNX_NAMESPACE::LAST_RELEASE_VERSION + ";" +
+                std::to_string(shape_w) + "x" + std::to_string(shape_h) + "x" +
+                std::to_string(shape_batch_size) + ";fp16"
+            );
+            for (const auto & op : sorted_ops) {
+                description += ";" + op;
+            }
 
-    std::string onnx_data = onnx_model.SerializeAsString();
-    if (std::size(onnx_data) == 0) {
-        return set_error("proto serialization failed");
+            fp16_key = getModelCacheKey(path_view, path_is_serialization, description);
+            if (fp16_key.has_value()) {
+                if (auto cached = loadCachedModel(cache_dir, fp16_key.value()); cached.has_value()) {
+                    data = std::move(cached.value());
+                    return {};
+                }
+            }
+        }
+
+        auto result = loadONNX(
+            path_view, shape_w, shape_h, path_is_serialization, shape_batch_size,
+            cache_dir, static_cast<uint64_t>(cache_size) << 20
+        );
+        if (std::holds_alternative<std::string>(result)) {
+            return std::get<std::string>(result);
+        }
+
+        auto onnx_model = std::move(std::get<ONNX_NAMESPACE::ModelProto>(result));
+
+        if (fp16) {
+            convert_float_to_float16(onnx_model, false, fp16_blacklist_ops);
+        }
+
+        rename(onnx_model);
+
+        data = onnx_model.SerializeAsString();
+        if (std::size(data) == 0) {
+            return "proto serialization failed";
+        }
+
+        if (fp16_key.has_value()) {
+            storeCachedModel(
+                cache_dir, fp16_key.value(), data,
+                static_cast<uint64_t>(cache_size) << 20
+            );
+        }
+
+        return {};
+    };
+
+    std::string onnx_data;
+    if (auto err = prepare_model(tile_w, tile_h, batch_size, onnx_data); err.has_value()) {
+        return set_error(err.value());
     }
 
     // onnxruntime related code
 
-    // environment per filter instance
-    auto logger_id_str = "vs-ort" + std::to_string(logger_id.fetch_add(1, std::memory_order::relaxed));
-    checkError(ortapi->CreateEnv(verbosity, logger_id_str.c_str(), &d->environment));
+    bool share_session = !!vsapi->propGetInt(in, "share_session", 0, &error);
+    if (error) {
+        share_session = false;
+    }
+    if (share_session && d->backend != Backend::CPU) {
+        return set_error("\"share_session\" is only supported by the CPU provider");
+    }
+
+    int intra_op_num_threads = int64ToIntS(vsapi->propGetInt(in, "intra_op_num_threads", 0, &error));
+    if (error) {
+        intra_op_num_threads = 0;
+    }
+    if (intra_op_num_threads < 0) {
+        return set_error("\"intra_op_num_threads\" must be non-negative");
+    }
+
+    int inter_op_num_threads = int64ToIntS(vsapi->propGetInt(in, "inter_op_num_threads", 0, &error));
+    if (error) {
+        inter_op_num_threads = 0;
+    }
+    if (inter_op_num_threads < 0) {
+        return set_error("\"inter_op_num_threads\" must be non-negative");
+    }
+
+    // shared sessions run on the global thread pools of the environment if
+    // it has them, and on thread pools of their own otherwise
+    bool global_thread_pools;
+    {
+        std::lock_guard _ { environment_lock };
+
+        auto logger_id_str = "vs-ort" + std::to_string(logger_id.fetch_add(1, std::memory_order::relaxed));
+
+        if (environment_users == 0 && share_session) {
+            OrtThreadingOptions * threading_options;
+            checkError(ortapi->CreateThreadingOptions(&threading_options));
+            checkError(ortapi->SetGlobalIntraOpNumThreads(threading_options, intra_op_num_threads));
+            checkError(ortapi->SetGlobalInterOpNumThreads(threading_options, inter_op_num_threads));
+
+            auto status = ortapi->CreateEnvWithGlobalThreadPools(
+                verbosity, logger_id_str.c_str(),
+                threading_options, &d->environment
+            );
+            ortapi->ReleaseThreadingOptions(threading_options);
+            checkError(status);
+
+            global_num_threads = std::array { intra_op_num_threads, inter_op_num_threads };
+        } else {
+            checkError(ortapi->CreateEnv(verbosity, logger_id_str.c_str(), &d->environment));
+        }
+
+        ++environment_users;
+
+        global_thread_pools = share_session && global_num_threads.has_value();
+
+        if (global_thread_pools && global_num_threads.value() != std::array { intra_op_num_threads, inter_op_num_threads }) {
+            vsapi->logMessage(
+                mtWarning,
+                (
+                    "vsOrt: the global thread pools of onnxruntime have " +
+                    std::to_string(global_num_threads.value()[0]) + " intra-op and " +
+                    std::to_string(global_num_threads.value()[1]) + " inter-op threads "
+                    "set by the first instance with \"share_session\", "
+                    "\"intra_op_num_threads\" and \"inter_op_num_threads\" are ignored"
+                ).c_str()
+            );
+        }
+    }
 
     OrtMemoryInfo * memory_info;
 #ifdef ENABLE_CUDA
@@ -985,6 +2572,119 @@ static void VS_CC vsOrtCreate(
     OrtAllocator * cpu_allocator;
     checkError(ortapi->GetAllocatorWithDefaultOptions(&cpu_allocator));
 
+    // streams and filter instances running the same model share a single
+    // session and the global thread pools of the environment
+    std::optional<std::string> session_key;
+    std::shared_ptr<OrtSession> shared_session;
+    std::optional<SessionReservation> session_reservation; // set if this instance builds the session
+    if (share_session) {
+        std::string description = (
+            "ort-session;"s + std::to_string(static_cast<int>(d->backend)) + ";" +
+            std::to_string(tile_w) + "x" + std::to_string(tile_h) + "x" +
+            std::to_string(batch_size)
+        );
+
+        session_key = getModelCacheKey(onnx_data, true, description);
+        if (!session_key.has_value()) {
+            return set_error("failed to compute the key of the shared session");
+        }
+
+        while (!shared_session && !session_reservation.has_value()) {
+            std::shared_future<std::weak_ptr<OrtSession>> pending;
+            {
+                std::lock_guard<std::mutex> lock(session_registry_lock);
+                auto iter = session_registry.find(session_key.value());
+                if (iter != std::end(session_registry) && isReady(iter->second)) {
+                    shared_session = iter->second.get().lock();
+                    if (!shared_session) {
+                        session_registry.erase(iter);
+                        iter = std::end(session_registry);
+                    }
+                }
+
+                if (shared_session) {
+                    break;
+                } else if (iter != std::end(session_registry)) {
+                    pending = iter->second;
+                } else {
+                    session_reservation.emplace();
+                    session_reservation->key = session_key.value();
+                    session_registry.emplace(
+                        session_key.value(), session_reservation->promise.get_future().share()
+                    );
+                }
+            }
+
+            // another instance is building the session, and the
+            // registry is checked again once it is done or has failed
+            if (pending.valid()) {
+                pending.wait();
+            }
+        }
+    }
+
+    const char * optimized_model_cache = vsapi->propGetData(in, "optimized_model_cache", 0, &error);
+    if (error) {
+        optimized_model_cache = "";
+    }
+
+    // the graph optimized by the first session is saved and loaded by
+    // later sessions and processes with graph optimizations disabled
+    //
+    // the model already reflects the tile shape and the fp16 conversion,
+    // and the optimized graph holds kernels and layouts chosen for the
+    // cpu, and for the gpu with the CUDA provider
+    std::string device_identity;
+    if (optimized_model_cache[0] != '\0') {
+        device_identity = getHostIdentity();
+#ifdef ENABLE_CUDA
+        if (d->backend == Backend::CUDA) {
+            cudaDeviceProp prop;
+            checkCUDAError(cudaGetDeviceProperties(&prop, d->device_id));
+            device_identity += (
+                ";"s + prop.name + ";" +
+                std::to_string(prop.major) + "." + std::to_string(prop.minor)
+            );
+        }
+#endif // ENABLE_CUDA
+    }
+    auto get_optimized_key = [&](
+        const std::string & data, int shape_w, int shape_h, int shape_batch_size
+    ) {
+        std::string description = (
+            "ort-optimized;"s + VERSION + ";" + OrtGetApiBase()->GetVersionString() + ";" +
+            std::to_string(static_cast<int>(d->backend)) + ";" +
+            std::to_string(d->device_id) + ";" +
+            std::to_string(shape_w) + "x" + std::to_string(shape_h) + "x" +
+            std::to_string(shape_batch_size) + (fp16 ? ";fp16" : ";fp32") + ";" +
+            device_identity
+        );
+
+        return getModelCacheKey(data, true, description);
+    };
+
+    bool is_optimized = false;
+    std::optional<std::string> optimized_key;
+    std::optional<std::filesystem::path> optimized_temp_path;
+    if (optimized_model_cache[0] != '\0' && !shared_session) {
+#ifdef ENABLE_COREML
+        if (d->backend == Backend::COREML) {
+            return set_error("\"optimized_model_cache\" is not supported by the CoreML provider");
+        }
+#endif // ENABLE_COREML
+
+        optimized_key = get_optimized_key(onnx_data, tile_w, tile_h, batch_size);
+        if (optimized_key.has_value()) {
+            auto cached = loadCachedModel(optimized_model_cache, optimized_key.value());
+            if (cached.has_value()) {
+                onnx_data = std::move(cached.value());
+                is_optimized = true;
+            } else {
+                optimized_temp_path = getCacheTempPath(optimized_model_cache, optimized_key.value());
+            }
+        }
+    }
+
     // per-stream context
     d->semaphore.current.store(num_streams - 1, std::memory_order_relaxed);
     d->tickets.reserve(num_streams);
@@ -995,85 +2695,143 @@ static void VS_CC vsOrtCreate(
     for (int i = 0; i < num_streams; ++i) {
         Resource resource;
 
-        OrtSessionOptions * session_options;
-        checkError(ortapi->CreateSessionOptions(&session_options));
-        checkError(ortapi->SetSessionExecutionMode(
-            session_options,
-            ExecutionMode::ORT_SEQUENTIAL
-        ));
+        if (shared_session) {
+            resource.session = shared_session.get();
+        } else {
+            OrtSessionOptions * session_options;
+            checkError(ortapi->CreateSessionOptions(&session_options));
+            checkError(ortapi->SetSessionExecutionMode(
+                session_options,
+                ExecutionMode::ORT_SEQUENTIAL
+            ));
 
-        // it is important to disable the memory pattern optimization
-        // for use in vapoursynth
-        //
-        // this optimization merges memory allocation calls, but it is useless
-        // during inference in vs since the memory usage is fixed
-        //
-        // it also prevents the use of cuda graphs which requires a static
-        // memory configuration
-        checkError(ortapi->DisableMemPattern(session_options));
+            // it is important to disable the memory pattern optimization
+            // for use in vapoursynth
+            //
+            // this optimization merges memory allocation calls, but it is useless
+            // during inference in vs since the memory usage is fixed
+            //
+            // it also prevents the use of cuda graphs which requires a static
+            // memory configuration
+            checkError(ortapi->DisableMemPattern(session_options));
+
+            if (global_thread_pools) {
+                // runs on the global thread pools of the environment
+                checkError(ortapi->DisablePerSessionThreads(session_options));
+            } else {
+                if (intra_op_num_threads > 0) {
+                    checkError(ortapi->SetIntraOpNumThreads(session_options, intra_op_num_threads));
+                }
+                if (inter_op_num_threads > 0) {
+                    checkError(ortapi->SetInterOpNumThreads(session_options, inter_op_num_threads));
+                }
+            }
 
-        // TODO: other providers
-#ifdef ENABLE_CUDA
-        if (d->backend == Backend::CUDA) {
-            OrtCUDAProviderOptionsV2 * cuda_options;
-            checkError(ortapi->CreateCUDAProviderOptions(&cuda_options));
-#ifdef _MSC_VER
-            // Preload cuda dll from vsort directory.
-            static std::once_flag cuda_dll_preloaded_flag;
-            std::call_once(cuda_dll_preloaded_flag, []() {
-                    extern void preloadCudaDlls();
-                    preloadCudaDlls();
-            });
-#endif // _MSC_VER
-            // should not set 'do_copy_in_default_stream' to false
-            const char * keys [] {
-                "device_id",
-                "cudnn_conv_algo_search",
-                "cudnn_conv_use_max_workspace",
-                "arena_extend_strategy",
-                "enable_cuda_graph"
-            };
-            auto device_id_str = std::to_string(d->device_id);
-            const char * values [] {
-                device_id_str.c_str(),
-                "EXHAUSTIVE",
-                "1",
-                "kSameAsRequested",
-                "0"
-            };
-            if (!cudnn_benchmark) {
-                values[1] = "HEURISTIC";
+            // TODO: other providers
+    #ifdef ENABLE_CUDA
+            if (d->backend == Backend::CUDA) {
+                OrtCUDAProviderOptionsV2 * cuda_options;
+                checkError(ortapi->CreateCUDAProviderOptions(&cuda_options));
+    #ifdef _MSC_VER
+                // Preload cuda dll from vsort directory.
+                static std::once_flag cuda_dll_preloaded_flag;
+                std::call_once(cuda_dll_preloaded_flag, []() {
+                        extern void preloadCudaDlls();
+                        preloadCudaDlls();
+                });
+    #endif // _MSC_VER
+                // should not set 'do_copy_in_default_stream' to false
+                const char * keys [] {
+                    "device_id",
+                    "cudnn_conv_algo_search",
+                    "cudnn_conv_use_max_workspace",
+                    "arena_extend_strategy",
+                    "enable_cuda_graph"
+                };
+                auto device_id_str = std::to_string(d->device_id);
+                const char * values [] {
+                    device_id_str.c_str(),
+                    "EXHAUSTIVE",
+                    "1",
+                    "kSameAsRequested",
+                    "0"
+                };
+                if (!cudnn_benchmark) {
+                    values[1] = "HEURISTIC";
+                }
+                if (use_cuda_graph) {
+                    values[4] = "1";
+                    resource.require_replay = true;
+                } else {
+                    resource.require_replay = false;
+                }
+                checkError(ortapi->UpdateCUDAProviderOptions(cuda_options, keys, values, std::size(keys)));
+
+                checkError(ortapi->SessionOptionsAppendExecutionProvider_CUDA_V2(session_options, cuda_options));
             }
-            if (use_cuda_graph) {
-                values[4] = "1";
-                resource.require_replay = true;
-            } else {
-                resource.require_replay = false;
+    #endif // ENABLE_CUDA
+    #ifdef ENABLE_COREML
+            else if (d->backend == Backend::COREML) {
+                checkError(OrtSessionOptionsAppendExecutionProvider_CoreML(
+                    session_options,
+                    0
+                ));
+            }
+    #endif // ENABLE_COREML
+
+            bool save_optimized = !is_optimized && optimized_temp_path.has_value();
+            if (is_optimized) {
+                checkError(ortapi->SetSessionGraphOptimizationLevel(
+                    session_options,
+                    GraphOptimizationLevel::ORT_DISABLE_ALL
+                ));
+            } else if (save_optimized) {
+                checkError(ortapi->SetOptimizedModelFilePath(
+                    session_options,
+                    optimized_temp_path->c_str()
+                ));
             }
-            checkError(ortapi->UpdateCUDAProviderOptions(cuda_options, keys, values, std::size(keys)));
 
-            checkError(ortapi->SessionOptionsAppendExecutionProvider_CUDA_V2(session_options, cuda_options));
-        }
-#endif // ENABLE_CUDA
-#ifdef ENABLE_COREML
-        else if (d->backend == Backend::COREML) {
-            checkError(OrtSessionOptionsAppendExecutionProvider_CoreML(
+            checkError(ortapi->CreateSessionFromArray(
+                d->environment,
+                std::data(onnx_data), std::size(onnx_data),
                 session_options,
-                0
+                &resource.session
             ));
-        }
-#endif // ENABLE_COREML
 
-        checkError(ortapi->CreateSessionFromArray(
-            d->environment,
-            std::data(onnx_data), std::size(onnx_data),
-            session_options,
-            &resource.session
-        ));
+            ortapi->ReleaseSessionOptions(session_options);
 
-        ortapi->ReleaseSessionOptions(session_options);
+            if (save_optimized) {
+                auto temp_path = std::move(optimized_temp_path.value());
+                optimized_temp_path.reset();
+
+                if (commitCachedModel(
+                    optimized_model_cache, optimized_key.value(), temp_path,
+                    static_cast<uint64_t>(cache_size) << 20
+                )) {
+                    auto cached = loadCachedModel(optimized_model_cache, optimized_key.value());
+                    if (cached.has_value()) {
+                        onnx_data = std::move(cached.value());
+                        is_optimized = true;
+                    }
+                }
+            }
 
-        if (auto err = checkSession(resource.session); err.has_value()) {
+            if (share_session) {
+                shared_session = std::shared_ptr<OrtSession>(resource.session, ortapi->ReleaseSession);
+
+                {
+                    std::lock_guard<std::mutex> lock(session_registry_lock);
+                    std::erase_if(session_registry, [](const auto & entry) {
+                        return isReady(entry.second) && entry.second.get().expired();
+                    });
+                }
+                session_reservation->fulfill(shared_session);
+            }
+        }
+        resource.shared_session = shared_session;
+
+        if (auto err = checkSession(resource.session, batch_size); err.has_value()) {
             return set_error(err.value());
         }
 
@@ -1163,6 +2921,40 @@ static void VS_CC vsOrtCreate(
         checkError(ortapi->BindInput(resource.binding, input_name, resource.input_tensor));
         checkError(ortapi->BindOutput(resource.binding, output_name, resource.output_tensor));
 
+        if (i == 0) {
+            d->input_name = input_name;
+            d->output_name = output_name;
+        }
+
+        resource.pipeline_input_tensor = nullptr;
+        resource.pipeline_output_tensor = nullptr;
+        resource.pipeline_binding = nullptr;
+        if (d->pipeline) {
+            checkError(ortapi->CreateTensorAsOrtValue(
+                cpu_allocator,
+                std::data(input_shape), std::size(input_shape),
+                ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT,
+                &resource.pipeline_input_tensor
+            ));
+
+            checkError(ortapi->CreateTensorAsOrtValue(
+                cpu_allocator,
+                std::data(output_shape), std::size(output_shape),
+                ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT,
+                &resource.pipeline_output_tensor
+            ));
+
+            checkError(ortapi->CreateIoBinding(resource.session, &resource.pipeline_binding));
+            checkError(ortapi->BindInput(resource.pipeline_binding, input_name, resource.pipeline_input_tensor));
+            checkError(ortapi->BindOutput(resource.pipeline_binding, output_name, resource.pipeline_output_tensor));
+
+            resource.pipeline_worker = std::make_shared<PipelineWorker>();
+        }
+
+        if (num_streams > 1 && !d->temporal_batching) {
+            resource.helper_worker = std::make_shared<PipelineWorker>();
+        }
+
         if (auto err = checkNodesAndNetwork(resource.session, in_vis); err.has_value()) {
             return set_error(err.value());
         }
@@ -1174,11 +2966,175 @@ static void VS_CC vsOrtCreate(
         d->resources.push_back(resource);
     }
 
+    // the last column and row of tiles are shrunk to their actual size
+    // and run by sessions specialized for their shapes
+    for (size_t i = 1; i < std::size(tile_shapes); ++i) {
+        const auto [edge_w, edge_h, num_edge_tiles] = tile_shapes[i];
+
+        EdgeShape edge_shape {
+            .tile_w = edge_w,
+            .tile_h = edge_h,
+            .batch_size = static_cast<size_t>(std::min(requested_batch_size, num_edge_tiles)),
+            .session = nullptr
+        };
+
+        // built through the same model caches as the main session
+        std::string edge_onnx_data;
+        if (auto err = prepare_model(
+            edge_w, edge_h, static_cast<int>(edge_shape.batch_size), edge_onnx_data
+        ); err.has_value()) {
+            return set_error(err.value());
+        }
+
+        bool edge_is_optimized = false;
+        std::optional<std::string> edge_optimized_key;
+        std::optional<std::filesystem::path> edge_optimized_temp_path;
+        if (optimized_model_cache[0] != '\0') {
+            edge_optimized_key = get_optimized_key(
+                edge_onnx_data, edge_w, edge_h, static_cast<int>(edge_shape.batch_size)
+            );
+            if (edge_optimized_key.has_value()) {
+                auto cached = loadCachedModel(optimized_model_cache, edge_optimized_key.value());
+                if (cached.has_value()) {
+                    edge_onnx_data = std::move(cached.value());
+                    edge_is_optimized = true;
+                } else {
+                    edge_optimized_temp_path = getCacheTempPath(
+                        optimized_model_cache, edge_optimized_key.value()
+                    );
+                }
+            }
+        }
+
+        OrtSessionOptions * session_options;
+        checkError(ortapi->CreateSessionOptions(&session_options));
+        checkError(ortapi->SetSessionExecutionMode(
+            session_options,
+            ExecutionMode::ORT_SEQUENTIAL
+        ));
+        checkError(ortapi->DisableMemPattern(session_options));
+        if (global_thread_pools) {
+            checkError(ortapi->DisablePerSessionThreads(session_options));
+        } else {
+            if (intra_op_num_threads > 0) {
+                checkError(ortapi->SetIntraOpNumThreads(session_options, intra_op_num_threads));
+            }
+            if (inter_op_num_threads > 0) {
+                checkError(ortapi->SetInterOpNumThreads(session_options, inter_op_num_threads));
+            }
+        }
+
+        if (edge_is_optimized) {
+            checkError(ortapi->SetSessionGraphOptimizationLevel(
+                session_options,
+                GraphOptimizationLevel::ORT_DISABLE_ALL
+            ));
+        } else if (edge_optimized_temp_path.has_value()) {
+            checkError(ortapi->SetOptimizedModelFilePath(
+                session_options,
+                edge_optimized_temp_path->c_str()
+            ));
+        }
+
+        checkError(ortapi->CreateSessionFromArray(
+            d->environment,
+            std::data(edge_onnx_data), std::size(edge_onnx_data),
+            session_options,
+            &edge_shape.session
+        ));
+
+        ortapi->ReleaseSessionOptions(session_options);
+
+        if (edge_optimized_temp_path.has_value()) {
+            commitCachedModel(
+                optimized_model_cache, edge_optimized_key.value(),
+                edge_optimized_temp_path.value(),
+                static_cast<uint64_t>(cache_size) << 20
+            );
+        }
+
+        d->edge_shapes.push_back(edge_shape);
+
+        if (auto err = checkSession(edge_shape.session, static_cast<int64_t>(edge_shape.batch_size)); err.has_value()) {
+            return set_error(err.value());
+        }
+
+        auto input_shape = std::get<std::array<int64_t, 4>>(
+            getShape(edge_shape.session, true)
+        );
+        auto output_shape = std::get<std::array<int64_t, 4>>(
+            getShape(edge_shape.session, false)
+        );
+
+        // sessions run concurrently on the io tensors of the streams
+        for (auto & resource : d->resources) {
+            EdgeBinding edge_binding;
+
+            checkError(ortapi->CreateTensorAsOrtValue(
+                cpu_allocator,
+                std::data(input_shape), std::size(input_shape),
+                ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT,
+                &edge_binding.input_tensor
+            ));
+
+            checkError(ortapi->CreateTensorAsOrtValue(
+                cpu_allocator,
+                std::data(output_shape), std::size(output_shape),
+                ONNX_TENSOR_ELEMENT_DATA_TYPE_FLOAT,
+                &edge_binding.output_tensor
+            ));
+
+            checkError(ortapi->CreateIoBinding(edge_shape.session, &edge_binding.binding));
+            checkError(ortapi->BindInput(edge_binding.binding, d->input_name.c_str(), edge_binding.input_tensor));
+            checkError(ortapi->BindOutput(edge_binding.binding, d->output_name.c_str(), edge_binding.output_tensor));
+
+            resource.edge_bindings.push_back(edge_binding);
+        }
+    }
+
     ortapi->ReleaseMemoryInfo(memory_info);
 
+    // the key covers the processed model, which is specialized to the tile
+    // size and converted to fp16 if requested, and the provider
+    if (result_cache_dir[0] != '\0') {
+        std::string description = (
+            "result;ort;"s + VERSION + ";" + OrtGetApiBase()->GetVersionString() + ";" +
+            std::to_string(static_cast<int>(d->backend)) + ";" +
+            std::to_string(tile_w) + "x" + std::to_string(tile_h) + ";" +
+            std::to_string(d->overlap_w) + "x" + std::to_string(d->overlap_h) + ";" +
+            std::to_string(d->tile_multiple)
+        );
+        if (d->skip_flat_tiles || d->auto_crop) {
+            // the outputs of flat tiles and borders depend on the tolerance
+            description += (
+                ";flat;" + std::to_string(d->skip_flat_tiles) + std::to_string(d->auto_crop) + ";" +
+                std::to_string(flat_tolerance)
+            );
+        }
+
+        auto result_cache_key = getModelCacheKey(onnx_data, true, description);
+        if (result_cache_key.has_value()) {
+            d->result_cache = resultCacheCreate(
+                result_cache_dir, result_cache_key.value(),
+                static_cast<uint64_t>(result_cache_size) << 20
+            );
+        }
+        if (!d->result_cache) {
+            vsapi->logMessage(mtWarning, "vsOrt: failed to open the result cache");
+        }
+    }
+
+    if (d->skip_flat_tiles || d->auto_crop) {
+        d->flat_tiles = flatTilesCreate(flat_tolerance);
+    }
+
+    if (dedup > 0) {
+        d->dedup_cache = dedupCreate(dedup, dedup_threshold);
+    }
+
     vsapi->createFilter(
         in, out, "Model",
-        vsOrtInit, vsOrtGetFrame, vsOrtFree,
+        vsOrtInit, d->dedup_cache || d->result_cache ? vsOrtGetFrameCached : vsOrtGetFrame, vsOrtFree,
         fmParallel, 0, d.release(), core
     );
 }
@@ -1213,6 +3169,25 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         "path_is_serialization:int:opt;"
         "use_cuda_graph:int:opt;"
         "fp16_blacklist_ops:data[]:opt;"
+        "batch_size:int:opt;"
+        "temporal_batching:int:opt;"
+        "max_batch_wait:int:opt;"
+        "pipeline:int:opt;"
+        "cache_dir:data:opt;"
+        "cache_size:int:opt;"
+        "optimized_model_cache:data:opt;"
+        "share_session:int:opt;"
+        "intra_op_num_threads:int:opt;"
+        "inter_op_num_threads:int:opt;"
+        "tile_multiple:int:opt;"
+        "stats:int:opt;"
+        "dedup:int:opt;"
+        "dedup_threshold:float:opt;"
+        "result_cache_dir:data:opt;"
+        "result_cache_size:int:opt;"
+        "skip_flat_tiles:int:opt;"
+        "auto_crop:int:opt;"
+        "flat_tolerance:float:opt;"
         , vsOrtCreate,
         nullptr,
         plugin
@@ -1241,4 +3216,21 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         vsapi->propSetData(out, "path", vsapi->getPluginPath(myself), -1, paReplace);
     };
     registerFunc("Version", "", getVersion, nullptr, plugin);
+
+    auto startTrace = [](const VSMap * in, VSMap *, void *, VSCore *, const VSAPI *vsapi) {
+        int error;
+        auto capacity = vsapi->propGetInt(in, "capacity", 0, &error);
+        if (error || capacity <= 0) {
+            capacity = 1 << 20;
+        }
+
+        traceStart(static_cast<size_t>(capacity));
+    };
+    registerFunc("TraceStart", "capacity:int:opt;", startTrace, nullptr, plugin);
+
+    auto stopTrace = [](const VSMap *, VSMap * out, void *, VSCore *, const VSAPI *vsapi) {
+        auto events = traceStop();
+        vsapi->propSetData(out, "trace", std::data(events), static_cast<int>(std::size(events)), paReplace);
+    };
+    registerFunc("TraceStop", "", stopTrace, nullptr, plugin);
 }
@@ -1,5 +1,10 @@
+#include <algorithm>
 #include <array>
+#include <atomic>
+#include <chrono>
+#include <condition_variable>
 #include <cstdint>
+#include <functional>
 #include <map>
 #include <memory>
 #include <mutex>
@@ -34,7 +39,10 @@ extern std::variant<std::string, ONNX_NAMESPACE::ModelProto> loadONNX(
     const std::string_view & path,
     int64_t tile_w,
     int64_t tile_h,
-    bool path_is_serialization
+    bool path_is_serialization,
+    int64_t batch,
+    const std::string & cache_dir,
+    uint64_t cache_size
 ) noexcept;
 
 extern void convert_float_to_float16(
@@ -43,6 +51,138 @@ extern void convert_float_to_float16(
     const std::unordered_set<std::string> & op_block_list
 ) noexcept;
 
+extern std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept;
+
+extern std::optional<std::string> loadCachedModel(
+    const std::string & cache_dir,
+    const std::string & key
+) noexcept;
+
+extern void storeCachedModel(
+    const std::string & cache_dir,
+    const std::string & key,
+    const std::string & data,
+    uint64_t max_size
+) noexcept;
+
+extern void traceStart(size_t capacity) noexcept;
+
+extern std::string traceStop() noexcept;
+
+extern bool traceEnabled() noexcept;
+
+extern int64_t traceNow() noexcept;
+
+extern int traceThreadId() noexcept;
+
+extern void traceEvent(
+    const char * name,
+    int64_t begin,
+    int64_t end,
+    int tid,
+    int frame,
+    int tile
+) noexcept;
+
+struct DedupCache;
+
+extern DedupCache * dedupCreate(int capacity, float threshold) noexcept;
+
+extern void dedupFree(DedupCache * cache, const VSAPI * vsapi) noexcept;
+
+extern const VSFrameRef * dedupGetFrame(
+    DedupCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+struct ResultCache;
+
+extern ResultCache * resultCacheCreate(
+    const std::string & cache_dir,
+    const std::string & key,
+    uint64_t max_size
+) noexcept;
+
+extern void resultCacheFree(ResultCache * cache) noexcept;
+
+extern const VSFrameRef * resultCacheGetFrame(
+    ResultCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    const VSVideoInfo * vi,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+struct FlatTiles;
+
+extern FlatTiles * flatTilesCreate(float tolerance) noexcept;
+
+extern void flatTilesFree(FlatTiles * flat_tiles) noexcept;
+
+extern std::optional<std::vector<float>> getFlatColor(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int x,
+    int y,
+    int width,
+    int height
+) noexcept;
+
+extern std::array<int, 4> getActiveArea(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int width,
+    int height
+) noexcept;
+
+extern std::array<int, 4> getCropArea(
+    const std::array<int, 4> & active_area,
+    int width,
+    int height,
+    int tile_w,
+    int tile_h,
+    int overlap_w,
+    int overlap_h
+) noexcept;
+
+extern std::shared_ptr<const std::vector<uint8_t>> findFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color
+) noexcept;
+
+extern void storeFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color,
+    std::vector<uint8_t> response
+) noexcept;
+
+extern void fillOutsideArea(
+    const std::vector<uint8_t *> & planes,
+    int stride,
+    int width,
+    int height,
+    const std::array<int, 4> & area,
+    const std::vector<uint8_t> & response,
+    int tile_w,
+    int tile_h
+) noexcept;
+
 
 using namespace std::string_literals;
 
@@ -116,7 +256,8 @@ template <typename T>
 [[nodiscard]]
 static std::optional<std::string> checkIOInfo(
     const T & info,
-    bool is_output
+    bool is_output,
+    int batch_size
 ) {
 
     if (info->getPrecision() != InferenceEngine::Precision::FP32) {
@@ -131,8 +272,8 @@ static std::optional<std::string> checkIOInfo(
         return "expects network with 4-D IO";
     }
 
-    if (dims[0] != 1) {
-        return "batch size of network must be 1";
+    if (dims[0] != static_cast<size_t>(batch_size)) {
+        return "batch size of network must be " + std::to_string(batch_size);
     }
 
     if (is_output) {
@@ -148,7 +289,8 @@ static std::optional<std::string> checkIOInfo(
 
 [[nodiscard]]
 static std::optional<std::string> checkNetwork(
-    const InferenceEngine::CNNNetwork & network
+    const InferenceEngine::CNNNetwork & network,
+    int batch_size
 ) {
 
     const auto & inputs_info = network.getInputsInfo();
@@ -158,7 +300,7 @@ static std::optional<std::string> checkNetwork(
     }
 
     const auto & input_info = inputs_info.cbegin()->second;
-    if (auto err = checkIOInfo(input_info, false); err.has_value()) {
+    if (auto err = checkIOInfo(input_info, false, batch_size); err.has_value()) {
         return err.value();
     }
 
@@ -169,7 +311,7 @@ static std::optional<std::string> checkNetwork(
     }
 
     const auto & output_info = outputs_info.cbegin()->second;
-    if (auto err = checkIOInfo(output_info, true); err.has_value()) {
+    if (auto err = checkIOInfo(output_info, true, batch_size); err.has_value()) {
         return err.value();
     }
 
@@ -226,6 +368,90 @@ static void setDimensions(
 }
 
 
+// start positions and sizes of the tiles covering an axis
+//
+// the last tile is moved back to end at the border of the frame, or with
+// a positive "multiple", shrunk to the smallest multiple of it that covers
+// the remaining pixels, for networks accepting variable input shapes
+static std::vector<std::array<int, 2>> getTileSpans(
+    int size,
+    int tile,
+    int step,
+    int multiple
+) {
+
+    std::vector<std::array<int, 2>> spans;
+
+    int pos = 0;
+    while (pos + tile < size) {
+        spans.push_back({ pos, tile });
+        pos += step;
+    }
+
+    int extent = tile;
+    if (multiple > 0) {
+        extent = std::min(tile, (size - pos + multiple - 1) / multiple * multiple);
+    }
+    spans.push_back({ size - extent, extent });
+
+    return spans;
+}
+
+
+// number of output pixels cropped at the start and at the end of the tiles
+//
+// the end of a tile is cropped where the next tile starts, so that
+// the tiles may be written back in any order
+static std::vector<std::array<int, 2>> getTileCrops(
+    const std::vector<std::array<int, 2>> & spans,
+    int overlap,
+    int scale
+) {
+
+    std::vector<std::array<int, 2>> crops;
+    crops.reserve(std::size(spans));
+
+    for (size_t i = 0; i < std::size(spans); ++i) {
+        const auto [pos, extent] = spans[i];
+
+        int crop_start = (i == 0) ? 0 : overlap;
+
+        int crop_end = 0;
+        if (i + 1 < std::size(spans)) {
+            int next_pos = spans[i + 1][0];
+            crop_end = std::max(overlap, scale * (pos + extent - next_pos) - overlap);
+        }
+
+        crops.push_back({ crop_start, crop_end });
+    }
+
+    return crops;
+}
+
+
+// whether the planes are laid out back to back without padding,
+// i.e. as the nchw tensor of a single image
+static bool isContiguous(
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int width_bytes,
+    int height
+) {
+
+    if (stride != width_bytes) {
+        return false;
+    }
+
+    for (size_t i = 1; i < std::size(planes); ++i) {
+        if (planes[i] != planes[i - 1] + stride * height) {
+            return false;
+        }
+    }
+
+    return true;
+}
+
+
 static std::variant<std::string, std::map<std::string, std::string>> getConfig(
     VSFuncRef * config_func,
     VSCore * core,
@@ -279,22 +505,234 @@ static std::variant<std::string, std::map<std::string, std::string>> getConfig(
 }
 
 
+// per-frame timings in nanoseconds, summed over the inference requests working on the frame
+struct FrameStats {
+    std::atomic<int64_t> wait {};
+    std::atomic<int64_t> copy {};
+    std::atomic<int64_t> inference {};
+};
+
+
+// adds its lifetime to "total"
+struct ScopedTimer {
+    std::atomic<int64_t> & total;
+    std::chrono::steady_clock::time_point start { std::chrono::steady_clock::now() };
+
+    ~ScopedTimer() {
+        auto elapsed = std::chrono::steady_clock::now() - start;
+        total.fetch_add(
+            std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed).count(),
+            std::memory_order_relaxed
+        );
+    }
+};
+
+
+// records its lifetime as an event of the timeline if tracing is enabled,
+// on the track of the calling thread as openvino schedules the inference
+// requests on its own streams
+struct TraceScope {
+    const char * name;
+    int frame;
+    int tile = -1;
+    int tid { traceThreadId() };
+    int64_t begin { traceEnabled() ? traceNow() : -1 };
+
+    ~TraceScope() {
+        if (begin >= 0) {
+            traceEvent(name, begin, traceNow(), tid, frame, tile);
+        }
+    }
+};
+
+
+// openvino schedules the inference requests on its own streams,
+// so there is no stream index to report
+static void setFrameStats(
+    VSMap * props,
+    const FrameStats & stats,
+    int num_tiles,
+    const VSAPI * vsapi
+) {
+
+    const auto seconds = [](const std::atomic<int64_t> & time) {
+        return static_cast<double>(time.load(std::memory_order_relaxed)) / 1e9;
+    };
+
+    vsapi->propSetFloat(props, "MLRTWaitTime", seconds(stats.wait), paReplace);
+    vsapi->propSetFloat(props, "MLRTCopyTime", seconds(stats.copy), paReplace);
+    vsapi->propSetFloat(props, "MLRTInferenceTime", seconds(stats.inference), paReplace);
+    vsapi->propSetInt(props, "MLRTTiles", num_tiles, paReplace);
+}
+
+
+// frames collected from concurrent requests into a single batched inference
+struct TemporalBatch {
+    struct Member {
+        std::vector<const uint8_t *> src_ptrs;
+        int src_stride;
+        std::array<uint8_t *, 3> dst_ptrs;
+        int dst_stride;
+    };
+
+    size_t size; // frames of the group, the batch runs once they are all members
+    std::vector<Member> members;
+    std::condition_variable cv;
+    bool done {};
+    std::optional<std::string> error;
+
+    // shared by the members
+    FrameStats stats;
+    std::chrono::steady_clock::time_point run_start;
+};
+
+
+// shape of the last column or row of tiles that differs from the tile size,
+// run by a network reshaped to it
+struct EdgeNetwork {
+    int tile_w;
+    int tile_h;
+    size_t batch_size;
+    InferenceEngine::ExecutableNetwork executable_network;
+    std::vector<InferenceEngine::InferRequest> spare_infer_requests;
+};
+
+
+// tiles of a frame sharing a shape, as indices into the column and row spans
+struct TileGroup {
+    std::vector<std::array<size_t, 2>> tiles;
+    int tile_w;
+    int tile_h;
+    size_t batch_size;
+};
+
+
 struct OVData {
     std::vector<VSNodeRef *> nodes;
     std::unique_ptr<VSVideoInfo> out_vi;
 
     int overlap_w, overlap_h;
 
+    int tile_multiple; // positive if edge tiles are shrunk
+    std::vector<EdgeNetwork> edge_networks;
+    std::mutex edge_infer_requests_lock;
+
+    bool pipeline;
+
+    bool stats; // attaches FrameStats as frame properties
+
+    DedupCache * dedup_cache; // reuses the outputs of recent inputs if set
+    ResultCache * result_cache; // stores the outputs on disk if set
+
+    // tiles of a single color take the output of a constant tile and
+    // the borders of that color are cropped, if set
+    FlatTiles * flat_tiles;
+    bool skip_flat_tiles;
+    bool auto_crop;
+
+    bool temporal_batching;
+    size_t batch_size;
+    std::chrono::milliseconds max_batch_wait;
+    std::mutex batch_lock;
+    // batches accepting new members by group of consecutive frames,
+    // i.e. by n / batch_size
+    std::unordered_map<int, std::shared_ptr<TemporalBatch>> open_batches;
+
     InferenceEngine::Core core;
     InferenceEngine::ExecutableNetwork executable_network;
     std::unordered_map<std::thread::id, InferenceEngine::InferRequest> infer_requests;
+    std::unordered_map<std::thread::id, InferenceEngine::InferRequest> pipeline_infer_requests;
     std::shared_mutex infer_requests_lock;
 
+    // inference requests lent to frames with more batches than the
+    // inference request of their thread can process at a time
+    std::vector<InferenceEngine::InferRequest> spare_infer_requests;
+    std::mutex spare_infer_requests_lock;
+
     std::string input_name;
     std::string output_name;
 };
 
 
+// processes the frames of a closed temporal batch, one frame per batch entry
+[[nodiscard]]
+static std::optional<std::string> runTemporalBatch(
+    OVData * d,
+    InferenceEngine::InferRequest & infer_request,
+    const std::vector<TemporalBatch::Member> & members,
+    FrameStats & stats,
+    int n
+) {
+
+    auto src_tile_shape = getShape(d->executable_network, true);
+    auto src_tile_w_bytes = src_tile_shape[3] * static_cast<int>(sizeof(float));
+    auto src_tile_bytes = src_tile_shape[2] * src_tile_w_bytes;
+
+    auto dst_tile_shape = getShape(d->executable_network, false);
+    auto dst_tile_w_bytes = dst_tile_shape[3] * static_cast<int>(sizeof(float));
+    auto dst_tile_bytes = dst_tile_shape[2] * dst_tile_w_bytes;
+    auto dst_planes = dst_tile_shape[1];
+
+    try {
+        {
+            ScopedTimer timer { stats.copy };
+            TraceScope trace { "pack", n };
+
+            InferenceEngine::Blob::Ptr input = infer_request.GetBlob(d->input_name);
+
+            auto minput = input->as<InferenceEngine::MemoryBlob>();
+            auto minputHolder = minput->wmap();
+            uint8_t * input_buffer = minputHolder.as<uint8_t *>();
+
+            for (const auto & member : members) {
+                for (const auto & src_ptr : member.src_ptrs) {
+                    vs_bitblt(
+                        input_buffer, src_tile_w_bytes,
+                        src_ptr, member.src_stride,
+                        src_tile_w_bytes, src_tile_shape[2]
+                    );
+                    input_buffer += src_tile_bytes;
+                }
+            }
+        }
+
+        {
+            ScopedTimer timer { stats.inference };
+            TraceScope trace { "infer", n };
+            infer_request.Infer();
+        }
+
+        {
+            ScopedTimer timer { stats.copy };
+            TraceScope trace { "unpack", n };
+
+            InferenceEngine::Blob::CPtr output = infer_request.GetBlob(d->output_name);
+
+            auto moutput = output->as<const InferenceEngine::MemoryBlob>();
+            auto moutputHolder = moutput->rmap();
+            const uint8_t * output_buffer = moutputHolder.as<const uint8_t *>();
+
+            for (const auto & member : members) {
+                for (int plane = 0; plane < dst_planes; ++plane) {
+                    vs_bitblt(
+                        member.dst_ptrs[plane], member.dst_stride,
+                        output_buffer, dst_tile_w_bytes,
+                        dst_tile_w_bytes, dst_tile_shape[2]
+                    );
+                    output_buffer += dst_tile_bytes;
+                }
+            }
+        }
+    } catch (const InferenceEngine::Exception & e) {
+        return "[IE exception] Inference: "s + e.what();
+    } catch (const std::exception& e) {
+        return "[Standard exception] Inference: "s + e.what();
+    }
+
+    return {};
+}
+
+
 static void VS_CC vsOvInit(
     VSMap *in,
     VSMap *out,
@@ -309,6 +747,45 @@ static void VS_CC vsOvInit(
 }
 
 
+// inference requests running the batches of a frame, including the spare
+// requests borrowed from the filter instance
+//
+// finish() waits for the requests that are still running, as they may write
+// into the output frame, and returns the borrowed requests to the spare pool,
+// so it has to be called before the frames are freed on every exit path
+struct FrameRequests {
+    OVData * d;
+    std::vector<InferenceEngine::InferRequest> borrowed;
+    std::vector<InferenceEngine::InferRequest *> requests;
+    std::vector<bool> running;
+
+    void finish() noexcept {
+        for (size_t i = 0; i < std::size(running); ++i) {
+            if (running[i]) {
+                try {
+                    requests[i]->Wait(InferenceEngine::InferRequest::WaitMode::RESULT_READY);
+                } catch (...) {
+                    // the error is reported by the caller
+                }
+                running[i] = false;
+            }
+        }
+
+        if (!borrowed.empty()) {
+            std::lock_guard _ { d->spare_infer_requests_lock };
+            for (auto & request : borrowed) {
+                d->spare_infer_requests.emplace_back(std::move(request));
+            }
+            borrowed.clear();
+        }
+    }
+
+    ~FrameRequests() {
+        finish();
+    }
+};
+
+
 static const VSFrameRef *VS_CC vsOvGetFrame(
     int n,
     int activationReason,
@@ -343,6 +820,7 @@ static const VSFrameRef *VS_CC vsOvGetFrame(
         auto src_height = vsapi->getFrameHeight(src_frames.front(), 0);
         auto src_bytes = vsapi->getFrameFormat(src_frames.front())->bytesPerSample;
         auto src_tile_shape = getShape(d->executable_network, true);
+        auto batch_size = static_cast<size_t>(src_tile_shape[0]);
         auto src_tile_h = src_tile_shape[2];
         auto src_tile_w = src_tile_shape[3];
         auto src_tile_w_bytes = src_tile_w * src_bytes;
@@ -397,10 +875,14 @@ static const VSFrameRef *VS_CC vsOvGetFrame(
         auto thread_id = std::this_thread::get_id();
         bool initialized = true;
         InferenceEngine::InferRequest * infer_request;
+        InferenceEngine::InferRequest * pipeline_infer_request = nullptr;
 
         d->infer_requests_lock.lock_shared();
         try {
             infer_request = &d->infer_requests.at(thread_id);
+            if (d->pipeline) {
+                pipeline_infer_request = &d->pipeline_infer_requests.at(thread_id);
+            }
         } catch (const std::out_of_range &) {
             initialized = false;
         }
@@ -410,24 +892,201 @@ static const VSFrameRef *VS_CC vsOvGetFrame(
             std::lock_guard _ { d->infer_requests_lock };
             try {
                 d->infer_requests.emplace(thread_id, d->executable_network.CreateInferRequest());
+                if (d->pipeline) {
+                    d->pipeline_infer_requests.emplace(thread_id, d->executable_network.CreateInferRequest());
+                }
             } catch (const InferenceEngine::Exception& e) {
                 return set_error("[IE exception] Create inference request: "s + e.what());
             } catch (const std::exception& e) {
                 return set_error("[Standard exception] Create inference request: "s + e.what());
             }
             infer_request = &d->infer_requests[thread_id];
+            if (d->pipeline) {
+                pipeline_infer_request = &d->pipeline_infer_requests[thread_id];
+            }
+        }
+
+        if (d->temporal_batching) {
+            TemporalBatch::Member member { src_ptrs, src_stride, dst_ptrs, dst_stride };
+
+            const auto enqueue_time = std::chrono::steady_clock::now();
+
+            std::shared_ptr<TemporalBatch> batch;
+            bool is_leader;
+            {
+                TraceScope trace { "collect", n };
+                std::unique_lock lock { d->batch_lock };
+
+                // a batch holds the frames of its group only, so that
+                // e.g. the timesteps of a frame pair are run together
+                const int group = n / static_cast<int>(d->batch_size);
+
+                auto & open_batch = d->open_batches[group];
+                is_leader = !open_batch;
+                if (is_leader) {
+                    open_batch = std::make_shared<TemporalBatch>();
+
+                    // the last group of the clip may be smaller
+                    const auto first = static_cast<size_t>(group) * d->batch_size;
+                    open_batch->size = std::min(d->batch_size, static_cast<size_t>(d->out_vi->numFrames) - first);
+                }
+                batch = open_batch;
+
+                batch->members.emplace_back(std::move(member));
+                if (std::size(batch->members) == batch->size) {
+                    d->open_batches.erase(group);
+                    batch->cv.notify_all();
+                }
+
+                if (is_leader) {
+                    // the first frame of a batch waits for the other frames
+                    // of its group until the batch is full or the wait times out
+                    batch->cv.wait_for(lock, d->max_batch_wait, [&] {
+                        return std::size(batch->members) == batch->size;
+                    });
+
+                    auto iter = d->open_batches.find(group);
+                    if (iter != std::end(d->open_batches) && iter->second == batch) {
+                        d->open_batches.erase(iter);
+                    }
+                } else {
+                    batch->cv.wait(lock, [&] { return batch->done; });
+                }
+            }
+
+            if (is_leader) {
+                // the inference request of the leading thread serves the whole batch
+                batch->run_start = std::chrono::steady_clock::now();
+                std::optional<std::string> err;
+                {
+                    TraceScope trace { "frame", n };
+                    err = runTemporalBatch(d, *infer_request, batch->members, batch->stats, n);
+                }
+
+                {
+                    std::lock_guard lock { d->batch_lock };
+                    batch->error = std::move(err);
+                    batch->done = true;
+                }
+                batch->cv.notify_all();
+            }
+
+            if (batch->error.has_value()) {
+                return set_error(batch->error.value());
+            }
+
+            if (d->stats) {
+                // the wait includes the time to collect the batch
+                FrameStats stats;
+                stats.wait = std::chrono::duration_cast<std::chrono::nanoseconds>(
+                    batch->run_start - enqueue_time
+                ).count();
+                stats.copy = batch->stats.copy.load();
+                stats.inference = batch->stats.inference.load();
+                setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, 1, vsapi);
+            }
+
+            for (const auto & frame : src_frames) {
+                vsapi->freeFrame(frame);
+            }
+
+            return dst_frame;
         }
 
-        int y = 0;
-        while (true) {
-            int y_crop_start = (y == 0) ? 0 : d->overlap_h;
-            int y_crop_end = (y == src_height - src_tile_h) ? 0 : d->overlap_h;
+        FrameStats stats;
+
+        TraceScope frame_trace { "frame", n };
+
+        // the tiles cover the active area of the frame with a margin of the
+        // overlap, whose output is dropped, and the borders of the active
+        // area are filled with the output of a constant tile of their color
+        std::array<int, 4> area { 0, 0, src_width, src_height };
+        std::array<int, 4> kept_area = area;
+        if (d->auto_crop) {
+            kept_area = getActiveArea(d->flat_tiles, src_ptrs, src_stride, src_width, src_height);
+            area = getCropArea(
+                kept_area, src_width, src_height,
+                static_cast<int>(src_tile_w), static_cast<int>(src_tile_h),
+                d->overlap_w, d->overlap_h
+            );
+        }
+        const bool cropped = area[2] != src_width || area[3] != src_height;
+        if (!cropped) {
+            kept_area = area;
+        }
 
-            int x = 0;
-            while (true) {
-                int x_crop_start = (x == 0) ? 0 : d->overlap_w;
-                int x_crop_end = (x == src_width - src_tile_w) ? 0 : d->overlap_w;
+        auto x_spans = getTileSpans(area[2], src_tile_w, step_w, d->tile_multiple);
+        for (auto & span : x_spans) {
+            span[0] += area[0];
+        }
+        auto y_spans = getTileSpans(area[3], src_tile_h, step_h, d->tile_multiple);
+        for (auto & span : y_spans) {
+            span[0] += area[1];
+        }
+        auto x_crops = getTileCrops(x_spans, d->overlap_w, w_scale);
+        auto y_crops = getTileCrops(y_spans, d->overlap_h, h_scale);
+        if (cropped) {
+            x_crops.front()[0] += w_scale * (kept_area[0] - area[0]);
+            x_crops.back()[1] += w_scale * (area[0] + area[2] - kept_area[0] - kept_area[2]);
+            y_crops.front()[0] += h_scale * (kept_area[1] - area[1]);
+            y_crops.back()[1] += h_scale * (area[1] + area[3] - kept_area[1] - kept_area[3]);
+        }
 
+        // the tiles of the tile size come first, followed by a group per edge shape
+        std::vector<TileGroup> tile_groups(1 + std::size(d->edge_networks));
+        tile_groups[0].tile_w = src_tile_w;
+        tile_groups[0].tile_h = src_tile_h;
+        tile_groups[0].batch_size = batch_size;
+        for (size_t i = 0; i < std::size(d->edge_networks); ++i) {
+            tile_groups[i + 1].tile_w = d->edge_networks[i].tile_w;
+            tile_groups[i + 1].tile_h = d->edge_networks[i].tile_h;
+            tile_groups[i + 1].batch_size = d->edge_networks[i].batch_size;
+        }
+        for (size_t iy = 0; iy < std::size(y_spans); ++iy) {
+            for (size_t ix = 0; ix < std::size(x_spans); ++ix) {
+                for (auto & group : tile_groups) {
+                    if (group.tile_w == x_spans[ix][1] && group.tile_h == y_spans[iy][1]) {
+                        group.tiles.push_back({ ix, iy });
+                        break;
+                    }
+                }
+            }
+        }
+
+        // tiles of the tile size whose samples share a color are not run
+        std::vector<std::pair<std::array<size_t, 2>, std::vector<float>>> flat_tiles;
+        if (d->skip_flat_tiles) {
+            auto & tiles = tile_groups[0].tiles;
+            auto kept = std::begin(tiles);
+            for (const auto & tile : tiles) {
+                auto color = getFlatColor(
+                    d->flat_tiles, src_ptrs, src_stride,
+                    x_spans[tile[0]][0], y_spans[tile[1]][0], src_tile_w, src_tile_h
+                );
+                if (color.has_value()) {
+                    flat_tiles.emplace_back(tile, std::move(color.value()));
+                } else {
+                    *kept++ = tile;
+                }
+            }
+            tiles.erase(kept, std::end(tiles));
+        }
+        const auto & tile_positions = tile_groups[0].tiles;
+
+        // runs a constant tile of a color on the request of this thread,
+        // the output is kept for the later tiles and borders of that color
+        const auto get_flat_response = [&](
+            const std::vector<float> & color
+        ) -> std::variant<std::string, std::shared_ptr<const std::vector<uint8_t>>> {
+
+            if (auto response = findFlatResponse(d->flat_tiles, color); response) {
+                return response;
+            }
+
+            ScopedTimer timer { stats.inference };
+            TraceScope trace { "flat", n };
+
+            try {
                 {
                     InferenceEngine::Blob::Ptr input = infer_request->GetBlob(d->input_name);
 
@@ -435,66 +1094,411 @@ static const VSFrameRef *VS_CC vsOvGetFrame(
                     auto minputHolder = minput->wmap();
                     uint8_t * input_buffer = minputHolder.as<uint8_t *>();
 
-                    for (const auto & _src_ptr : src_ptrs) {
-                        const uint8_t * src_ptr { _src_ptr +
-                            y * src_stride + x * src_bytes
-                        };
-
-                        vs_bitblt(
-                            input_buffer, src_tile_w_bytes,
-                            src_ptr, src_stride,
-                            src_tile_w_bytes, src_tile_h
-                        );
-
+                    for (const auto & value : color) {
+                        std::fill_n(reinterpret_cast<float *>(input_buffer), src_tile_h * src_tile_w, value);
                         input_buffer += src_tile_bytes;
                     }
                 }
 
+                infer_request->Infer();
+
+                InferenceEngine::Blob::CPtr output = infer_request->GetBlob(d->output_name);
+
+                auto moutput = output->as<const InferenceEngine::MemoryBlob>();
+                auto moutputHolder = moutput->rmap();
+                const uint8_t * output_buffer = moutputHolder.as<const uint8_t *>();
+
+                std::vector<uint8_t> response(output_buffer, output_buffer + dst_planes * dst_tile_bytes);
+                storeFlatResponse(d->flat_tiles, color, response);
+
+                return std::make_shared<const std::vector<uint8_t>>(std::move(response));
+            } catch (const InferenceEngine::Exception & e) {
+                return "[IE exception] Create inference request: "s + e.what();
+            } catch (const std::exception& e) {
+                return "[Standard exception] Create inference request: "s + e.what();
+            }
+        };
+
+        if (cropped) {
+            auto response = get_flat_response(getFlatColor(d->flat_tiles, src_ptrs, src_stride, 0, 0, 1, 1).value());
+            if (std::holds_alternative<std::string>(response)) {
+                return set_error(std::get<std::string>(response));
+            }
+
+            ScopedTimer timer { stats.copy };
+            fillOutsideArea(
+                std::vector<uint8_t *>(dst_ptrs.cbegin(), dst_ptrs.cbegin() + dst_planes), dst_stride,
+                d->out_vi->width, d->out_vi->height,
+                {
+                    w_scale * kept_area[0], h_scale * kept_area[1],
+                    w_scale * kept_area[2], h_scale * kept_area[3]
+                },
+                *std::get<std::shared_ptr<const std::vector<uint8_t>>>(response),
+                dst_tile_w, dst_tile_h
+            );
+        }
+
+        for (const auto & [tile, color] : flat_tiles) {
+            auto response = get_flat_response(color);
+            if (std::holds_alternative<std::string>(response)) {
+                return set_error(std::get<std::string>(response));
+            }
+
+            ScopedTimer timer { stats.copy };
+
+            const auto [ix, iy] = tile;
+            const auto x = x_spans[ix][0];
+            const auto y = y_spans[iy][0];
+            const auto [y_crop_start, y_crop_end] = y_crops[iy];
+            const auto [x_crop_start, x_crop_end] = x_crops[ix];
+
+            const uint8_t * response_ptr = std::data(*std::get<std::shared_ptr<const std::vector<uint8_t>>>(response));
+            for (int plane = 0; plane < dst_planes; ++plane) {
+                uint8_t * dst_ptr = (dst_ptrs[plane] +
+                    h_scale * y * dst_stride + w_scale * x * dst_bytes
+                );
+
+                vs_bitblt(
+                    dst_ptr + (y_crop_start * dst_stride + x_crop_start * dst_bytes),
+                    dst_stride,
+                    response_ptr + (y_crop_start * dst_tile_w_bytes + x_crop_start * dst_bytes),
+                    dst_tile_w_bytes,
+                    dst_tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
+                    dst_tile_h - (y_crop_start + y_crop_end)
+                );
+
+                response_ptr += dst_tile_bytes;
+            }
+        }
+
+        const int num_tiles = static_cast<int>(std::size(x_spans) * std::size(y_spans) - std::size(flat_tiles));
+
+        // each inference processes up to "batch_size" tiles packed along the batch dimension
+        const auto pack_batch = [&](
+            InferenceEngine::InferRequest & request,
+            const TileGroup & group,
+            size_t batch_start
+        ) {
+
+            const size_t batch_end = std::min(batch_start + group.batch_size, std::size(group.tiles));
+
+            const int tile_w_bytes = group.tile_w * src_bytes;
+            const int tile_bytes = group.tile_h * tile_w_bytes;
+
+            ScopedTimer timer { stats.copy };
+            TraceScope trace { "pack", n, static_cast<int>(batch_start) };
+
+            InferenceEngine::Blob::Ptr input = request.GetBlob(d->input_name);
+
+            auto minput = input->as<InferenceEngine::MemoryBlob>();
+            auto minputHolder = minput->wmap();
+            uint8_t * input_buffer = minputHolder.as<uint8_t *>();
+
+            for (size_t i = batch_start; i < batch_end; ++i) {
+                const auto x = x_spans[group.tiles[i][0]][0];
+                const auto y = y_spans[group.tiles[i][1]][0];
+
+                for (const auto & _src_ptr : src_ptrs) {
+                    const uint8_t * src_ptr { _src_ptr +
+                        y * src_stride + x * src_bytes
+                    };
+
+                    vs_bitblt(
+                        input_buffer, tile_w_bytes,
+                        src_ptr, src_stride,
+                        tile_w_bytes, group.tile_h
+                    );
+
+                    input_buffer += tile_bytes;
+                }
+            }
+        };
+
+        const auto unpack_batch = [&](
+            InferenceEngine::InferRequest & request,
+            const TileGroup & group,
+            size_t batch_start
+        ) {
+
+            const size_t batch_end = std::min(batch_start + group.batch_size, std::size(group.tiles));
+
+            const int tile_h = group.tile_h * h_scale;
+            const int tile_w_bytes = group.tile_w * w_scale * dst_bytes;
+            const int tile_bytes = tile_h * tile_w_bytes;
+
+            ScopedTimer timer { stats.copy };
+            TraceScope trace { "unpack", n, static_cast<int>(batch_start) };
+
+            InferenceEngine::Blob::CPtr output = request.GetBlob(d->output_name);
+
+            auto moutput = output->as<const InferenceEngine::MemoryBlob>();
+            auto moutputHolder = moutput->rmap();
+            const uint8_t * output_buffer = moutputHolder.as<const uint8_t *>();
+
+            for (size_t i = batch_start; i < batch_end; ++i) {
+                const auto [ix, iy] = group.tiles[i];
+                const auto x = x_spans[ix][0];
+                const auto y = y_spans[iy][0];
+
+                const auto y_crop_start = y_crops[iy][0];
+                const auto y_crop_end = y_crops[iy][1];
+                const auto x_crop_start = x_crops[ix][0];
+                const auto x_crop_end = x_crops[ix][1];
+
+                for (int plane = 0; plane < dst_planes; ++plane) {
+                    uint8_t * dst_ptr = (dst_ptrs[plane] +
+                        h_scale * y * dst_stride + w_scale * x * dst_bytes
+                    );
+
+                    vs_bitblt(
+                        dst_ptr + (y_crop_start * dst_stride + x_crop_start * dst_bytes),
+                        dst_stride,
+                        output_buffer + (y_crop_start * tile_w_bytes + x_crop_start * dst_bytes),
+                        tile_w_bytes,
+                        tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
+                        tile_h - (y_crop_start + y_crop_end)
+                    );
+
+                    output_buffer += tile_bytes;
+                }
+            }
+        };
+
+        // a frame processed in a single tile is wrapped into the blobs of the
+        // request when its planes are laid out as the tensor, which saves the copies
+        if (std::size(x_spans) * std::size(y_spans) == 1 && num_tiles == 1 && !cropped) {
+            const std::vector<const uint8_t *> dst_plane_ptrs(dst_ptrs.cbegin(), dst_ptrs.cbegin() + dst_planes);
+            bool bind_input = isContiguous(src_ptrs, src_stride, src_tile_w_bytes, src_tile_h);
+            bool bind_output = isContiguous(dst_plane_ptrs, dst_stride, dst_tile_w_bytes, dst_tile_h);
+
+            if (bind_input || bind_output) {
+                InferenceEngine::Blob::Ptr input;
+                InferenceEngine::Blob::Ptr output;
+                std::optional<std::string> err;
+
                 try {
-                    infer_request->Infer();
+                    input = infer_request->GetBlob(d->input_name);
+                    output = infer_request->GetBlob(d->output_name);
+
+                    if (bind_input) {
+                        infer_request->SetBlob(d->input_name, InferenceEngine::make_shared_blob<float>(
+                            input->getTensorDesc(),
+                            reinterpret_cast<float *>(const_cast<uint8_t *>(src_ptrs.front()))
+                        ));
+                    } else {
+                        ScopedTimer timer { stats.copy };
+                        TraceScope trace { "pack", n, 0 };
+
+                        auto minput = input->as<InferenceEngine::MemoryBlob>();
+                        auto minputHolder = minput->wmap();
+                        uint8_t * input_buffer = minputHolder.as<uint8_t *>();
+
+                        for (const auto & src_ptr : src_ptrs) {
+                            vs_bitblt(
+                                input_buffer, src_tile_w_bytes,
+                                src_ptr, src_stride,
+                                src_tile_w_bytes, src_tile_h
+                            );
+
+                            input_buffer += src_tile_bytes;
+                        }
+                    }
+
+                    if (bind_output) {
+                        infer_request->SetBlob(d->output_name, InferenceEngine::make_shared_blob<float>(
+                            output->getTensorDesc(),
+                            reinterpret_cast<float *>(dst_ptrs[0])
+                        ));
+                    }
+
+                    {
+                        ScopedTimer timer { stats.inference };
+                        TraceScope trace { "infer", n, 0 };
+                        infer_request->Infer();
+                    }
+
+                    if (!bind_output) {
+                        ScopedTimer timer { stats.copy };
+                        TraceScope trace { "unpack", n, 0 };
+
+                        auto moutput = output->as<const InferenceEngine::MemoryBlob>();
+                        auto moutputHolder = moutput->rmap();
+                        const uint8_t * output_buffer = moutputHolder.as<const uint8_t *>();
+
+                        for (int plane = 0; plane < dst_planes; ++plane) {
+                            vs_bitblt(
+                                dst_ptrs[plane], dst_stride,
+                                output_buffer, dst_tile_w_bytes,
+                                dst_tile_w_bytes, dst_tile_h
+                            );
+
+                            output_buffer += dst_tile_bytes;
+                        }
+                    }
                 } catch (const InferenceEngine::Exception & e) {
-                    return set_error("[IE exception] Create inference request: "s + e.what());
+                    err = "[IE exception] Create inference request: "s + e.what();
                 } catch (const std::exception& e) {
-                    return set_error("[Standard exception] Create inference request: "s + e.what());
+                    err = "[Standard exception] Create inference request: "s + e.what();
                 }
 
-                {
-                    InferenceEngine::Blob::CPtr output = infer_request->GetBlob(d->output_name);
-
-                    auto moutput = output->as<const InferenceEngine::MemoryBlob>();
-                    auto moutputHolder = moutput->rmap();
-                    const uint8_t * output_buffer = moutputHolder.as<const uint8_t *>();
-
-                    for (int plane = 0; plane < dst_planes; ++plane) {
-                        uint8_t * dst_ptr = (dst_ptrs[plane] +
-                            h_scale * y * dst_stride + w_scale * x * dst_bytes
-                        );
-
-                        vs_bitblt(
-                            dst_ptr + (y_crop_start * dst_stride + x_crop_start * dst_bytes),
-                            dst_stride,
-                            output_buffer + (y_crop_start * dst_tile_w_bytes + x_crop_start * dst_bytes),
-                            dst_tile_w_bytes,
-                            dst_tile_w_bytes - (x_crop_start + x_crop_end) * dst_bytes,
-                            dst_tile_h - (y_crop_start + y_crop_end)
-                        );
-
-                        output_buffer += dst_tile_bytes;
+                // the request must not refer to the frames after they are released
+                try {
+                    if (bind_input && input) {
+                        infer_request->SetBlob(d->input_name, input);
                     }
+                    if (bind_output && output) {
+                        infer_request->SetBlob(d->output_name, output);
+                    }
+                } catch (const InferenceEngine::Exception & e) {
+                    err = "[IE exception] Create inference request: "s + e.what();
+                } catch (const std::exception& e) {
+                    err = "[Standard exception] Create inference request: "s + e.what();
+                }
+
+                if (err.has_value()) {
+                    return set_error(err.value());
+                }
+
+                if (d->stats) {
+                    setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, 1, vsapi);
+                }
+
+                for (const auto & frame : src_frames) {
+                    vsapi->freeFrame(frame);
+                }
+
+                return dst_frame;
+            }
+        }
+
+        const size_t num_batches = (std::size(tile_positions) + batch_size - 1) / batch_size;
+
+        // spare inference requests run concurrently with the one of this
+        // thread, so that a single frame may use all of the streams
+        FrameRequests frame_requests { d };
+        {
+            std::lock_guard _ { d->spare_infer_requests_lock };
+            while (std::size(frame_requests.borrowed) + (d->pipeline ? 2 : 1) < num_batches && !d->spare_infer_requests.empty()) {
+                frame_requests.borrowed.emplace_back(std::move(d->spare_infer_requests.back()));
+                d->spare_infer_requests.pop_back();
+            }
+        }
+
+        auto & requests = frame_requests.requests;
+        requests.push_back(infer_request);
+        if (pipeline_infer_request) {
+            requests.push_back(pipeline_infer_request);
+        }
+        for (auto & request : frame_requests.borrowed) {
+            requests.push_back(&request);
+        }
+        frame_requests.running.resize(std::size(requests));
+
+        const auto set_batch_error = [&](const std::string & error_message) {
+            frame_requests.finish();
+            return set_error(error_message);
+        };
+
+        // batches are assigned to the requests in turn, and a request is
+        // waited for only when it receives its next batch, so that packing
+        // and unpacking overlap with the inference of the other requests
+        const auto finish_batch = [&](size_t batch) -> std::optional<std::string> {
+            auto request = requests[batch % std::size(requests)];
+
+            try {
+                // counts the part of the asynchronous inference that is not overlapped
+                ScopedTimer timer { stats.inference };
+                TraceScope trace { "infer", n, static_cast<int>(batch * batch_size) };
+                frame_requests.running[batch % std::size(requests)] = false;
+                request->Wait(InferenceEngine::InferRequest::WaitMode::RESULT_READY);
+            } catch (const InferenceEngine::Exception & e) {
+                return "[IE exception] Create inference request: "s + e.what();
+            } catch (const std::exception& e) {
+                return "[Standard exception] Create inference request: "s + e.what();
+            }
+
+            unpack_batch(*request, tile_groups[0], batch * batch_size);
+
+            return {};
+        };
+
+        for (size_t batch = 0; batch < num_batches; ++batch) {
+            auto request = requests[batch % std::size(requests)];
+
+            // a request is reused once its previous batch is written back
+            if (batch >= std::size(requests)) {
+                if (auto err = finish_batch(batch - std::size(requests)); err.has_value()) {
+                    return set_batch_error(err.value());
+                }
+            }
+
+            pack_batch(*request, tile_groups[0], batch * batch_size);
+
+            try {
+                request->StartAsync();
+                frame_requests.running[batch % std::size(requests)] = true;
+            } catch (const InferenceEngine::Exception & e) {
+                return set_batch_error("[IE exception] Create inference request: "s + e.what());
+            } catch (const std::exception& e) {
+                return set_batch_error("[Standard exception] Create inference request: "s + e.what());
+            }
+        }
+
+        // the tiles of the edge shapes run while the last batches are in flight
+        for (size_t i = 1; i < std::size(tile_groups); ++i) {
+            const auto & group = tile_groups[i];
+            auto & edge_network = d->edge_networks[i - 1];
+
+            std::optional<InferenceEngine::InferRequest> request;
+            {
+                std::lock_guard _ { d->edge_infer_requests_lock };
+                if (!edge_network.spare_infer_requests.empty()) {
+                    request = std::move(edge_network.spare_infer_requests.back());
+                    edge_network.spare_infer_requests.pop_back();
+                }
+            }
+
+            std::optional<std::string> err;
+            try {
+                if (!request.has_value()) {
+                    request = edge_network.executable_network.CreateInferRequest();
                 }
 
-                if (x + src_tile_w == src_width) {
-                    break;
+                for (size_t batch_start = 0; batch_start < std::size(group.tiles); batch_start += group.batch_size) {
+                    pack_batch(request.value(), group, batch_start);
+                    {
+                        ScopedTimer timer { stats.inference };
+                        TraceScope trace { "infer", n, static_cast<int>(batch_start) };
+                        request->Infer();
+                    }
+                    unpack_batch(request.value(), group, batch_start);
                 }
+            } catch (const InferenceEngine::Exception & e) {
+                err = "[IE exception] Create inference request: "s + e.what();
+            } catch (const std::exception& e) {
+                err = "[Standard exception] Create inference request: "s + e.what();
+            }
 
-                x = std::min(x + step_w, src_width - src_tile_w);
+            if (request.has_value()) {
+                std::lock_guard _ { d->edge_infer_requests_lock };
+                edge_network.spare_infer_requests.emplace_back(std::move(request.value()));
             }
 
-            if (y + src_tile_h == src_height) {
-                break;
+            if (err.has_value()) {
+                return set_batch_error(err.value());
             }
+        }
 
-            y = std::min(y + step_h, src_height - src_tile_h);
+        for (size_t batch = num_batches - std::min(num_batches, std::size(requests)); batch < num_batches; ++batch) {
+            if (auto err = finish_batch(batch); err.has_value()) {
+                return set_batch_error(err.value());
+            }
+        }
+
+        frame_requests.finish();
+
+        if (d->stats) {
+            setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, num_tiles, vsapi);
         }
 
         for (const auto & frame : src_frames) {
@@ -508,6 +1512,45 @@ static const VSFrameRef *VS_CC vsOvGetFrame(
 }
 
 
+// runs the network only for inputs that differ from the recent ones
+// and whose outputs are not stored in the result cache
+static const VSFrameRef *VS_CC vsOvGetFrameCached(
+    int n,
+    int activationReason,
+    void **instanceData,
+    void **frameData,
+    VSFrameContext *frameCtx,
+    VSCore *core,
+    const VSAPI *vsapi
+) {
+
+    OVData * d = static_cast<OVData *>(*instanceData);
+
+    if (activationReason == arAllFramesReady) {
+        const std::function<const VSFrameRef * ()> process = [&] {
+            return vsOvGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+        };
+
+        const std::function<const VSFrameRef * ()> cached = [&] {
+            if (d->result_cache) {
+                return resultCacheGetFrame(
+                    d->result_cache, n, d->nodes, d->out_vi.get(), d->stats,
+                    frameCtx, core, vsapi, process
+                );
+            }
+            return process();
+        };
+
+        if (d->dedup_cache) {
+            return dedupGetFrame(d->dedup_cache, n, d->nodes, d->stats, frameCtx, core, vsapi, cached);
+        }
+        return cached();
+    }
+
+    return vsOvGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+}
+
+
 static void VS_CC vsOvFree(
     void *instanceData,
     VSCore *core,
@@ -516,6 +1559,10 @@ static void VS_CC vsOvFree(
 
     OVData * d = static_cast<OVData *>(instanceData);
 
+    dedupFree(d->dedup_cache, vsapi);
+    resultCacheFree(d->result_cache);
+    flatTilesFree(d->flat_tiles);
+
     for (const auto & node : d->nodes) {
         vsapi->freeNode(node);
     }
@@ -610,6 +1657,149 @@ static void VS_CC vsOvCreate(
     if (tile_w - 2 * d->overlap_w <= 0 || tile_h - 2 * d->overlap_h <= 0) {
         return set_error("\"overlap\" too large");
     }
+    if (tile_w > static_cast<size_t>(in_vis.front()->width) || tile_h > static_cast<size_t>(in_vis.front()->height)) {
+        return set_error("tile size larger than clip dimension");
+    }
+
+    int batch_size = int64ToIntS(vsapi->propGetInt(in, "batch_size", 0, &error));
+    if (error) {
+        batch_size = 1;
+    }
+    if (batch_size <= 0) {
+        return set_error("\"batch_size\" must be positive");
+    }
+
+    d->pipeline = !!vsapi->propGetInt(in, "pipeline", 0, &error);
+    if (error) {
+        d->pipeline = false;
+    }
+
+    d->temporal_batching = !!vsapi->propGetInt(in, "temporal_batching", 0, &error);
+    if (error) {
+        d->temporal_batching = false;
+    }
+
+    d->stats = !!vsapi->propGetInt(in, "stats", 0, &error);
+    if (error) {
+        d->stats = false;
+    }
+
+    int dedup = int64ToIntS(vsapi->propGetInt(in, "dedup", 0, &error));
+    if (error) {
+        dedup = 0;
+    }
+    if (dedup < 0) {
+        return set_error("\"dedup\" must be non-negative");
+    }
+
+    auto dedup_threshold = static_cast<float>(vsapi->propGetFloat(in, "dedup_threshold", 0, &error));
+    if (error) {
+        dedup_threshold = 0.f;
+    }
+    if (dedup_threshold < 0.f) {
+        return set_error("\"dedup_threshold\" must be non-negative");
+    }
+
+    const char * result_cache_dir = vsapi->propGetData(in, "result_cache_dir", 0, &error);
+    if (error) {
+        result_cache_dir = "";
+    }
+
+    int64_t result_cache_size = vsapi->propGetInt(in, "result_cache_size", 0, &error);
+    if (error) {
+        result_cache_size = 10240;
+    }
+    if (result_cache_size < 0) {
+        return set_error("\"result_cache_size\" must be non-negative");
+    }
+
+    int max_batch_wait = int64ToIntS(vsapi->propGetInt(in, "max_batch_wait", 0, &error));
+    if (error) {
+        max_batch_wait = 10;
+    }
+    if (max_batch_wait < 0) {
+        return set_error("\"max_batch_wait\" must be non-negative");
+    }
+    d->max_batch_wait = std::chrono::milliseconds(max_batch_wait);
+
+    d->tile_multiple = int64ToIntS(vsapi->propGetInt(in, "tile_multiple", 0, &error));
+    if (error) {
+        d->tile_multiple = 0;
+    }
+    if (d->tile_multiple < 0) {
+        return set_error("\"tile_multiple\" must be non-negative");
+    }
+    if (d->tile_multiple > 0 && device != "CPU"s) {
+        return set_error("\"tile_multiple\" is only supported on CPU");
+    }
+
+    d->skip_flat_tiles = !!vsapi->propGetInt(in, "skip_flat_tiles", 0, &error);
+    if (error) {
+        d->skip_flat_tiles = false;
+    }
+
+    d->auto_crop = !!vsapi->propGetInt(in, "auto_crop", 0, &error);
+    if (error) {
+        d->auto_crop = false;
+    }
+
+    auto flat_tolerance = static_cast<float>(vsapi->propGetFloat(in, "flat_tolerance", 0, &error));
+    if (error) {
+        flat_tolerance = 0.f;
+    }
+    if (flat_tolerance < 0.f) {
+        return set_error("\"flat_tolerance\" must be non-negative");
+    }
+
+    if ((d->skip_flat_tiles || d->auto_crop) && d->temporal_batching) {
+        return set_error("\"skip_flat_tiles\" and \"auto_crop\" are not supported with \"temporal_batching\"");
+    }
+    if (d->auto_crop && d->tile_multiple > 0) {
+        return set_error("\"auto_crop\" is not supported with \"tile_multiple\"");
+    }
+    if (d->auto_crop && static_cast<int>(tile_w) >= in_vis.front()->width && static_cast<int>(tile_h) >= in_vis.front()->height) {
+        // the tiles cannot shrink to the active area
+        vsapi->logMessage(mtWarning, "vsOv: \"auto_crop\" has no effect when a tile covers the whole frame");
+        d->auto_crop = false;
+    }
+
+    const auto x_spans = getTileSpans(
+        in_vis.front()->width, static_cast<int>(tile_w),
+        static_cast<int>(tile_w - 2 * d->overlap_w), d->tile_multiple
+    );
+    const auto y_spans = getTileSpans(
+        in_vis.front()->height, static_cast<int>(tile_h),
+        static_cast<int>(tile_h - 2 * d->overlap_h), d->tile_multiple
+    );
+
+    // shapes of the tiles and their numbers, starting with the tile size
+    std::vector<std::array<int, 3>> tile_shapes;
+    for (const auto & [y, span_h] : y_spans) {
+        for (const auto & [x, span_w] : x_spans) {
+            auto iter = std::find_if(
+                std::begin(tile_shapes), std::end(tile_shapes),
+                [&](const auto & shape) { return shape[0] == span_w && shape[1] == span_h; }
+            );
+            if (iter == std::end(tile_shapes)) {
+                tile_shapes.push_back({ span_w, span_h, 1 });
+            } else {
+                (*iter)[2] += 1;
+            }
+        }
+    }
+    auto num_tiles = tile_shapes[0][2];
+
+    const int requested_batch_size = batch_size;
+    if (d->temporal_batching) {
+        // the batch is filled with frames from concurrent requests
+        if (std::size(x_spans) * std::size(y_spans) != 1) {
+            return set_error("\"temporal_batching\" requires a single tile per frame");
+        }
+    } else {
+        // a batch never spans more than one frame
+        batch_size = std::min(batch_size, num_tiles);
+    }
+    d->batch_size = static_cast<size_t>(batch_size);
 
     bool fp16 = !!vsapi->propGetInt(in, "fp16", 0, &error);
     if (error) {
@@ -642,15 +1832,8 @@ static void VS_CC vsOvCreate(
         path_view = path;
     }
 
-    auto result = loadONNX(path_view, tile_w, tile_h, path_is_serialization);
-    if (std::holds_alternative<std::string>(result)) {
-        return set_error(std::get<std::string>(result));
-    }
-
-    auto onnx_model = std::move(std::get<ONNX_NAMESPACE::ModelProto>(result));
-
+    std::unordered_set<std::string> fp16_blacklist_ops;
     if (fp16) {
-        std::unordered_set<std::string> fp16_blacklist_ops;
         int num = vsapi->propNumElements(in, "fp16_blacklist_ops");
         if (num == -1) {
             fp16_blacklist_ops = {
@@ -666,14 +1849,76 @@ static void VS_CC vsOvCreate(
                 fp16_blacklist_ops.emplace(vsapi->propGetData(in, "fp16_blacklist_ops", i, nullptr));
             }
         }
-        convert_float_to_float16(onnx_model, false, fp16_blacklist_ops);
     }
 
-    std::string onnx_data = onnx_model.SerializeAsString();
-    if (std::size(onnx_data) == 0) {
-        return set_error("proto serialization failed");
+    const char * cache_dir = vsapi->propGetData(in, "cache_dir", 0, &error);
+    if (error) {
+        cache_dir = "";
+    }
+
+    int64_t cache_size = vsapi->propGetInt(in, "cache_size", 0, &error);
+    if (error) {
+        cache_size = 2048;
+    }
+    if (cache_size < 0) {
+        return set_error("\"cache_size\" must be non-negative");
+    }
+
+    // the fp16-converted model is cached on top of the shape-specialized one
+    std::optional<std::string> cache_key;
+    std::string onnx_data;
+    if (fp16 && cache_dir[0] != '\0') {
+        std::vector<std::string> sorted_ops(
+            std::cbegin(fp16_blacklist_ops), std::cend(fp16_blacklist_ops)
+        );
+        std::sort(std::begin(sorted_ops), std::end(sorted_ops));
+
+        std::string description = (
+            "ov;"s + VERSION + ";" + ONNX_NAMESPACE::LAST_RELEASE_VERSION + ";" +
+            std::to_string(tile_w) + "x" + std::to_string(tile_h) + "x" +
+            std::to_string(batch_size) + ";fp16"
+        );
+        for (const auto & op : sorted_ops) {
+            description += ";" + op;
+        }
+
+        cache_key = getModelCacheKey(path_view, path_is_serialization, description);
+        if (cache_key.has_value()) {
+            if (auto cached = loadCachedModel(cache_dir, cache_key.value()); cached.has_value()) {
+                onnx_data = std::move(cached.value());
+            }
+        }
+    }
+
+    if (std::empty(onnx_data)) {
+        auto result = loadONNX(
+            path_view, tile_w, tile_h, path_is_serialization, batch_size,
+            cache_dir, static_cast<uint64_t>(cache_size) << 20
+        );
+        if (std::holds_alternative<std::string>(result)) {
+            return set_error(std::get<std::string>(result));
+        }
+
+        auto onnx_model = std::move(std::get<ONNX_NAMESPACE::ModelProto>(result));
+
+        if (fp16) {
+            convert_float_to_float16(onnx_model, false, fp16_blacklist_ops);
+        }
+
+        onnx_data = onnx_model.SerializeAsString();
+        if (std::size(onnx_data) == 0) {
+            return set_error("proto serialization failed");
+        }
+
+        if (cache_key.has_value()) {
+            storeCachedModel(
+                cache_dir, cache_key.value(), onnx_data,
+                static_cast<uint64_t>(cache_size) << 20
+            );
+        }
     }
 
+    std::string precision_config;
     {
         InferenceEngine::CNNNetwork network;
         try {
@@ -685,7 +1930,7 @@ static void VS_CC vsOvCreate(
             return set_error("[Standard exception] ReadNetwork(): "s + e.what());
         }
 
-        if (auto err = checkNetwork(network); err.has_value()) {
+        if (auto err = checkNetwork(network, batch_size); err.has_value()) {
             return set_error(err.value());
         }
 
@@ -716,6 +1961,23 @@ static void VS_CC vsOvCreate(
         }
         auto & config = std::get<std::map<std::string, std::string>>(config_ret);
 
+        // precision hints change the outputs of the network
+        for (const auto & [key, value] : config) {
+            if (key.find("BF16") != std::string::npos || key.find("PRECISION") != std::string::npos) {
+                precision_config += key + "=" + value + ",";
+            }
+        }
+
+        // model caching is configured on the core instead of the device
+        if (auto iter = config.find("CACHE_DIR"); iter != std::end(config)) {
+            try {
+                d->core.SetConfig({{ iter->first, iter->second }});
+            } catch (const InferenceEngine::Exception & e) {
+                return set_error(e.what());
+            }
+            config.erase(iter);
+        }
+
         try {
             d->executable_network = d->core.LoadNetwork(network, device, config);
         } catch (const InferenceEngine::Exception & e) {
@@ -726,6 +1988,54 @@ static void VS_CC vsOvCreate(
             return set_error(err.value());
         }
 
+        // the last column and row of tiles are shrunk to their actual size
+        // and run by networks reshaped to their shapes
+        for (size_t i = 1; i < std::size(tile_shapes); ++i) {
+            const auto [edge_w, edge_h, num_edge_tiles] = tile_shapes[i];
+            const auto edge_batch_size = std::min(requested_batch_size, num_edge_tiles);
+
+            InferenceEngine::CNNNetwork edge_network;
+            try {
+                auto empty = InferenceEngine::Blob::CPtr();
+                edge_network = d->core.ReadNetwork(onnx_data, empty);
+
+                auto input_shapes = edge_network.getInputShapes();
+                auto & dims = input_shapes.begin()->second;
+                dims[0] = static_cast<size_t>(edge_batch_size);
+                dims[2] = static_cast<size_t>(edge_h);
+                dims[3] = static_cast<size_t>(edge_w);
+                edge_network.reshape(input_shapes);
+
+                auto edge_function = edge_network.getFunction(); // mutable
+                ov::pass::ConstantFolding().run_on_function(edge_function);
+            } catch (const InferenceEngine::Exception& e) {
+                return set_error(
+                    "[IE exception] reshape to " + std::to_string(edge_w) + "x" +
+                    std::to_string(edge_h) + ": " + e.what()
+                );
+            } catch (const std::exception& e) {
+                return set_error(
+                    "[Standard exception] reshape to " + std::to_string(edge_w) + "x" +
+                    std::to_string(edge_h) + ": " + e.what()
+                );
+            }
+
+            if (auto err = checkNetwork(edge_network, edge_batch_size); err.has_value()) {
+                return set_error(err.value());
+            }
+
+            try {
+                d->edge_networks.push_back({
+                    edge_w, edge_h,
+                    static_cast<size_t>(edge_batch_size),
+                    d->core.LoadNetwork(edge_network, device, config),
+                    {}
+                });
+            } catch (const InferenceEngine::Exception & e) {
+                return set_error(e.what());
+            }
+        }
+
         setDimensions(d->out_vi, d->executable_network, core, vsapi);
 
         d->input_name = d->executable_network.GetInputsInfo().cbegin()->first;
@@ -734,11 +2044,72 @@ static void VS_CC vsOvCreate(
         VSCoreInfo core_info;
         vsapi->getCoreInfo2(core, &core_info);
         d->infer_requests.reserve(core_info.numThreads);
+        if (d->pipeline) {
+            d->pipeline_infer_requests.reserve(core_info.numThreads);
+        }
+
+        if (!d->temporal_batching && num_tiles > batch_size) {
+            try {
+                auto num_requests = d->executable_network.GetMetric(
+                    METRIC_KEY(OPTIMAL_NUMBER_OF_INFER_REQUESTS)
+                ).as<unsigned int>();
+
+                int num_batches = (num_tiles + batch_size - 1) / batch_size;
+                auto num_spare_requests = std::min(
+                    static_cast<int>(num_requests), num_batches
+                ) - 1;
+
+                for (int i = 0; i < num_spare_requests; ++i) {
+                    d->spare_infer_requests.emplace_back(d->executable_network.CreateInferRequest());
+                }
+            } catch (const InferenceEngine::Exception & e) {
+                return set_error("[IE exception] Create inference request: "s + e.what());
+            } catch (const std::exception& e) {
+                return set_error("[Standard exception] Create inference request: "s + e.what());
+            }
+        }
+    }
+
+    // the key covers the processed model, which is specialized to the tile
+    // size and converted to fp16 if requested, and the device
+    if (result_cache_dir[0] != '\0') {
+        std::string description = (
+            "result;ov;"s + VERSION + ";" + device + ";" + precision_config + ";" +
+            std::to_string(tile_w) + "x" + std::to_string(tile_h) + ";" +
+            std::to_string(d->overlap_w) + "x" + std::to_string(d->overlap_h) + ";" +
+            std::to_string(d->tile_multiple)
+        );
+        if (d->skip_flat_tiles || d->auto_crop) {
+            // the outputs of flat tiles and borders depend on the tolerance
+            description += (
+                ";flat;" + std::to_string(d->skip_flat_tiles) + std::to_string(d->auto_crop) + ";" +
+                std::to_string(flat_tolerance)
+            );
+        }
+
+        auto result_cache_key = getModelCacheKey(onnx_data, true, description);
+        if (result_cache_key.has_value()) {
+            d->result_cache = resultCacheCreate(
+                result_cache_dir, result_cache_key.value(),
+                static_cast<uint64_t>(result_cache_size) << 20
+            );
+        }
+        if (!d->result_cache) {
+            vsapi->logMessage(mtWarning, "vsOv: failed to open the result cache");
+        }
+    }
+
+    if (d->skip_flat_tiles || d->auto_crop) {
+        d->flat_tiles = flatTilesCreate(flat_tolerance);
+    }
+
+    if (dedup > 0) {
+        d->dedup_cache = dedupCreate(dedup, dedup_threshold);
     }
 
     vsapi->createFilter(
         in, out, "Model",
-        vsOvInit, vsOvGetFrame, vsOvFree,
+        vsOvInit, d->dedup_cache || d->result_cache ? vsOvGetFrameCached : vsOvGetFrame, vsOvFree,
         fmParallel, 0, d.release(), core
     );
 }
@@ -768,6 +2139,21 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         "config:func:opt;"
         "path_is_serialization:int:opt;"
         "fp16_blacklist_ops:data[]:opt;"
+        "batch_size:int:opt;"
+        "temporal_batching:int:opt;"
+        "max_batch_wait:int:opt;"
+        "pipeline:int:opt;"
+        "cache_dir:data:opt;"
+        "cache_size:int:opt;"
+        "tile_multiple:int:opt;"
+        "stats:int:opt;"
+        "dedup:int:opt;"
+        "dedup_threshold:float:opt;"
+        "result_cache_dir:data:opt;"
+        "result_cache_size:int:opt;"
+        "skip_flat_tiles:int:opt;"
+        "auto_crop:int:opt;"
+        "flat_tolerance:float:opt;"
 #ifdef ENABLE_VISUALIZATION
         "dot_path:data:opt;"
 #endif
@@ -810,4 +2196,21 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         }
     };
     registerFunc("AvailableDevices", "", availableDevices, nullptr, plugin);
+
+    auto startTrace = [](const VSMap * in, VSMap *, void *, VSCore *, const VSAPI *vsapi) {
+        int error;
+        auto capacity = vsapi->propGetInt(in, "capacity", 0, &error);
+        if (error || capacity <= 0) {
+            capacity = 1 << 20;
+        }
+
+        traceStart(static_cast<size_t>(capacity));
+    };
+    registerFunc("TraceStart", "capacity:int:opt;", startTrace, nullptr, plugin);
+
+    auto stopTrace = [](const VSMap *, VSMap * out, void *, VSCore *, const VSAPI *vsapi) {
+        auto events = traceStop();
+        vsapi->propSetData(out, "trace", std::data(events), static_cast<int>(std::size(events)), paReplace);
+    };
+    registerFunc("TraceStop", "", stopTrace, nullptr, plugin);
 }
@@ -2,9 +2,14 @@
 #define VSTRT_INFERENCE_HELPER_H_
 
 #include <algorithm>
+#include <array>
+#include <chrono>
 #include <cstdint>
+#include <memory>
 #include <optional>
 #include <string>
+#include <utility>
+#include <variant>
 #include <vector>
 
 #include <VSHelper.h>
@@ -33,16 +38,224 @@ struct IOInfo {
     int h_scale;
     int overlap_w;
     int overlap_h;
+    int tile_multiple; // positive if edge tiles are shrunk
 };
 
+// per-frame timings
+struct FrameStats {
+    std::chrono::nanoseconds wait {};
+    std::chrono::nanoseconds copy {};
+    std::chrono::nanoseconds inference {}; // time the host waits for the streams
+    int tiles {}; // number of tiles run by the network
+};
+
+// adds its lifetime to "total"
+struct ScopedTimer {
+    std::chrono::nanoseconds & total;
+    std::chrono::steady_clock::time_point start { std::chrono::steady_clock::now() };
+
+    ~ScopedTimer() {
+        total += std::chrono::duration_cast<std::chrono::nanoseconds>(
+            std::chrono::steady_clock::now() - start
+        );
+    }
+};
+
+// defined in common/trace.cpp
+extern bool traceEnabled() noexcept;
+extern int64_t traceNow() noexcept;
+extern int traceThreadId() noexcept;
+extern void traceEvent(
+    const char * name,
+    int64_t begin,
+    int64_t end,
+    int tid,
+    int frame,
+    int tile
+) noexcept;
+
+// defined in common/flat_tiles.cpp
+struct FlatTiles;
+extern std::optional<std::vector<float>> getFlatColor(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int x,
+    int y,
+    int width,
+    int height
+) noexcept;
+extern std::array<int, 4> getActiveArea(
+    const FlatTiles * flat_tiles,
+    const std::vector<const uint8_t *> & planes,
+    int stride,
+    int width,
+    int height
+) noexcept;
+
+extern std::array<int, 4> getCropArea(
+    const std::array<int, 4> & active_area,
+    int width,
+    int height,
+    int tile_w,
+    int tile_h,
+    int overlap_w,
+    int overlap_h
+) noexcept;
+extern std::shared_ptr<const std::vector<uint8_t>> findFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color
+) noexcept;
+extern void storeFlatResponse(
+    FlatTiles * flat_tiles,
+    const std::vector<float> & color,
+    std::vector<uint8_t> response
+) noexcept;
+extern void fillOutsideArea(
+    const std::vector<uint8_t *> & planes,
+    int stride,
+    int width,
+    int height,
+    const std::array<int, 4> & area,
+    const std::vector<uint8_t> & response,
+    int tile_w,
+    int tile_h
+) noexcept;
+
+// records its lifetime as an event of the timeline if tracing is enabled
+struct TraceScope {
+    const char * name;
+    int tid;
+    int frame;
+    int tile = -1;
+    int64_t begin { traceEnabled() ? traceNow() : -1 };
+
+    ~TraceScope() {
+        if (begin >= 0) {
+            traceEvent(name, begin, traceNow(), tid, frame, tile);
+        }
+    }
+};
+
+// start positions and sizes of the tiles covering an axis
+//
+// the last tile is moved back to end at the border of the frame, or with
+// a positive "multiple", shrunk to the smallest multiple of it that covers
+// the remaining pixels, for engines with dynamic shapes
+static inline
+std::vector<std::array<int, 2>> getTileSpans(
+    int size,
+    int tile,
+    int step,
+    int multiple
+) noexcept {
+
+    std::vector<std::array<int, 2>> spans;
+
+    int pos = 0;
+    while (pos + tile < size) {
+        spans.push_back({ pos, tile });
+        pos += step;
+    }
+
+    int extent = tile;
+    if (multiple > 0) {
+        extent = std::min(tile, (size - pos + multiple - 1) / multiple * multiple);
+    }
+    spans.push_back({ size - extent, extent });
+
+    return spans;
+}
+
+// number of output pixels cropped at the start and at the end of the tiles
+//
+// the end of a tile is cropped where the next tile starts, so that
+// the tiles may be written back in any order
+static inline
+std::vector<std::array<int, 2>> getTileCrops(
+    const std::vector<std::array<int, 2>> & spans,
+    int overlap,
+    int scale
+) noexcept {
+
+    std::vector<std::array<int, 2>> crops;
+    crops.reserve(std::size(spans));
+
+    for (size_t i = 0; i < std::size(spans); ++i) {
+        const auto [pos, extent] = spans[i];
+
+        int crop_start = (i == 0) ? 0 : overlap;
+
+        int crop_end = 0;
+        if (i + 1 < std::size(spans)) {
+            int next_pos = spans[i + 1][0];
+            crop_end = std::max(overlap, scale * (pos + extent - next_pos) - overlap);
+        }
+
+        crops.push_back({ crop_start, crop_end });
+    }
+
+    return crops;
+}
+
+// changes the input shape of the context of an engine with dynamic shapes
+static inline
+std::optional<ErrorMessage> setTileShape(
+    const std::unique_ptr<nvinfer1::IExecutionContext> & exec_context,
+    int tile_w,
+    int tile_h
+) noexcept {
+
+#if NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
+    auto input_name = exec_context->getEngine().getIOTensorName(0);
+    nvinfer1::Dims dims = exec_context->getTensorShape(input_name);
+#else // NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
+    nvinfer1::Dims dims = exec_context->getBindingDimensions(0);
+#endif // NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
+
+    if (dims.d[2] == tile_h && dims.d[3] == tile_w) {
+        return {};
+    }
+
+    dims.d[2] = tile_h;
+    dims.d[3] = tile_w;
+
+#if NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
+    if (!exec_context->setInputShape(input_name, dims)) {
+#else // NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
+    if (!exec_context->setBindingDimensions(0, dims)) {
+#endif // NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
+        return (
+            "tile shape " + std::to_string(tile_w) + "x" + std::to_string(tile_h) +
+            " is not supported by the optimization profile"
+        );
+    }
+
+    return {};
+}
+
+// tiles are enqueued round-robin on the given instances, so that
+// the tiles of a single frame are processed on multiple streams concurrently
+//
+// "streams" holds the index of each instance, for the timeline of the trace
+//
+// with "flat_tiles" set, tiles of a single color take the output of a
+// constant tile if "skip_flat_tiles" is set, and the borders of the frame
+// of that color are cropped if "auto_crop" is set
 static inline
 std::optional<ErrorMessage> inference(
-    const InferenceInstance & instance,
+    const std::vector<const InferenceInstance *> & instances,
+    const std::vector<int> & streams,
     int device_id,
     bool use_cuda_graph, 
     const IOInfo & info,
     const std::vector<const uint8_t *> & src_ptrs,
-    const std::vector<uint8_t *> & dst_ptrs
+    const std::vector<uint8_t *> & dst_ptrs,
+    FlatTiles * flat_tiles,
+    bool skip_flat_tiles,
+    bool auto_crop,
+    FrameStats & stats,
+    int n
 ) noexcept {
 
     const auto set_error = [](const ErrorMessage & error_message) {
@@ -51,27 +264,218 @@ std::optional<ErrorMessage> inference(
 
     checkError(cudaSetDevice(device_id));
 
-    int src_tile_w_bytes = info.in.tile_w * info.in.bytes_per_sample;
-    int src_tile_bytes = info.in.tile_h * info.in.tile_w * info.in.bytes_per_sample;
-    int dst_tile_w = info.in.tile_w * info.w_scale;
-    int dst_tile_h = info.in.tile_h * info.h_scale;
-    int dst_tile_w_bytes = dst_tile_w * info.out.bytes_per_sample;
-    int dst_tile_bytes = dst_tile_h * dst_tile_w * info.out.bytes_per_sample;
+    // the tiles cover the active area of the frame with a margin of the
+    // overlap, whose output is dropped, and the borders of the active
+    // area are filled with the output of a constant tile of their color
+    std::array<int, 4> area { 0, 0, info.in.width, info.in.height };
+    std::array<int, 4> kept_area = area;
+    if (auto_crop) {
+        kept_area = getActiveArea(flat_tiles, src_ptrs, info.in.pitch, info.in.width, info.in.height);
+        area = getCropArea(
+            kept_area, info.in.width, info.in.height,
+            info.in.tile_w, info.in.tile_h, info.overlap_w, info.overlap_h
+        );
+    }
+    const bool cropped = area[2] != info.in.width || area[3] != info.in.height;
+    if (!cropped) {
+        kept_area = area;
+    }
+
+    auto x_spans = getTileSpans(
+        area[2], info.in.tile_w,
+        info.in.tile_w - 2 * info.overlap_w, info.tile_multiple
+    );
+    for (auto & span : x_spans) {
+        span[0] += area[0];
+    }
+    auto y_spans = getTileSpans(
+        area[3], info.in.tile_h,
+        info.in.tile_h - 2 * info.overlap_h, info.tile_multiple
+    );
+    for (auto & span : y_spans) {
+        span[0] += area[1];
+    }
+    auto x_crops = getTileCrops(x_spans, info.overlap_w, info.w_scale);
+    auto y_crops = getTileCrops(y_spans, info.overlap_h, info.h_scale);
+    if (cropped) {
+        x_crops.front()[0] += info.w_scale * (kept_area[0] - area[0]);
+        x_crops.back()[1] += info.w_scale * (area[0] + area[2] - kept_area[0] - kept_area[2]);
+        y_crops.front()[0] += info.h_scale * (kept_area[1] - area[1]);
+        y_crops.back()[1] += info.h_scale * (area[1] + area[3] - kept_area[1] - kept_area[3]);
+    }
+
+    // tiles as indices into the column and row spans, with the tiles of
+    // the tile size first so that the input shape of a context rarely changes
+    std::vector<std::array<size_t, 2>> tiles;
+    tiles.reserve(std::size(x_spans) * std::size(y_spans));
+    for (size_t iy = 0; iy < std::size(y_spans); ++iy) {
+        for (size_t ix = 0; ix < std::size(x_spans); ++ix) {
+            tiles.push_back({ ix, iy });
+        }
+    }
+    std::stable_partition(std::begin(tiles), std::end(tiles), [&](const auto & tile) {
+        return x_spans[tile[0]][1] == info.in.tile_w && y_spans[tile[1]][1] == info.in.tile_h;
+    });
+
+    const size_t src_planes = std::size(src_ptrs);
+    const size_t dst_planes = std::size(dst_ptrs);
+    const size_t num_instances = std::size(instances);
+
+    const int dst_full_tile_w = info.in.tile_w * info.w_scale;
+    const int dst_full_tile_h = info.in.tile_h * info.h_scale;
+    const int dst_full_tile_w_bytes = dst_full_tile_w * info.out.bytes_per_sample;
+    const int dst_full_tile_bytes = dst_full_tile_h * dst_full_tile_w_bytes;
+
+    // tiles of the tile size whose samples share a color are not run
+    std::vector<std::pair<std::array<size_t, 2>, std::vector<float>>> flat;
+    if (skip_flat_tiles) {
+        auto kept = std::begin(tiles);
+        for (const auto & tile : tiles) {
+            const auto [x, tile_w] = x_spans[tile[0]];
+            const auto [y, tile_h] = y_spans[tile[1]];
+
+            std::optional<std::vector<float>> color;
+            if (tile_w == info.in.tile_w && tile_h == info.in.tile_h) {
+                color = getFlatColor(flat_tiles, src_ptrs, info.in.pitch, x, y, tile_w, tile_h);
+            }
+
+            if (color.has_value()) {
+                flat.emplace_back(tile, std::move(color.value()));
+            } else {
+                *kept++ = tile;
+            }
+        }
+        tiles.erase(kept, std::end(tiles));
+    }
+
+    stats.tiles = static_cast<int>(std::size(tiles));
+
+    // runs a constant tile of a color on the first instance,
+    // the output is kept for the later tiles and borders of that color
+    const auto get_flat_response = [&](
+        const std::vector<float> & color
+    ) -> std::variant<ErrorMessage, std::shared_ptr<const std::vector<uint8_t>>> {
+
+        if (auto response = findFlatResponse(flat_tiles, color); response) {
+            return response;
+        }
+
+        const InferenceInstance & instance { *instances[0] };
+
+        ScopedTimer timer { stats.inference };
+        TraceScope trace { "flat", streams[0], n };
+
+        const size_t src_tile_size = static_cast<size_t>(info.in.tile_h) * info.in.tile_w;
+        auto h_data = reinterpret_cast<float *>(instance.src.h_data.data);
+        for (const auto & value : color) {
+            std::fill_n(h_data, src_tile_size, value);
+            h_data += src_tile_size;
+        }
+
+        if (info.tile_multiple > 0) {
+            if (auto err = setTileShape(instance.exec_context, info.in.tile_w, info.in.tile_h); err.has_value()) {
+                return set_error(err.value());
+            }
+        }
+
+        if (use_cuda_graph) {
+            checkError(cudaGraphLaunch(instance.graphexec, instance.stream));
+        } else {
+            auto result = enqueue(
+                instance.src, instance.dst,
+                instance.exec_context, instance.stream,
+                src_planes * src_tile_size * info.in.bytes_per_sample,
+                dst_planes * dst_full_tile_bytes
+            );
 
-    int step_w = info.in.tile_w - 2 * info.overlap_w;
-    int step_h = info.in.tile_h - 2 * info.overlap_h;
+            if (result.has_value()) {
+                return set_error(result.value());
+            }
+        }
+
+        checkError(cudaStreamSynchronize(instance.stream));
+
+        std::vector<uint8_t> response(
+            instance.dst.h_data.data,
+            instance.dst.h_data.data + dst_planes * dst_full_tile_bytes
+        );
+        storeFlatResponse(flat_tiles, color, response);
 
-    int y = 0;
-    while (true) {
-        int y_crop_start = (y == 0) ? 0 : info.overlap_h;
-        int y_crop_end = (y == info.in.height - info.in.tile_h) ? 0 : info.overlap_h;
+        return std::make_shared<const std::vector<uint8_t>>(std::move(response));
+    };
 
-        int x = 0;
-        while (true) {
-            int x_crop_start = (x == 0) ? 0 : info.overlap_w;
-            int x_crop_end = (x == info.in.width - info.in.tile_w) ? 0 : info.overlap_w;
+    if (cropped) {
+        auto response = get_flat_response(getFlatColor(flat_tiles, src_ptrs, info.in.pitch, 0, 0, 1, 1).value());
+        if (std::holds_alternative<ErrorMessage>(response)) {
+            return set_error(std::get<ErrorMessage>(response));
+        }
 
+        ScopedTimer timer { stats.copy };
+        fillOutsideArea(
+            dst_ptrs, info.out.pitch,
+            info.in.width * info.w_scale, info.in.height * info.h_scale,
             {
+                info.w_scale * kept_area[0], info.h_scale * kept_area[1],
+                info.w_scale * kept_area[2], info.h_scale * kept_area[3]
+            },
+            *std::get<std::shared_ptr<const std::vector<uint8_t>>>(response),
+            dst_full_tile_w, dst_full_tile_h
+        );
+    }
+
+    for (const auto & [tile, color] : flat) {
+        auto response = get_flat_response(color);
+        if (std::holds_alternative<ErrorMessage>(response)) {
+            return set_error(std::get<ErrorMessage>(response));
+        }
+
+        ScopedTimer timer { stats.copy };
+
+        const auto [ix, iy] = tile;
+        const auto x = x_spans[ix][0];
+        const auto y = y_spans[iy][0];
+        const auto [y_crop_start, y_crop_end] = y_crops[iy];
+        const auto [x_crop_start, x_crop_end] = x_crops[ix];
+
+        const uint8_t * h_data = std::data(*std::get<std::shared_ptr<const std::vector<uint8_t>>>(response));
+        for (uint8_t * _dst_ptr : dst_ptrs) {
+            uint8_t * dst_ptr { _dst_ptr +
+                info.h_scale * y * info.out.pitch + info.w_scale * x * info.out.bytes_per_sample
+            };
+
+            vs_bitblt(
+                dst_ptr + (y_crop_start * info.out.pitch + x_crop_start * info.out.bytes_per_sample),
+                info.out.pitch,
+                h_data + (y_crop_start * dst_full_tile_w_bytes + x_crop_start * info.out.bytes_per_sample),
+                dst_full_tile_w_bytes,
+                dst_full_tile_w_bytes - (x_crop_start + x_crop_end) * info.out.bytes_per_sample,
+                dst_full_tile_h - (y_crop_start + y_crop_end)
+            );
+
+            h_data += dst_full_tile_bytes;
+        }
+    }
+
+    // the inference of a tile spans from its launch to the synchronization of its stream
+    std::vector<int64_t> launch_times(num_instances);
+
+    for (size_t group_start = 0; group_start < std::size(tiles); group_start += num_instances) {
+        const size_t group_end = std::min(group_start + num_instances, std::size(tiles));
+
+        for (size_t i = group_start; i < group_end; ++i) {
+            const InferenceInstance & instance { *instances[i - group_start] };
+            const auto [x, tile_w] = x_spans[tiles[i][0]];
+            const auto [y, tile_h] = y_spans[tiles[i][1]];
+
+            const bool is_edge = tile_w != info.in.tile_w || tile_h != info.in.tile_h;
+
+            int src_tile_w_bytes = tile_w * info.in.bytes_per_sample;
+            int src_tile_bytes = tile_h * src_tile_w_bytes;
+
+            {
+                ScopedTimer timer { stats.copy };
+                TraceScope trace { "pack", streams[i - group_start], n, static_cast<int>(i) };
+
                 uint8_t * h_data = instance.src.h_data.data;
                 for (const uint8_t * _src_ptr : src_ptrs) {
                     const uint8_t * src_ptr { _src_ptr +
@@ -81,28 +485,72 @@ std::optional<ErrorMessage> inference(
                     vs_bitblt(
                         h_data, src_tile_w_bytes,
                         src_ptr, info.in.pitch,
-                        src_tile_w_bytes, info.in.tile_h
+                        src_tile_w_bytes, tile_h
                     );
 
                     h_data += src_tile_bytes;
                 }
             }
 
-            if (use_cuda_graph) {
+            if (info.tile_multiple > 0) {
+                if (auto err = setTileShape(instance.exec_context, tile_w, tile_h); err.has_value()) {
+                    return set_error(err.value());
+                }
+            }
+
+            launch_times[i - group_start] = traceEnabled() ? traceNow() : -1;
+
+            // cuda graphs are captured for the tile size
+            if (use_cuda_graph && !is_edge) {
                 checkError(cudaGraphLaunch(instance.graphexec, instance.stream));
             } else {
+                size_t dst_tile_bytes = (
+                    static_cast<size_t>(tile_h * info.h_scale) *
+                    (tile_w * info.w_scale) * info.out.bytes_per_sample
+                );
+
                 auto result = enqueue(
                     instance.src, instance.dst,
-                    instance.exec_context, instance.stream
+                    instance.exec_context, instance.stream,
+                    src_planes * src_tile_bytes, dst_planes * dst_tile_bytes
                 );
 
                 if (result.has_value()) {
                     return set_error(result.value());
                 }
             }
-            checkError(cudaStreamSynchronize(instance.stream));
+        }
+
+        for (size_t i = group_start; i < group_end; ++i) {
+            const InferenceInstance & instance { *instances[i - group_start] };
+            const auto [ix, iy] = tiles[i];
+            const auto [x, tile_w] = x_spans[ix];
+            const auto [y, tile_h] = y_spans[iy];
+
+            const auto [y_crop_start, y_crop_end] = y_crops[iy];
+            const auto [x_crop_start, x_crop_end] = x_crops[ix];
+
+            int dst_tile_w = tile_w * info.w_scale;
+            int dst_tile_h = tile_h * info.h_scale;
+            int dst_tile_w_bytes = dst_tile_w * info.out.bytes_per_sample;
+            int dst_tile_bytes = dst_tile_h * dst_tile_w_bytes;
+
+            {
+                ScopedTimer timer { stats.inference };
+                checkError(cudaStreamSynchronize(instance.stream));
+            }
+
+            if (const auto launch_time = launch_times[i - group_start]; launch_time >= 0) {
+                traceEvent(
+                    "infer", launch_time, traceNow(),
+                    streams[i - group_start], n, static_cast<int>(i)
+                );
+            }
 
             {
+                ScopedTimer timer { stats.copy };
+                TraceScope trace { "unpack", streams[i - group_start], n, static_cast<int>(i) };
+
                 const uint8_t * h_data = instance.dst.h_data.data;
                 for (uint8_t * _dst_ptr : dst_ptrs) {
                     uint8_t * dst_ptr { _dst_ptr +
@@ -121,19 +569,7 @@ std::optional<ErrorMessage> inference(
                     h_data += dst_tile_bytes;
                 }
             }
-
-            if (x + info.in.tile_w == info.in.width) {
-                break;
-            }
-
-            x = std::min(x + step_w, info.in.width - info.in.tile_w);
         }
-
-        if (y + info.in.tile_h == info.in.height) {
-            break;
-        }
-
-        y = std::min(y + step_h, info.in.height - info.in.tile_h);
     }
 
     return {};
@@ -138,12 +138,16 @@ std::optional<int> selectProfile(
     return {};
 }
 
+// copies "src_size" and "dst_size" bytes of the buffers,
+// which are smaller than the buffers for tiles of a smaller shape
 static inline
 std::optional<ErrorMessage> enqueue(
     const MemoryResource & src,
     const MemoryResource & dst,
     const std::unique_ptr<nvinfer1::IExecutionContext> & exec_context,
-    cudaStream_t stream
+    cudaStream_t stream,
+    size_t src_size,
+    size_t dst_size
 ) noexcept {
 
     const auto set_error = [](const ErrorMessage & message) {
@@ -151,7 +155,7 @@ std::optional<ErrorMessage> enqueue(
     };
 
     checkError(cudaMemcpyAsync(
-        src.d_data, src.h_data, src.size,
+        src.d_data, src.h_data, src_size,
         cudaMemcpyHostToDevice, stream
     ));
 
@@ -180,7 +184,7 @@ std::optional<ErrorMessage> enqueue(
 #endif // NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
 
     checkError(cudaMemcpyAsync(
-        dst.h_data, dst.d_data, dst.size,
+        dst.h_data, dst.d_data, dst_size,
         cudaMemcpyDeviceToHost, stream
     ));
 
@@ -201,7 +205,7 @@ std::variant<ErrorMessage, GraphExecResource> getGraphExec(
     // flush deferred internal state update
     // https://docs.nvidia.com/deeplearning/tensorrt/archives/tensorrt-821/developer-guide/index.html#cuda-graphs
     {
-        auto result = enqueue(src, dst, exec_context, stream);
+        auto result = enqueue(src, dst, exec_context, stream, src.size, dst.size);
         if (result.has_value()) {
             return set_error(result.value());
         }
@@ -210,7 +214,7 @@ std::variant<ErrorMessage, GraphExecResource> getGraphExec(
 
     checkError(cudaStreamBeginCapture(stream, cudaStreamCaptureModeRelaxed));
     {
-        auto result = enqueue(src, dst, exec_context, stream);
+        auto result = enqueue(src, dst, exec_context, stream, src.size, dst.size);
         if (result.has_value()) {
             return set_error(result.value());
         }
@@ -3,8 +3,10 @@
 #include <cstdint>
 #include <cstdlib>
 #include <fstream>
+#include <functional>
 #include <memory>
 #include <mutex>
+#include <optional>
 #include <sstream>
 #include <string>
 #include <utility>
@@ -40,6 +42,78 @@ using namespace std::string_literals;
 
 static const VSPlugin * myself = nullptr;
 
+extern void traceStart(size_t capacity) noexcept;
+
+extern std::string traceStop() noexcept;
+
+struct DedupCache;
+
+extern DedupCache * dedupCreate(int capacity, float threshold) noexcept;
+
+extern void dedupFree(DedupCache * cache, const VSAPI * vsapi) noexcept;
+
+extern const VSFrameRef * dedupGetFrame(
+    DedupCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+extern FlatTiles * flatTilesCreate(float tolerance) noexcept;
+
+extern void flatTilesFree(FlatTiles * flat_tiles) noexcept;
+
+extern std::optional<std::string> getModelCacheKey(
+    const std::string_view & path,
+    bool path_is_serialization,
+    const std::string & description
+) noexcept;
+
+struct ResultCache;
+
+extern ResultCache * resultCacheCreate(
+    const std::string & cache_dir,
+    const std::string & key,
+    uint64_t max_size
+) noexcept;
+
+extern void resultCacheFree(ResultCache * cache) noexcept;
+
+extern const VSFrameRef * resultCacheGetFrame(
+    ResultCache * cache,
+    int n,
+    const std::vector<VSNodeRef *> & nodes,
+    const VSVideoInfo * vi,
+    bool stats,
+    VSFrameContext * frameCtx,
+    VSCore * core,
+    const VSAPI * vsapi,
+    const std::function<const VSFrameRef * ()> & process
+) noexcept;
+
+static void setFrameStats(
+    VSMap * props,
+    const FrameStats & stats,
+    int num_tiles,
+    int stream,
+    const VSAPI * vsapi
+) noexcept {
+
+    const auto seconds = [](std::chrono::nanoseconds time) {
+        return std::chrono::duration<double>(time).count();
+    };
+
+    vsapi->propSetFloat(props, "MLRTWaitTime", seconds(stats.wait), paReplace);
+    vsapi->propSetFloat(props, "MLRTCopyTime", seconds(stats.copy), paReplace);
+    vsapi->propSetFloat(props, "MLRTInferenceTime", seconds(stats.inference), paReplace);
+    vsapi->propSetInt(props, "MLRTTiles", num_tiles, paReplace);
+    vsapi->propSetInt(props, "MLRTStream", stream, paReplace);
+}
+
 struct TicketSemaphore {
     std::atomic<intptr_t> ticket {};
     std::atomic<intptr_t> current {};
@@ -59,6 +133,17 @@ struct TicketSemaphore {
         }
     }
 
+    // acquires a slot only if one is available without waiting
+    bool try_acquire() noexcept {
+        intptr_t tk { ticket.load(std::memory_order::acquire) };
+        while (tk < current.load(std::memory_order::acquire)) {
+            if (ticket.compare_exchange_weak(tk, tk + 1, std::memory_order::acquire)) {
+                return true;
+            }
+        }
+        return false;
+    }
+
     void release() noexcept {
         current.fetch_add(1, std::memory_order::release);
         current.notify_all();
@@ -73,6 +158,18 @@ struct vsTrtData {
     int num_streams;
     bool use_cuda_graph;
     int overlap_w, overlap_h;
+    int tile_multiple; // positive if edge tiles are shrunk
+    int tile_w, tile_h;
+    bool stats; // attaches FrameStats as frame properties
+
+    DedupCache * dedup_cache; // reuses the outputs of recent inputs if set
+    ResultCache * result_cache; // stores the outputs on disk if set
+
+    // tiles of a single color take the output of a constant tile and
+    // the borders of that color are cropped, if set
+    FlatTiles * flat_tiles;
+    bool skip_flat_tiles;
+    bool auto_crop;
 
     Logger logger;
     std::unique_ptr<nvinfer1::IRuntime> runtime;
@@ -95,6 +192,20 @@ struct vsTrtData {
         return ticket;
     }
 
+    [[nodiscard]]
+    std::optional<int> try_acquire() noexcept {
+        if (!semaphore.try_acquire()) {
+            return {};
+        }
+        int ticket;
+        {
+            std::lock_guard<std::mutex> lock { instances_lock };
+            ticket = tickets.back();
+            tickets.pop_back();
+        }
+        return ticket;
+    }
+
     void release(int ticket) noexcept {
         {
             std::lock_guard<std::mutex> lock { instances_lock };
@@ -142,9 +253,32 @@ static const VSFrameRef *VS_CC vsTrtGetFrame(
             getFrames(n, vsapi, frameCtx, d->nodes)
         };
 
-        const int ticket { d->acquire() };
+        FrameStats stats;
+
+        int ticket;
+        {
+            ScopedTimer timer { stats.wait };
+            TraceScope trace { "wait", traceThreadId(), n };
+            ticket = d->acquire();
+        }
         InferenceInstance & instance { d->instances[ticket] };
 
+        TraceScope frame_trace { "frame", traceThreadId(), n };
+
+        // the context may be left with the shape of an edge tile
+        if (d->tile_multiple > 0) {
+            if (auto err = setTileShape(instance.exec_context, d->tile_w, d->tile_h); err.has_value()) {
+                d->release(ticket);
+
+                for (const auto & frame : src_frames) {
+                    vsapi->freeFrame(frame);
+                }
+
+                vsapi->setFilterError((__func__ + ": "s + err.value()).c_str(), frameCtx);
+                return nullptr;
+            }
+        }
+
 #if NV_TENSORRT_MAJOR * 10 + NV_TENSORRT_MINOR >= 85
         auto input_name = d->engines[0]->getIOTensorName(0);
         const nvinfer1::Dims src_dim { instance.exec_context->getTensorShape(input_name) };
@@ -205,15 +339,43 @@ static const VSFrameRef *VS_CC vsTrtGetFrame(
             .w_scale = w_scale,
             .h_scale = h_scale,
             .overlap_w = d->overlap_w,
-            .overlap_h = d->overlap_h
+            .overlap_h = d->overlap_h,
+            .tile_multiple = d->tile_multiple
         };
 
+        // idle streams also take tiles of this frame
+        const auto num_tiles = (
+            std::size(getTileSpans(info.in.width, src_tile_w, src_tile_w - 2 * d->overlap_w, d->tile_multiple)) *
+            std::size(getTileSpans(info.in.height, src_tile_h, src_tile_h - 2 * d->overlap_h, d->tile_multiple))
+        );
+
+        std::vector<int> helper_tickets;
+        while (std::size(helper_tickets) + 1 < num_tiles) {
+            const auto helper_ticket { d->try_acquire() };
+            if (!helper_ticket.has_value()) {
+                break;
+            }
+            helper_tickets.push_back(helper_ticket.value());
+        }
+
+        std::vector<const InferenceInstance *> instances { &instance };
+        std::vector<int> streams { ticket };
+        for (const auto & helper_ticket : helper_tickets) {
+            instances.push_back(&d->instances[helper_ticket]);
+            streams.push_back(helper_ticket);
+        }
+
         const auto inference_result = inference(
-            instance,
+            instances, streams,
             d->device_id, d->use_cuda_graph,
-            info, src_ptrs, dst_ptrs
+            info, src_ptrs, dst_ptrs,
+            d->flat_tiles, d->skip_flat_tiles, d->auto_crop,
+            stats, n
         );
 
+        for (const auto & helper_ticket : helper_tickets) {
+            d->release(helper_ticket);
+        }
         d->release(ticket);
 
         for (const auto & frame : src_frames) {
@@ -231,18 +393,64 @@ static const VSFrameRef *VS_CC vsTrtGetFrame(
             return nullptr;
         }
 
+        if (d->stats) {
+            setFrameStats(vsapi->getFramePropsRW(dst_frame), stats, stats.tiles, ticket, vsapi);
+        }
+
         return dst_frame;
     }
 
     return nullptr;
 }
 
+// runs the network only for inputs that differ from the recent ones
+// and whose outputs are not stored in the result cache
+static const VSFrameRef *VS_CC vsTrtGetFrameCached(
+    int n,
+    int activationReason,
+    void **instanceData,
+    void **frameData,
+    VSFrameContext *frameCtx,
+    VSCore *core,
+    const VSAPI *vsapi
+) noexcept {
+
+    auto d = static_cast<vsTrtData *>(*instanceData);
+
+    if (activationReason == arAllFramesReady) {
+        const std::function<const VSFrameRef * ()> process = [&] {
+            return vsTrtGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+        };
+
+        const std::function<const VSFrameRef * ()> cached = [&] {
+            if (d->result_cache) {
+                return resultCacheGetFrame(
+                    d->result_cache, n, d->nodes, d->out_vi.get(), d->stats,
+                    frameCtx, core, vsapi, process
+                );
+            }
+            return process();
+        };
+
+        if (d->dedup_cache) {
+            return dedupGetFrame(d->dedup_cache, n, d->nodes, d->stats, frameCtx, core, vsapi, cached);
+        }
+        return cached();
+    }
+
+    return vsTrtGetFrame(n, activationReason, instanceData, frameData, frameCtx, core, vsapi);
+}
+
 static void VS_CC vsTrtFree(
     void *instanceData, VSCore *core, const VSAPI *vsapi
 ) noexcept {
 
     auto d = static_cast<vsTrtData *>(instanceData);
 
+    dedupFree(d->dedup_cache, vsapi);
+    resultCacheFree(d->result_cache);
+    flatTilesFree(d->flat_tiles);
+
     for (const auto & node : d->nodes) {
         vsapi->freeNode(node);
     }
@@ -318,6 +526,9 @@ static void VS_CC vsTrtCreate(
             .tile_w = tile_w,
             .tile_h = tile_h
         };
+
+        d->tile_w = tile_w;
+        d->tile_h = tile_h;
     } else {
         if (d->overlap_w != 0 || d->overlap_h != 0) {
             return set_error("\"tilesize\" must be specified");
@@ -334,6 +545,78 @@ static void VS_CC vsTrtCreate(
             .width = width,
             .height = height
         };
+
+        d->tile_w = width;
+        d->tile_h = height;
+    }
+
+    d->tile_multiple = int64ToIntS(vsapi->propGetInt(in, "tile_multiple", 0, &error));
+    if (error) {
+        d->tile_multiple = 0;
+    }
+    if (d->tile_multiple < 0) {
+        return set_error("\"tile_multiple\" must be non-negative");
+    }
+
+    d->skip_flat_tiles = !!vsapi->propGetInt(in, "skip_flat_tiles", 0, &error);
+    if (error) {
+        d->skip_flat_tiles = false;
+    }
+
+    d->auto_crop = !!vsapi->propGetInt(in, "auto_crop", 0, &error);
+    if (error) {
+        d->auto_crop = false;
+    }
+
+    auto flat_tolerance = static_cast<float>(vsapi->propGetFloat(in, "flat_tolerance", 0, &error));
+    if (error) {
+        flat_tolerance = 0.f;
+    }
+    if (flat_tolerance < 0.f) {
+        return set_error("\"flat_tolerance\" must be non-negative");
+    }
+
+    if (d->auto_crop && d->tile_multiple > 0) {
+        return set_error("\"auto_crop\" is not supported with \"tile_multiple\"");
+    }
+    if (d->auto_crop && d->tile_w >= in_vis.front()->width && d->tile_h >= in_vis.front()->height) {
+        // the tiles cannot shrink to the active area
+        vsapi->logMessage(mtWarning, "vsTrt: \"auto_crop\" has no effect when a tile covers the whole frame");
+        d->auto_crop = false;
+    }
+
+    d->stats = !!vsapi->propGetInt(in, "stats", 0, &error);
+    if (error) {
+        d->stats = false;
+    }
+
+    int dedup = int64ToIntS(vsapi->propGetInt(in, "dedup", 0, &error));
+    if (error) {
+        dedup = 0;
+    }
+    if (dedup < 0) {
+        return set_error("\"dedup\" must be non-negative");
+    }
+
+    auto dedup_threshold = static_cast<float>(vsapi->propGetFloat(in, "dedup_threshold", 0, &error));
+    if (error) {
+        dedup_threshold = 0.f;
+    }
+    if (dedup_threshold < 0.f) {
+        return set_error("\"dedup_threshold\" must be non-negative");
+    }
+
+    const char * result_cache_dir = vsapi->propGetData(in, "result_cache_dir", 0, &error);
+    if (error) {
+        result_cache_dir = "";
+    }
+
+    int64_t result_cache_size = vsapi->propGetInt(in, "result_cache_size", 0, &error);
+    if (error) {
+        result_cache_size = 10240;
+    }
+    if (result_cache_size < 0) {
+        return set_error("\"result_cache_size\" must be non-negative");
     }
 
     int device_id = int64ToIntS(vsapi->propGetInt(in, "device_id", 0, &error));
@@ -434,6 +717,11 @@ static void VS_CC vsTrtCreate(
         }
     }
 
+    // edge tiles are run by changing the input shape of the contexts
+    if (d->tile_multiple > 0 && !is_dynamic) {
+        return set_error("\"tile_multiple\" requires an engine with dynamic shapes");
+    }
+
     d->semaphore.init(d->num_streams);
     d->tickets.reserve(d->num_streams);
     for (int i = 0; i < d->num_streams; ++i) {
@@ -443,9 +731,45 @@ static void VS_CC vsTrtCreate(
     d->out_vi = std::make_unique<VSVideoInfo>(*in_vis[0]);
     setDimensions(d->out_vi, d->instances[0].exec_context, core, vsapi);
 
+    // the key covers the engine, which fixes the precision of the network
+    if (result_cache_dir[0] != '\0') {
+        std::string description = (
+            "result;trt;"s + VERSION + ";" + std::to_string(getInferLibVersion()) + ";" +
+            std::to_string(d->tile_w) + "x" + std::to_string(d->tile_h) + ";" +
+            std::to_string(d->overlap_w) + "x" + std::to_string(d->overlap_h) + ";" +
+            std::to_string(d->tile_multiple)
+        );
+        if (d->skip_flat_tiles || d->auto_crop) {
+            // the outputs of flat tiles and borders depend on the tolerance
+            description += (
+                ";flat;" + std::to_string(d->skip_flat_tiles) + std::to_string(d->auto_crop) + ";" +
+                std::to_string(flat_tolerance)
+            );
+        }
+
+        auto result_cache_key = getModelCacheKey(std::string_view{ engine_data.get(), engine_nbytes }, true, description);
+        if (result_cache_key.has_value()) {
+            d->result_cache = resultCacheCreate(
+                result_cache_dir, result_cache_key.value(),
+                static_cast<uint64_t>(result_cache_size) << 20
+            );
+        }
+        if (!d->result_cache) {
+            vsapi->logMessage(mtWarning, "vsTrt: failed to open the result cache");
+        }
+    }
+
+    if (d->skip_flat_tiles || d->auto_crop) {
+        d->flat_tiles = flatTilesCreate(flat_tolerance);
+    }
+
+    if (dedup > 0) {
+        d->dedup_cache = dedupCreate(dedup, dedup_threshold);
+    }
+
     vsapi->createFilter(
         in, out, "Model",
-        vsTrtInit, vsTrtGetFrame, vsTrtFree,
+        vsTrtInit, d->dedup_cache || d->result_cache ? vsTrtGetFrameCached : vsTrtGetFrame, vsTrtFree,
         fmParallel, 0, d.release(), core
     );
 }
@@ -480,7 +804,16 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
         "device_id:int:opt;"
         "use_cuda_graph:int:opt;"
         "num_streams:int:opt;"
-        "verbosity:int:opt;",
+        "verbosity:int:opt;"
+        "tile_multiple:int:opt;"
+        "stats:int:opt;"
+        "dedup:int:opt;"
+        "dedup_threshold:float:opt;"
+        "result_cache_dir:data:opt;"
+        "result_cache_size:int:opt;"
+        "skip_flat_tiles:int:opt;"
+        "auto_crop:int:opt;"
+        "flat_tolerance:float:opt;",
         vsTrtCreate,
         nullptr,
         plugin
@@ -516,4 +849,21 @@ VS_EXTERNAL_API(void) VapourSynthPluginInit(
     registerFunc("Version", "", getVersion, nullptr, plugin);
 
     registerFunc("DeviceProperties", "device_id:int:opt;", getDeviceProp, nullptr, plugin);
+
+    auto startTrace = [](const VSMap * in, VSMap *, void *, VSCore *, const VSAPI *vsapi) {
+        int error;
+        auto capacity = vsapi->propGetInt(in, "capacity", 0, &error);
+        if (error || capacity <= 0) {
+            capacity = 1 << 20;
+        }
+
+        traceStart(static_cast<size_t>(capacity));
+    };
+    registerFunc("TraceStart", "capacity:int:opt;", startTrace, nullptr, plugin);
+
+    auto stopTrace = [](const VSMap *, VSMap * out, void *, VSCore *, const VSAPI *vsapi) {
+        auto events = traceStop();
+        vsapi->propSetData(out, "trace", std::data(events), static_cast<int>(std::size(events)), paReplace);
+    };
+    registerFunc("TraceStop", "", stopTrace, nullptr, plugin);
 }